@@ -0,0 +1,218 @@
+"""CSC110 Project Phase 2
+
+FILE DESCRIPTION
+================
+This file renders many graphs without a window, from the command line.
+Each graph is described by a configuration: the categories to plot and the
+filters to apply. Graphs are rendered in parallel, in a pool of processes,
+and written as image files along with a JSON manifest describing them.
+
+Usage:
+    python batch_render.py charts.json --data TestData.csv --output-dir charts
+
+where charts.json holds a list of configurations such as
+    {"name": "trade", "categories": ["export_cash", "import_cash"],
+     "outlier_categories": ["export_cash"], "filter_garbage": true,
+     "filter_duplicates": true}
+
+GROUP INFORMATION
+=================
+Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+import matplotlib
+
+import graphing
+from data_collection import CATEGORIES, DEFAULT_CACHE_DIR, MonthlyDataset
+from data_filtering import evaluate_filters
+from data_interchange import load_dataset
+from instrumentation import span
+
+
+@dataclass
+class ChartConfig:
+    """The configuration of one graph to render.
+
+    Instance Attributes:
+        - name: the name of the graph, used for its file names
+        - categories: the categories to plot (all of them if empty)
+        - outlier_categories: the categories to filter outliers for
+        - filter_garbage: whether to filter garbage data
+        - filter_duplicates: whether to filter duplicate data
+        - decimation: how to decimate long series (see graphing.decimate)
+
+    Representation Invariants:
+        - all(category in CATEGORIES for category in self.categories)
+        - all(category in CATEGORIES for category in self.outlier_categories)
+        - self.decimation in graphing.DECIMATION_METHODS
+    """
+    name: str
+    categories: list[str] = field(default_factory=list)
+    outlier_categories: list[str] = field(default_factory=list)
+    filter_garbage: bool = False
+    filter_duplicates: bool = False
+    decimation: str = 'lttb'
+
+    @classmethod
+    def from_dict(cls, config: dict, default_name: str) -> 'ChartConfig':
+        """Return the ChartConfig described by config, a dictionary read from
+        JSON. Raise ValueError if it names an unknown category or option.
+        """
+        unknown = set(config) - {'name', 'categories', 'outlier_categories', 'filter_garbage',
+                                 'filter_duplicates', 'decimation'}
+        if unknown:
+            raise ValueError(f'Unknown chart options: {", ".join(sorted(unknown))}')
+        chart = cls(name=str(config.get('name', default_name)),
+                    categories=list(config.get('categories', [])),
+                    outlier_categories=list(config.get('outlier_categories', [])),
+                    filter_garbage=bool(config.get('filter_garbage', False)),
+                    filter_duplicates=bool(config.get('filter_duplicates', False)),
+                    decimation=config.get('decimation', 'lttb'))
+        for category in chart.categories + chart.outlier_categories:
+            if category not in CATEGORIES:
+                raise ValueError(f'Unknown category: {category}')
+        if chart.decimation not in graphing.DECIMATION_METHODS:
+            raise ValueError(f'Unknown decimation method: {chart.decimation}')
+        return chart
+
+
+# The dataset each worker process renders from, loaded once per process.
+_worker_dataset: Optional[MonthlyDataset] = None
+
+
+def render_charts(charts: list[ChartConfig], source: str, output_dir: str,
+                  formats: tuple[str, ...] = ('png',), processes: Optional[int] = None,
+                  cache_dir: str = DEFAULT_CACHE_DIR) -> list[dict]:
+    """Render every chart in charts from the data in source, writing one file
+    per format into output_dir, in a pool of processes (by default, one per
+    CPU). Also write output_dir/manifest.json. A raw .csv source is parsed
+    through the cache in cache_dir.
+
+    Return the manifest: one dictionary per chart with its configuration, the
+    files written, the number of rows kept and rejected by its filters, and
+    how long it took to render.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    file_stems = _unique_file_stems([chart.name for chart in charts])
+    jobs = [(chart, os.path.join(output_dir, stem), formats)
+            for chart, stem in zip(charts, file_stems)]
+
+    with span('render_charts', charts=len(charts), formats=list(formats)):
+        if processes == 1 or len(charts) <= 1:
+            _initialize_worker(source, cache_dir)
+            manifest = [_render_chart(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker,
+                                     initargs=(source, cache_dir)) as executor:
+                manifest = list(executor.map(_render_chart, jobs))
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as manifest_file:
+        json.dump({'source': source, 'charts': manifest}, manifest_file, indent=2)
+    return manifest
+
+
+def _initialize_worker(source: str, cache_dir: str) -> None:
+    """Load the dataset for the current (worker) process, which renders
+    off-screen.
+    """
+    global _worker_dataset
+    matplotlib.use('Agg')
+    _worker_dataset = load_dataset(source, cache_dir)
+
+
+def _render_chart(job: tuple[ChartConfig, str, tuple[str, ...]]) -> dict:
+    """Render one chart from _worker_dataset. job is the chart's
+    configuration, the path to write it to (without an extension), and the
+    formats to write. Return the chart's manifest entry.
+    """
+    chart, file_stem, formats = job
+    start = time.perf_counter()
+    categories = chart.categories or list(CATEGORIES)
+    with span('render_chart', rows_in=len(_worker_dataset), chart=chart.name) as trace:
+        result = evaluate_filters(chart.filter_garbage, chart.filter_duplicates,
+                                  chart.outlier_categories, _worker_dataset)
+
+        canvas = graphing.GraphCanvas()
+        filtered_data = graphing.get_data(_worker_dataset[result.kept], categories)
+        canvas.render(graphing.decimate(filtered_data, canvas.plot_width(), chart.decimation),
+                      categories)
+        files = []
+        for file_format in formats:
+            filename = f'{file_stem}.{file_format}'
+            canvas.save(filename)
+            files.append(os.path.basename(filename))
+        trace.set(rows_out=len(result.kept))
+
+    return {'config': asdict(chart), 'files': files, 'rows_kept': len(result.kept),
+            'rows_rejected': len(result.rejected),
+            'seconds': round(time.perf_counter() - start, 4)}
+
+
+def _unique_file_stems(names: list[str]) -> list[str]:
+    """Return a file name (without extension) for each name in names: the
+    name with anything but letters, digits, '-' and '_' replaced, and made
+    unique by numbering repeats.
+    """
+    stems = []
+    seen = set()
+    for name in names:
+        stem = re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or 'chart'
+        candidate, number = stem, 1
+        while candidate in seen:
+            number += 1
+            candidate = f'{stem}-{number}'
+        seen.add(candidate)
+        stems.append(candidate)
+    return stems
+
+
+def main(arguments: Optional[list[str]] = None) -> int:
+    """Run the batch renderer with the given command line arguments (by
+    default, sys.argv). Return the exit status.
+    """
+    parser = argparse.ArgumentParser(description='Render many graphs of the transportation '
+                                                 'activity dataset without a window.')
+    parser.add_argument('config', help='a JSON file holding a list of chart configurations')
+    parser.add_argument('--data', default='TestData.csv',
+                        help='a raw .csv, a directory or glob pattern of them, a '
+                             'database made by data_storage.py, or a file exported by '
+                             'data_interchange.py')
+    parser.add_argument('--output-dir', default='charts', help='where to write the graphs')
+    parser.add_argument('--formats', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'],
+                        help='the file formats to write each graph in')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='the number of worker processes (default: one per CPU)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='where to keep parsed .csv files')
+    options = parser.parse_args(arguments)
+
+    # Render off-screen, here and in every worker process.
+    matplotlib.use('Agg')
+    os.environ['MPLBACKEND'] = 'Agg'
+
+    with open(options.config, encoding='utf-8') as config_file:
+        raw_configs = json.load(config_file)
+    try:
+        charts = [ChartConfig.from_dict(config, f'chart-{i + 1:03d}')
+                  for i, config in enumerate(raw_configs)]
+    except ValueError as error:
+        print(f'Invalid configuration: {error}', file=sys.stderr)
+        return 2
+
+    manifest = render_charts(charts, options.data, options.output_dir, tuple(options.formats),
+                             options.processes, options.cache_dir)
+    print(f'Rendered {len(manifest)} charts into {options.output_dir}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""CSC110 Project Phase 2
+
+FILE DESCRIPTION
+================
+This file measures how fast each stage of the program is - parsing, filtering,
+aggregating and graphing - on synthetic datasets of 10^2 up to 10^7 months.
+For each stage and size, it reports the best time out of a few runs, the
+throughput in rows per second and the peak memory allocated. Results can be
+saved as a baseline, and later runs compared against it to catch regressions.
+
+Usage:
+    python benchmarks.py --max-size 100000 --save-baseline benchmark_baseline.json
+    python benchmarks.py --max-size 100000 --baseline benchmark_baseline.json
+
+The second command exits with status 1 if any stage got slower than the
+baseline by more than the tolerance.
+
+GROUP INFORMATION
+=================
+Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+import matplotlib
+import numpy as np
+
+import data_filtering
+import graphing
+from data_collection import CATEGORIES, MonthlyDataset, process_file
+from data_generation import generate_dataset, write_raw_csv
+
+# The dataset sizes (in months) benchmarked by default.
+DEFAULT_SIZES = tuple(10 ** exponent for exponent in range(2, 8))
+
+# The largest size some stages are run at unless limits are turned off:
+# writing and parsing a .csv with millions of columns, or drawing millions of
+# markers, takes far longer than everything else put together.
+STAGE_MAX_SIZES = {'process_file': 10 ** 5, 'generate_graph': 10 ** 5}
+
+# How much slower than the baseline (as a fraction of it) a stage may get
+# before it counts as a regression, and the least slowdown (in seconds) that
+# counts at all - anything less is timing noise.
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.005
+
+
+@dataclass
+class BenchmarkResult:
+    """How one stage performed on a dataset of one size.
+
+    Instance Attributes:
+        - stage: the name of the stage (see STAGES)
+        - size: the number of months in the dataset
+        - seconds: the best time out of every run
+        - rows_per_second: size / seconds
+        - peak_bytes: the most memory allocated at once during a run, beyond
+          what was allocated before it
+    """
+    stage: str
+    size: int
+    seconds: float
+    rows_per_second: float
+    peak_bytes: int
+
+
+@dataclass
+class Regression:
+    """A stage that got slower than its baseline.
+
+    Instance Attributes:
+        - stage: the name of the stage
+        - size: the number of months in the dataset
+        - seconds: how long the stage took now
+        - baseline_seconds: how long it took in the baseline
+    """
+    stage: str
+    size: int
+    seconds: float
+    baseline_seconds: float
+
+
+def synthetic_dataset(size: int, seed: int = 0) -> MonthlyDataset:
+    """Return a dataset of size random months, for benchmarking: 1% each of
+    garbage, duplicate and outlying rows (see data_generation.generate_dataset).
+    """
+    return generate_dataset(size, garbage_rate=0.01, duplicate_rate=0.01, outlier_rate=0.01,
+                            seed=seed).dataset
+
+
+def _copy(dataset: MonthlyDataset) -> MonthlyDataset:
+    """Return a copy of dataset that can be mutated without affecting it."""
+    return MonthlyDataset(dataset.months.copy(),
+                          {category: dataset.column(category).copy() for category in CATEGORIES},
+                          {category: mask.copy() for category, mask in dataset.validity.items()})
+
+
+def _prepare_process_file(dataset: MonthlyDataset, work_dir: str) -> Callable[[], object]:
+    """Write dataset as a raw .csv in work_dir (once per size), and return a
+    function that parses it.
+    """
+    filename = os.path.join(work_dir, f'synthetic-{len(dataset)}.csv')
+    if not os.path.exists(filename):
+        write_raw_csv(dataset, filename)
+    return lambda: process_file(filename)
+
+
+def _on_copy(function: Callable[[MonthlyDataset], object]) \
+        -> Callable[[MonthlyDataset, str], Callable[[], object]]:
+    """Return a stage (see STAGES) that runs function on a fresh copy of the
+    dataset each time - for the filters, which mutate it.
+    """
+    def prepare(dataset: MonthlyDataset, work_dir: str) -> Callable[[], object]:
+        copy = _copy(dataset)
+        return lambda: function(copy)
+
+    return prepare
+
+
+def _generate_and_draw(dataset: MonthlyDataset) -> None:
+    """Graph every category of dataset with generate_graph, and draw it.
+    With the Agg backend, showing a graph does not draw it.
+    """
+    import matplotlib.pyplot as plt
+
+    with warnings.catch_warnings():
+        # Agg warns that it cannot show the graph, and big graphs warn that
+        # placing the legend is slow.
+        warnings.simplefilter('ignore', UserWarning)
+        graphing.generate_graph(dataset, list(CATEGORIES))
+        plt.gcf().canvas.draw()
+    plt.close('all')
+
+
+# Maps the name of each stage to a function that, given a dataset and a
+# directory for scratch files, gets ready to run the stage once and returns a
+# function that runs it. Only the returned function is timed, so the filters
+# (which mutate the data) get a fresh copy of it each time.
+STAGES: dict[str, Callable[[MonthlyDataset, str], Callable[[], object]]] = {
+    'process_file': _prepare_process_file,
+    'filter_garbage_values': _on_copy(data_filtering.filter_garbage_values),
+    'filter_duplicate_data': _on_copy(data_filtering.filter_duplicate_data),
+    'filter_outlying_value':
+        _on_copy(lambda data: data_filtering.filter_outlying_value(data, 'export_cash')),
+    'filter': _on_copy(lambda data: data_filtering.filter(True, True, list(CATEGORIES), data)),
+    'calculate_aggregate_measurements':
+        lambda dataset, _: lambda: [data_filtering.calculate_aggregate_measurements(dataset, category)
+                                    for category in CATEGORIES],
+    'get_data': lambda dataset, _: lambda: graphing.get_data(dataset, list(CATEGORIES)),
+    'generate_graph': lambda dataset, _: lambda: _generate_and_draw(dataset)
+}
+
+
+def run_benchmarks(sizes: tuple[int, ...] = DEFAULT_SIZES, stages: Optional[list[str]] = None,
+                   repeat: int = 3, limit_sizes: bool = True,
+                   work_dir: Optional[str] = None) -> list[BenchmarkResult]:
+    """Benchmark each of stages (by default, every stage in STAGES) on a
+    synthetic dataset of each of sizes. Each stage is timed repeat times, then
+    run once more to measure its peak memory. Stages are skipped at sizes over
+    STAGE_MAX_SIZES, if limit_sizes.
+
+    Scratch files are written to work_dir (by default, a temporary directory
+    that is removed afterwards). Benchmarking generate_graph switches
+    matplotlib to the off-screen Agg backend.
+    """
+    if work_dir is None:
+        with tempfile.TemporaryDirectory() as temporary_dir:
+            return run_benchmarks(sizes, stages, repeat, limit_sizes, temporary_dir)
+    if 'generate_graph' in (stages or STAGES):
+        # Graphs are drawn off-screen.
+        matplotlib.use('Agg')
+
+    results = []
+    for size in sizes:
+        dataset = synthetic_dataset(size)
+        for stage in stages or list(STAGES):
+            if limit_sizes and size > STAGE_MAX_SIZES.get(stage, size):
+                continue
+            prepare = STAGES[stage]
+            times = []
+            for _ in range(repeat):
+                run = prepare(dataset, work_dir)
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+
+            run = prepare(dataset, work_dir)
+            tracemalloc.start()
+            try:
+                run()
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            seconds = min(times)
+            results.append(BenchmarkResult(stage, size, seconds,
+                                           size / seconds if seconds > 0 else float('inf'),
+                                           peak_bytes))
+    return results
+
+
+def find_regressions(results: list[BenchmarkResult], baseline: list[BenchmarkResult],
+                     tolerance: float = DEFAULT_TOLERANCE) -> list[Regression]:
+    """Return every result that is slower than the baseline result for the
+    same stage and size by more than tolerance (as a fraction of the baseline),
+    and by at least MIN_REGRESSION_SECONDS. Results not in the baseline are
+    ignored.
+    """
+    baseline_seconds = {(result.stage, result.size): result.seconds for result in baseline}
+    regressions = []
+    for result in results:
+        key = (result.stage, result.size)
+        if key not in baseline_seconds:
+            continue
+        allowed = max(baseline_seconds[key] * (1 + tolerance),
+                      baseline_seconds[key] + MIN_REGRESSION_SECONDS)
+        if result.seconds > allowed:
+            regressions.append(Regression(result.stage, result.size, result.seconds,
+                                          baseline_seconds[key]))
+    return regressions
+
+
+def save_results(results: list[BenchmarkResult], filename: str) -> None:
+    """Write results to filename as JSON, along with the versions they were
+    measured with.
+    """
+    with open(filename, 'w', encoding='utf-8') as results_file:
+        json.dump({'python': platform.python_version(), 'numpy': np.__version__,
+                   'matplotlib': matplotlib.__version__,
+                   'results': [asdict(result) for result in results]},
+                  results_file, indent=2)
+
+
+def load_results(filename: str) -> list[BenchmarkResult]:
+    """Return the results saved in filename by save_results."""
+    with open(filename, encoding='utf-8') as results_file:
+        return [BenchmarkResult(**result) for result in json.load(results_file)['results']]
+
+
+def format_results(results: list[BenchmarkResult],
+                   baseline: Optional[list[BenchmarkResult]] = None) -> str:
+    """Return a table of results, with the change from baseline (if given)."""
+    baseline_seconds = {(result.stage, result.size): result.seconds for result in baseline or []}
+    lines = [f'{"stage":<34}{"size":>10}{"best ms":>12}{"rows/s":>14}{"peak MiB":>10}'
+             + (f'{"vs base":>10}' if baseline else '')]
+    for result in results:
+        line = (f'{result.stage:<34}{result.size:>10}{result.seconds * 1000:>12.2f}'
+                f'{result.rows_per_second:>14.3g}{result.peak_bytes / 2 ** 20:>10.1f}')
+        key = (result.stage, result.size)
+        if baseline and key in baseline_seconds and baseline_seconds[key] > 0:
+            line += f'{(result.seconds / baseline_seconds[key] - 1) * 100:>+9.0f}%'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(arguments: Optional[list[str]] = None) -> int:
+    """Run the benchmarks with the given command line arguments (by default,
+    sys.argv). Return the exit status: 1 if there were regressions, else 0.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark parsing, filtering, aggregating and '
+                                                 'graphing on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='the dataset sizes, in months')
+    parser.add_argument('--max-size', type=int, default=None,
+                        help='leave out any sizes bigger than this')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=None,
+                        help='the stages to benchmark (default: all of them)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='how many times to time each stage (the best time is kept)')
+    parser.add_argument('--no-size-limits', action='store_true',
+                        help='run every stage at every size, ignoring STAGE_MAX_SIZES')
+    parser.add_argument('--save-baseline', metavar='FILE',
+                        help='save the results as a baseline to FILE')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare the results against the baseline in FILE')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='how much slower than the baseline (as a fraction) counts as '
+                             'a regression')
+    options = parser.parse_args(arguments)
+
+    sizes = tuple(size for size in options.sizes
+                  if options.max_size is None or size <= options.max_size)
+    results = run_benchmarks(sizes, options.stages, options.repeat, not options.no_size_limits)
+    baseline = load_results(options.baseline) if options.baseline else None
+    print(format_results(results, baseline))
+
+    if options.save_baseline:
+        save_results(results, options.save_baseline)
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, options.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression.stage} at {regression.size} months took '
+                  f'{regression.seconds * 1000:.2f} ms (baseline {regression.baseline_seconds * 1000:.2f} ms)',
+                  file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,15 +2,91 @@
 
 FILE DESCRIPTION
 ================
-This file collects raw data and organizes it into OneMonthData objects.
+This file collects raw data and organizes it into OneMonthData objects, or
+into a columnar MonthlyDataset of them.
 
 GROUP INFORMATION
 =================
 Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
 """
 import csv
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+import instrumentation
+from instrumentation import span
+
+# The names of the eight measurements in a OneMonthData, in dataset order,
+# mapped to the type each one is stored as.
+CATEGORY_TYPES = {
+    'passengers_can_us_int': int,
+    'passengers_can_not_us': int,
+    'freight_can_us_vehicles': int,
+    'freight_intl_teu': float,
+    'export_cash': float,
+    'import_cash': float,
+    'overall_air_passengers': int,
+    'overall_rail_passengers': int
+}
+CATEGORIES = tuple(CATEGORY_TYPES)
+
+# The raw dataset is scaled down relative to actual values. Maps each category
+# to what its raw values are multiplied by (see OneMonthData.__init__).
+CATEGORY_SCALES = {
+    'passengers_can_us_int': 1000,
+    'passengers_can_not_us': 1000,
+    'freight_can_us_vehicles': 1000,
+    'freight_intl_teu': 1000.0,
+    'export_cash': 1000000.0,
+    'import_cash': 1000000.0,
+    'overall_air_passengers': 1000,
+    'overall_rail_passengers': 1000
+}
+
+# Maps each category to the start of the label of its indicator row in the raw
+# .csv. Footnote numbers and units come after, so only the start is compared.
+INDICATOR_LABELS = {
+    'passengers_can_us_int': 'International passengers, number of Canadian and U.S. travellers',
+    'passengers_can_not_us': 'International passengers, number of Canadian and non-U.S. travellers',
+    'freight_can_us_vehicles': 'International freight, number of commercial vehicles',
+    'freight_intl_teu': 'International freight, total twenty-foot equivalent units',
+    'export_cash': 'Merchandise trade, total export of goods',
+    'import_cash': 'Merchandise trade, total import of goods',
+    'overall_air_passengers': 'Domestic and international passengers, air',
+    'overall_rail_passengers': 'Domestic and international passengers, rail'
+}
+
+# The label of the row of month names in the raw .csv.
+DATE_ROW_LABEL = 'Activity indicators'
+
+# What Statistics Canada puts in a cell in place of a value that is missing:
+# not available (..), not applicable (...), suppressed (x), too unreliable to
+# be published (F) or to be used with caution (E). Empty cells are missing too.
+MISSING_SYMBOLS = ('', '..', '...', 'x', 'F', 'E')
+
+# Where process_file_cached keeps parsed files, and how big it lets them get.
+# The cache is per user: under XDG_CACHE_HOME (or LOCALAPPDATA on Windows),
+# or else ~/.cache.
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME')
+                                 or os.environ.get('LOCALAPPDATA')
+                                 or os.path.join(os.path.expanduser('~'), '.cache'),
+                                 'csc110-transportation')
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Private constants for the cache: the first bytes of every cache file (bump
+# the version when the layout changes), cache file names' suffix, and the
+# name of the index file.
+_CACHE_MAGIC = b'CSC110C2'
+_CACHE_SUFFIX = '.bin'
+_CACHE_INDEX = 'index.json'
 
 class BadMonthError(Exception):
     """An exception for when we attempt to make a malformed date-datetime
@@ -23,6 +99,21 @@ class BadMonthError(Exception):
         return 'Invalid month encountered when attempting to' \
                'construct data.'
 
+
+class MissingIndicatorError(Exception):
+    """An exception for when a raw .csv does not have a row for one of the
+    indicators we need (or for the dates), so no months can be built from it.
+    """
+    labels: list[str]
+
+    def __init__(self, labels: list[str]) -> None:
+        super().__init__(labels)
+        self.labels = labels
+
+    def __str__(self):
+        return 'Could not find rows labelled: ' + '; '.join(self.labels)
+
+
 class OneMonthData:
     """A dataclass to store about a month's worth of data from the
     transportation activity dataset.
@@ -54,11 +145,21 @@ class OneMonthData:
     Representation Invariants:
         - month is a valid month
 
+    OneMonthData objects are immutable. Two of them are equal when their
+    dates and all eight measurements are equal, and they hash accordingly, so
+    they can be deduplicated with a set.
 
     Note: the dataset does not specify a day - we use a default value of 1
     but this is vacuous.
 
+    A measurement that is missing from the dataset (see MISSING_SYMBOLS) is
+    None.
     """
+    # Slots keep each object compact: there is no per-object __dict__.
+    __slots__ = ('date', 'passengers_can_us_int', 'passengers_can_not_us',
+                 'freight_can_us_vehicles', 'freight_intl_teu', 'export_cash',
+                 'import_cash', 'overall_air_passengers',
+                 'overall_rail_passengers', '_hash')
     date: datetime
     passengers_can_us_int: int
     passengers_can_not_us: int
@@ -70,7 +171,9 @@ class OneMonthData:
     overall_rail_passengers: int
 
     # Private attributes:
+    # _hash: the hash of this object's date and measurements, computed once.
     # _month_to_int: maps month as a string to an integer.
+    _hash: int
     _month_to_int = {'January': 1, 'February': 2, 'March': 3, 'April': 4,
                      'May': 5, 'June': 6, 'July': 7, 'August': 8, 'September': 9,
                      'October': 10, 'November': 11, 'December': 12}
@@ -90,24 +193,506 @@ class OneMonthData:
         if month not in self._month_to_int:
             raise BadMonthError
 
-        self.date = datetime(year, self._month_to_int[month], 1)
-        self.passengers_can_us_int = passengers_can_us_int * 1000
-        self.passengers_can_not_us = passengers_can_not_us * 1000
-        self.freight_can_us_vehicles = freight_can_us_vehicles * 1000
-        self.freight_intl_teu = freight_intl_teu * 1000.0
+        self._freeze(datetime(year, self._month_to_int[month], 1), {
+            'passengers_can_us_int': passengers_can_us_int * 1000,
+            'passengers_can_not_us': passengers_can_not_us * 1000,
+            'freight_can_us_vehicles': freight_can_us_vehicles * 1000,
+            'freight_intl_teu': freight_intl_teu * 1000.0,
+            # python int is quite big so this should still fit.
+            'export_cash': export_cash * 1000000.0,
+            'import_cash': import_cash * 1000000.0,
+            'overall_air_passengers': overall_air_passengers * 1000,
+            'overall_rail_passengers': overall_rail_passengers * 1000
+        })
+
+    @classmethod
+    def from_measurements(cls, date: datetime, **measurements: float) \
+            -> 'OneMonthData':
+        """Return a OneMonthData for date with the given measurements, which
+        are already at full scale (i.e. no multiplications are performed).
+
+        Preconditions:
+        - measurements has exactly one value for each name in CATEGORIES
+        """
+        one_month_data = cls.__new__(cls)
+        one_month_data._freeze(date, measurements)
+        return one_month_data
+
+    def _freeze(self, date: datetime, measurements: dict[str, float]) -> None:
+        """Set this object's date and measurements, and cache its hash.
+        This is the only place the attributes are ever assigned.
+        """
+        object.__setattr__(self, 'date', date)
+        for category in CATEGORIES:
+            object.__setattr__(self, category, measurements[category])
+        object.__setattr__(self, '_hash', hash(self._key()))
+
+    def _key(self) -> tuple:
+        """Return the date and the eight measurements of this object, in
+        dataset order. Equality and hashing are based on this tuple.
+        """
+        return (self.date, self.passengers_can_us_int, self.passengers_can_not_us,
+                self.freight_can_us_vehicles, self.freight_intl_teu,
+                self.export_cash, self.import_cash, self.overall_air_passengers,
+                self.overall_rail_passengers)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError(f'OneMonthData is immutable; cannot set {name}.')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'OneMonthData is immutable; cannot delete {name}.')
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, OneMonthData):
+            return NotImplemented
+        return self._hash == other._hash and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        measurements = ', '.join(f'{category}={getattr(self, category)!r}'
+                                 for category in CATEGORIES)
+        return f'OneMonthData(date={self.date!r}, {measurements})'
+
+    def __getstate__(self) -> tuple:
+        return self._key()
+
+    def __setstate__(self, state: tuple) -> None:
+        self._freeze(state[0], dict(zip(CATEGORIES, state[1:])))
+
+
+def date_to_ordinal(date: datetime) -> int:
+    """Return the month ordinal of date - the number of months since year 0.
+
+    >>> date_to_ordinal(datetime(2021, 4, 1))
+    24255
+    """
+    return date.year * 12 + date.month - 1
+
+
+def ordinal_to_date(ordinal: int) -> datetime:
+    """Return the datetime for the first day of the month with the given
+    month ordinal. This is the inverse of date_to_ordinal.
+
+    >>> ordinal_to_date(24255)
+    datetime.datetime(2021, 4, 1, 0, 0)
+    """
+    return datetime(int(ordinal) // 12, int(ordinal) % 12 + 1, 1)
+
+
+class MonthlyDataset:
+    """A columnar store of many months' worth of data from the transportation
+    activity dataset.
+
+    Instead of one OneMonthData object per month, each measurement is kept as
+    one contiguous NumPy array (a column), alongside an integer column of
+    month ordinals (see date_to_ordinal). Row i of the dataset is made up of
+    the i-th entry of every column.
+
+    Rows can still be handed out as OneMonthData objects on demand, so a
+    MonthlyDataset can be used mostly anywhere a list[OneMonthData] can.
+
+    Months with some values missing are kept. The missing values are marked
+    in a validity mask for their category, and their entries in the column
+    hold a placeholder: nan for float columns, and 0 for integer columns
+    (which cannot hold nan).
+
+    Instance Attributes:
+        - months: the month ordinal of each row
+        - columns: maps each name in CATEGORIES to the column of its values
+        - validity: maps a category to a boolean mask that is True for the
+          rows whose value of it is present. Categories with no missing
+          values may be left out.
+
+    Representation Invariants:
+        - set(self.columns) == set(CATEGORIES)
+        - all(len(self.columns[c]) == len(self.months) for c in self.columns)
+        - integer categories (see CATEGORY_TYPES) are stored as int64 and the
+          others as float64
+        - set(self.validity) <= set(CATEGORIES)
+        - all(len(self.validity[c]) == len(self.months) for c in self.validity)
+    """
+    months: np.ndarray
+    columns: dict[str, np.ndarray]
+    validity: dict[str, np.ndarray]
+
+    # Private attributes:
+    # _indexed_months: the months array the date index was last built for.
+    # _order: the date index - None if months is already sorted, or else the
+    #   row indices in order of month (the result of a stable argsort).
+    # _sorted_months: months, in order (months itself if already sorted).
+    # _fingerprinted_arrays: months and every column, as they were when the
+    #   fingerprint was last calculated.
+    # _fingerprint: the fingerprint last calculated (None if none has been).
+    _indexed_months: Optional[np.ndarray]
+    _order: Optional[np.ndarray]
+    _sorted_months: Optional[np.ndarray]
+    _fingerprinted_arrays: tuple[np.ndarray, ...]
+    _fingerprint: Optional[str]
+
+    def __init__(self, months: Iterable[int],
+                 columns: dict[str, Iterable[float]],
+                 validity: Optional[dict[str, Iterable[bool]]] = None) -> None:
+        """Initialize a dataset from a sequence of month ordinals, a
+        sequence of values for every category, and validity masks for the
+        categories with missing values (if any).
+
+        Existing NumPy arrays of the right type are used without copying.
+        """
+        self.months = np.asarray(months, dtype=np.int64)
+        self._indexed_months = None
+        self._order = None
+        self._sorted_months = None
+        self._fingerprinted_arrays = ()
+        self._fingerprint = None
+        self.columns = {}
+        for category in CATEGORIES:
+            column = np.asarray(columns[category],
+                                dtype=_category_dtype(category))
+            if len(column) != len(self.months):
+                raise ValueError(f'Column {category} has {len(column)} values '
+                                 f'but there are {len(self.months)} months.')
+            self.columns[category] = column
+        self.validity = {}
+        for category, mask in (validity or {}).items():
+            mask = np.asarray(mask, dtype=bool)
+            if len(mask) != len(self.months):
+                raise ValueError(f'Validity mask of {category} has {len(mask)} entries '
+                                 f'but there are {len(self.months)} months.')
+            self.validity[category] = mask
+
+    @classmethod
+    def from_records(cls, records: Iterable[OneMonthData]) -> 'MonthlyDataset':
+        """Return a dataset with one row for each OneMonthData in records,
+        in the same order. Measurements that are None are missing.
+        """
+        months = []
+        columns = {category: [] for category in CATEGORIES}
+        for record in records:
+            months.append(date_to_ordinal(record.date))
+            for category in CATEGORIES:
+                columns[category].append(getattr(record, category))
+        return cls.from_columns(months, columns)
+
+    @classmethod
+    def from_columns(cls, months: list[int],
+                     columns: dict[str, list[Optional[float]]]) -> 'MonthlyDataset':
+        """Return a dataset of the given month ordinals and lists of values of
+        every category, in which None marks a missing value.
+        """
+        columns = dict(columns)
+        validity = {}
+        for category in CATEGORIES:
+            if any(value is None for value in columns[category]):
+                validity[category] = [value is not None for value in columns[category]]
+                placeholder = missing_placeholder(category)
+                columns[category] = [placeholder if value is None else value
+                                     for value in columns[category]]
+        return cls(months, columns, validity)
+
+    @classmethod
+    def empty(cls) -> 'MonthlyDataset':
+        """Return a dataset with no rows."""
+        return cls([], {category: [] for category in CATEGORIES})
+
+    @classmethod
+    def concatenate(cls, datasets: Iterable['MonthlyDataset']) \
+            -> 'MonthlyDataset':
+        """Return a new dataset with the rows of every dataset in datasets,
+        one after the other.
+        """
+        datasets = list(datasets)
+        if not datasets:
+            return cls.empty()
+        return cls(np.concatenate([d.months for d in datasets]),
+                   {category: np.concatenate([d.columns[category]
+                                              for d in datasets])
+                    for category in CATEGORIES},
+                   {category: np.concatenate([d.is_valid(category) for d in datasets])
+                    for category in CATEGORIES
+                    if any(category in d.validity for d in datasets)})
+
+    def __len__(self) -> int:
+        return len(self.months)
+
+    def __iter__(self) -> Iterator[OneMonthData]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def __getitem__(self, item: Union[int, slice, np.ndarray]) \
+            -> Union[OneMonthData, 'MonthlyDataset']:
+        """Return row item as a OneMonthData if item is an integer.
+
+        Otherwise item is a slice, an array of row indices or a boolean mask,
+        and the selected rows are returned as a new MonthlyDataset. Slices
+        share memory with this dataset instead of copying it.
+        """
+        if isinstance(item, (int, np.integer)):
+            return self.row(int(item))
+        return MonthlyDataset(self.months[item],
+                              {category: self.columns[category][item]
+                               for category in CATEGORIES},
+                              {category: mask[item] for category, mask in self.validity.items()})
+
+    def __repr__(self) -> str:
+        return f'MonthlyDataset({len(self)} months)'
 
-        # python int is quite big so this should still fit.
-        self.export_cash = export_cash * 1000000.0
-        self.import_cash = import_cash * 1000000.0
+    def row(self, index: int) -> OneMonthData:
+        """Return row index of this dataset as a OneMonthData."""
+        return OneMonthData.from_measurements(ordinal_to_date(self.months[index]),
+                                              **self.row_values(index))
 
-        self.overall_air_passengers = overall_air_passengers * 1000
-        self.overall_rail_passengers = overall_rail_passengers * 1000
+    def row_values(self, index: int) -> dict[str, Optional[float]]:
+        """Return the measurements of row index of this dataset: a dictionary
+        mapping each category to its value, or to None if it is missing.
+        """
+        return {category: CATEGORY_TYPES[category](self.columns[category][index])
+                if category not in self.validity or self.validity[category][index] else None
+                for category in CATEGORIES}
+
+    def column(self, category: str) -> np.ndarray:
+        """Return the column of values of category, placeholders for missing
+        values included (see is_valid).
+
+        Preconditions:
+        - category in CATEGORIES
+        """
+        return self.columns[category]
+
+    def is_valid(self, category: str) -> np.ndarray:
+        """Return a boolean mask that is True for the rows whose value of
+        category is present.
 
+        Preconditions:
+        - category in CATEGORIES
+        """
+        if category in self.validity:
+            return self.validity[category]
+        return np.ones(len(self), dtype=bool)
+
+    def has_missing(self, category: str) -> bool:
+        """Return whether any value of category is missing.
+
+        Preconditions:
+        - category in CATEGORIES
+        """
+        return category in self.validity and not self.validity[category].all()
+
+    def valid_values(self, category: str) -> np.ndarray:
+        """Return the values of category that are present, in order. If none
+        are missing, this is the column itself rather than a copy.
+
+        Preconditions:
+        - category in CATEGORIES
+        """
+        if self.has_missing(category):
+            return self.columns[category][self.validity[category]]
+        return self.columns[category]
+
+    def repeated_rows(self) -> np.ndarray:
+        """Return a boolean array that is True for the rows that are identical
+        to some earlier row in all respects: month, values, and which values
+        are missing.
+
+        Each row's bytes are compared as one value, so np.unique finds the
+        first copy of every row in a single sort.
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=bool)
+        columns = [self.months]
+        for category in CATEGORIES:
+            column = self.columns[category]
+            if self.has_missing(category):
+                # Missing values are equal whatever their placeholder.
+                valid = self.validity[category]
+                column = np.where(valid, column, 0)
+                columns.append(valid.astype(np.int64))
+            if column.dtype == np.float64:
+                # Equal floats have equal bits, once -0.0 is made 0.0.
+                column = (column + 0.0).view(np.int64)
+            columns.append(column)
+        matrix = np.ascontiguousarray(np.column_stack(columns))
+        rows = matrix.view(np.dtype((np.void, matrix.itemsize * matrix.shape[1]))).ravel()
+        repeated = np.ones(len(self), dtype=bool)
+        _, first_indices = np.unique(rows, return_index=True)
+        repeated[first_indices] = False
+        return repeated
+
+    def dates(self) -> list[datetime]:
+        """Return the date of every row, in order."""
+        return [ordinal_to_date(ordinal) for ordinal in self.months.tolist()]
+
+    def to_records(self) -> list[OneMonthData]:
+        """Return every row of this dataset as a OneMonthData, in order."""
+        return list(self)
+
+    def fingerprint(self) -> str:
+        """Return a digest of the contents of this dataset: datasets with
+        the same rows, in the same order, have the same fingerprint.
+
+        The digest is recalculated only if months or a column has been
+        replaced since it was last calculated (as retain does). Mutating the
+        arrays in place is not noticed.
+        """
+        arrays = (self.months,) + tuple(self.columns[category] for category in CATEGORIES) \
+            + tuple(self.validity[category] for category in CATEGORIES
+                    if category in self.validity)
+        if len(arrays) != len(self._fingerprinted_arrays) or \
+                any(array is not old for array, old in zip(arrays, self._fingerprinted_arrays)):
+            digest = hashlib.sha256()
+            for array in arrays[:len(CATEGORIES) + 1]:
+                digest.update(np.ascontiguousarray(array).data)
+            # Only masks with something missing count, so it does not matter
+            # whether a category with nothing missing has a mask.
+            for category in CATEGORIES:
+                if self.has_missing(category):
+                    digest.update(category.encode('utf-8'))
+                    digest.update(np.packbits(self.validity[category]).data)
+            self._fingerprint = digest.hexdigest()
+            self._fingerprinted_arrays = arrays
+        return self._fingerprint
+
+    def retain(self, rows: np.ndarray) -> None:
+        """Mutate this dataset to keep only the given rows: either a boolean
+        mask that is True for the rows to keep, or an array of their indices.
+        """
+        self.months = self.months[rows]
+        for category in CATEGORIES:
+            self.columns[category] = self.columns[category][rows]
+        for category in self.validity:
+            self.validity[category] = self.validity[category][rows]
+
+    def sort_by_date(self) -> 'MonthlyDataset':
+        """Return a dataset of the same rows, ordered by month. Rows of the
+        same month keep their relative order. If this dataset is already in
+        order, return it as a view instead of copying.
+        """
+        order = self._date_index()
+        if order is None:
+            return self[:]
+        return self[order]
+
+    def months_between(self, start: datetime, end: datetime) -> 'MonthlyDataset':
+        """Return the rows from the month of start to the month of end,
+        inclusive, in order of month.
+
+        Rows are found by bisecting the date index, in O(log n) time. If this
+        dataset is already in order of month (as process_file and
+        process_files make it), the result is a view that shares its columns'
+        memory, rather than a copy.
+        """
+        return self._ordinal_range(date_to_ordinal(start), date_to_ordinal(end) + 1)
+
+    def in_month(self, date: datetime) -> 'MonthlyDataset':
+        """Return the rows for the month of date (there may be several, e.g.
+        duplicates or different releases), as per months_between.
+        """
+        return self.months_between(date, date)
 
-def process_file(filename: str) -> list[OneMonthData]:
+    def in_year(self, year: int) -> 'MonthlyDataset':
+        """Return the rows for every month of year, as per months_between."""
+        return self._ordinal_range(year * 12, (year + 1) * 12)
+
+    def in_quarter(self, year: int, quarter: int) -> 'MonthlyDataset':
+        """Return the rows for every month of the given calendar quarter of
+        year, as per months_between.
+
+        Preconditions:
+        - 1 <= quarter <= 4
+        """
+        first_month = year * 12 + (quarter - 1) * 3
+        return self._ordinal_range(first_month, first_month + 3)
+
+    def _ordinal_range(self, start: int, stop: int) -> 'MonthlyDataset':
+        """Return the rows whose month ordinals are at least start and less
+        than stop, in order of month.
+        """
+        order = self._date_index()
+        sorted_months = self._sorted_months
+        low = int(np.searchsorted(sorted_months, start, side='left'))
+        high = int(np.searchsorted(sorted_months, stop, side='left'))
+        if order is None:
+            return self[low:high]
+        return self[order[low:high]]
+
+    def _date_index(self) -> Optional[np.ndarray]:
+        """Return the date index (see _order), building it (and
+        _sorted_months) first if months has changed since it was last built.
+        """
+        if self._indexed_months is not self.months:
+            if np.all(self.months[1:] >= self.months[:-1]):
+                self._order = None
+                self._sorted_months = self.months
+            else:
+                self._order = np.argsort(self.months, kind='stable')
+                self._sorted_months = self.months[self._order]
+            self._indexed_months = self.months
+        return self._order
+
+
+def _category_dtype(category: str) -> type:
+    """Return the NumPy type that values of category are stored as."""
+    if CATEGORY_TYPES[category] is int:
+        return np.int64
+    return np.float64
+
+
+def missing_placeholder(category: str) -> float:
+    """Return what a MonthlyDataset stores in place of a missing value of
+    category: nan, or 0 for integer categories.
+    """
+    if CATEGORY_TYPES[category] is int:
+        return 0
+    return float('nan')
+
+
+@dataclass
+class RawRelease:
+    """The rows of a raw .csv from the transportation activity dataset that
+    months are made from, before any of their cells are converted to
+    numbers (see read_raw_release). Each column with a date is a month.
+
+    Instance Attributes:
+        - release_date: the file's "Release date" header, or None if it has
+          none
+        - date_row: the row of dates, without its label
+        - indicator_rows: maps each category to its row, without its label
+    """
+    release_date: Optional[datetime]
+    date_row: list[str]
+    indicator_rows: dict[str, list[str]]
+
+    def columns(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the month ordinal and the index of each column with a date,
+        in the order they appear.
+        """
+        months, dated = _decode_dates(self.date_row)
+        return months, np.flatnonzero(dated)
+
+    def cells(self, column: int) -> tuple[str, ...]:
+        """Return the cell of every category (in CATEGORIES order) in column,
+        as it is in the file.
+        """
+        return tuple(self.indicator_rows[category][column]
+                     if column < len(self.indicator_rows[category]) else ''
+                     for category in CATEGORIES)
+
+    def decode(self, columns: Optional[Iterable[int]] = None) -> MonthlyDataset:
+        """Return a MonthlyDataset of the months in the given columns, in that
+        order (by default, every column with a date). Only their cells are
+        converted to numbers.
+
+        Preconditions:
+        - every column in columns has a date
+        """
+        return _decode_dataset(self.date_row, self.indicator_rows, columns)
+
+
+def process_file(filename: str) -> MonthlyDataset:
     """Process a raw .csv from the transportation activity dataset
-    into usable and reasonably formatted OneMonthData objects.
-    Return a list of them - all of the ones we find in the file.
+    into usable and reasonably formatted monthly data.
+    Return a MonthlyDataset of it - all of the months we find in the file.
 
     Instructions to user: INPUT THE FILE NAME AS A RAW STRING, E.G.
     r'TestData.csv'.
@@ -115,61 +700,414 @@ def process_file(filename: str) -> list[OneMonthData]:
     Preconditions:
     - This python file is in the same directory as the .csv files
 
-    # The comparison will always return false due to a class instance quirk. But, conceptually,
-    # this doctest should be satisfied and will help with understanding.
-    # (instance attribute values should be the same)
     >>> expected = [OneMonthData('April', 2021, 379, 90, 452, 582.1, 48859, 49683, 572, 45), \
     OneMonthData('May', 2021, 425, 78, 443, 681.0, 49888, 50226, 640, 50), \
     OneMonthData('June', 2021, 439, 96, 474, 569.8, 55219, 51580, 937, 78), \
-    OneMonthData('July', 2021, 598, 205, 448, 584.5, 51239, 51007, 1896, 135), \
+    OneMonthData('July', 2021, 589, 205, 448, 584.5, 51239, 51007, 1896, 135), \
     OneMonthData('August', 2021, 1016, 433, 456, 621.3, 53764, 52259, 1152, 202)]
 
-    >>> process_file(r'TestData.csv') == expected
+    >>> process_file(r'TestData.csv').to_records() == expected
     True
+    """
+    with span('process_file', file=filename) as trace:
+        dataset = read_raw_release(filename).decode()
+        trace.set(rows_out=len(dataset))
+        # Counting the missing values takes a pass over each validity mask,
+        # so only do it when someone is looking.
+        if instrumentation.enabled():
+            trace.set(missing_values=sum(int(len(dataset) - mask.sum())
+                                         for mask in dataset.validity.values()))
+    return dataset
+
+
+def iter_months(filename: str) -> Iterator[OneMonthData]:
+    """Yield a OneMonthData for each month in a raw .csv from the
+    transportation activity dataset, in the order they appear in the file.
+
+    >>> next(iter_months(r'TestData.csv')).date
+    datetime.datetime(2021, 4, 1, 0, 0)
+    """
+    for month, values in iter_month_values(filename):
+        yield OneMonthData.from_measurements(ordinal_to_date(month), **values)
+
+
+def iter_month_values(filename: str) -> Iterator[tuple[int, dict[str, Optional[float]]]]:
+    """Yield the month ordinal and full scale measurements of each month in a
+    raw .csv from the transportation activity dataset.
+
+    The whole file is read and decoded before the first month is yielded:
+    the row of dates and the eight indicator rows are found by their labels
+    (see read_raw_release) and converted all at once (see decode_cells).
+    Each month is then yielded from the decoded columns.
+
+    Missing values (see MISSING_SYMBOLS) are None.
+    """
+    dataset = read_raw_release(filename).decode()
+    for index, month in enumerate(dataset.months.tolist()):
+        yield month, dataset.row_values(index)
+
+
+def decode_cells(cells: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Convert a row of cells of the raw .csv to numbers, all at once.
+    Return the values, as floats, and a boolean mask that is True for the
+    cells that have a value. Cells without one - those in MISSING_SYMBOLS -
+    are nan.
+
+    Thousands separators are dropped. Raise a ValueError if some other cell
+    is not a number.
+
+    >>> values, valid = decode_cells(['1,016', '..', '582.1', 'x'])
+    >>> values.tolist()[::2], valid.tolist()
+    ([1016.0, 582.1], [True, False, True, False])
+    """
+    if not cells:
+        return np.zeros(0), np.zeros(0, dtype=bool)
+    text = np.char.strip(np.char.replace(np.array(cells, dtype=str), ',', ''))
+    valid = ~np.isin(text, MISSING_SYMBOLS)
+    values = np.full(len(text), np.nan)
+    values[valid] = text[valid].astype(np.float64)
+    return values, valid
+
+
+def read_release(filename: str) -> tuple[Optional[datetime], MonthlyDataset]:
+    """Process a raw .csv like process_file does. Return its "Release date"
+    header (None if it has none) along with its MonthlyDataset.
+    """
+    raw_release = read_raw_release(filename)
+    return raw_release.release_date, raw_release.decode()
+
+
+def read_raw_release(filename: str) -> RawRelease:
+    """Return the release date, row of dates and indicator rows of a raw .csv
+    from the transportation activity dataset, without converting any cells
+    to numbers.
+    """
+    headers, date_row, indicator_rows = _read_indicator_rows(filename)
+    release_date = None
+    if 'Release date' in headers:
+        release_date = datetime.strptime(headers['Release date'].strip(), '%Y-%m-%d')
+    return RawRelease(release_date, date_row, indicator_rows)
+
 
+def process_files(source: str, processes: Optional[int] = None) -> MonthlyDataset:
+    """Process every raw .csv matched by source - either a directory, whose
+    .csv files are all used, or a glob pattern such as
+    r'archive/23100269-*.csv'. Files are parsed in parallel, in a pool of
+    processes (by default, one per CPU).
 
+    Return one MonthlyDataset of all of their months, merged as per
+    merge_releases: ordered by date, and with overlapping months taken from
+    the newest release.
     """
-    expected = [OneMonthData('April', 2021, 379, 90, 452, 582.1, 48859, 49683, 572, 45),
-                OneMonthData('May', 2021, 425, 78, 443, 681.0, 49888, 50226, 640, 50),
-                OneMonthData('June', 2021, 439, 96, 474, 569.8, 55219, 51580, 937, 78),
-                OneMonthData('July', 2021, 598, 205, 448, 584.5, 51239, 51007, 1896, 135),
-                OneMonthData('August', 2021, 1016, 433, 456, 621.3, 53764, 52259, 1152, 202)]
+    if os.path.isdir(source):
+        filenames = sorted(glob.glob(os.path.join(source, '*.csv')))
+    else:
+        filenames = sorted(glob.glob(source))
 
-    # Read the file, dump it into a very raw table.
+    with span('process_files', files=len(filenames)) as trace:
+        if len(filenames) <= 1 or processes == 1:
+            releases = [read_release(filename) for filename in filenames]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                releases = list(executor.map(read_release, filenames))
+
+        with span('merge_releases', rows_in=sum(len(dataset) for _, dataset in releases)):
+            dataset = merge_releases(releases)
+        trace.set(rows_out=len(dataset))
+    return dataset
+
+
+def merge_releases(releases: list[tuple[Optional[datetime], MonthlyDataset]]) \
+        -> MonthlyDataset:
+    """Merge the MonthlyDatasets of several releases into one, ordered by
+    date with one row per month.
+
+    When releases share a month, the row from the one with the newest release
+    date wins. Releases without a release date count as older than all the
+    others, and among equal release dates the later one in releases wins.
+    """
+    # Newest first, so the first occurrence of each month is the one to keep.
+    # (sorted is stable, so equal release dates keep their order - reversed.)
+    newest_first = sorted(reversed(releases),
+                          key=lambda release: release[0] or datetime.min,
+                          reverse=True)
+    combined = MonthlyDataset.concatenate(dataset for _, dataset in newest_first)
+    # np.unique returns the first index of each month, ordered by month.
+    _, first_indices = np.unique(combined.months, return_index=True)
+    return combined[first_indices]
+
+
+def process_file_cached(filename: str, cache_dir: str = DEFAULT_CACHE_DIR,
+                        max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES) -> MonthlyDataset:
+    """Return the same MonthlyDataset as process_file(filename), but from an
+    on-disk cache of parsed files in cache_dir when possible.
+
+    Cache entries are binary files of the dataset's columns, named after the
+    SHA-256 of the .csv's contents, and are loaded back by memory mapping
+    them (so their columns are read-only). An index in cache_dir remembers
+    each .csv's path, size and modification time, so an unchanged file is
+    not even re-hashed. A file whose contents changed gets a new entry -
+    the old one is never used again, and is eventually evicted.
+
+    After a new entry is written, the least recently used entries are
+    evicted until the cache takes up at most max_cache_bytes, and the files
+    whose entries are gone are dropped from the index.
+    """
+    with span('process_file_cached', file=filename) as trace:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        index = _read_cache_index(cache_dir)
+
+        entry = index.get(path)
+        if entry is not None and entry['size'] == stat.st_size \
+                and entry['mtime_ns'] == stat.st_mtime_ns:
+            cache_file = os.path.join(cache_dir, entry['sha256'] + _CACHE_SUFFIX)
+            dataset = _load_cache_file(cache_file)
+            if dataset is not None:
+                trace.set(rows_out=len(dataset), cache='hit')
+                return dataset
+
+        # The size or modification time changed (or the entry is gone), so
+        # check the contents themselves.
+        content_hash = file_sha256(path)
+        index[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                       'sha256': content_hash}
+        cache_file = os.path.join(cache_dir, content_hash + _CACHE_SUFFIX)
+        dataset = _load_cache_file(cache_file)
+        if dataset is None:
+            trace.set(cache='miss')
+            _write_cache_file(cache_file, process_file(path))
+            _evict_cache_files(cache_dir, max_cache_bytes, keep=cache_file)
+            dataset = _load_cache_file(cache_file)
+        else:
+            trace.set(cache='hit')
+        # Forget the files whose entries were evicted (or deleted by hand).
+        index = {indexed_path: indexed for indexed_path, indexed in index.items()
+                 if os.path.exists(os.path.join(cache_dir, indexed['sha256'] + _CACHE_SUFFIX))}
+        _write_cache_index(cache_dir, index)
+        trace.set(rows_out=len(dataset))
+    return dataset
+
+
+def file_sha256(filename: str) -> str:
+    """Return the hex SHA-256 digest of the contents of filename."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as raw_file:
+        for chunk in iter(lambda: raw_file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_cache_file(cache_file: str, dataset: MonthlyDataset) -> None:
+    """Write dataset to cache_file: a header (_CACHE_MAGIC and the number of
+    rows), then the month ordinals, then each column in CATEGORIES order,
+    then each column's validity mask as a bitmap (one bit per row).
+    Every value takes 8 bytes, so each column can be memory mapped on its own.
+    """
+    temporary_file = cache_file + '.tmp'
+    with open(temporary_file, 'wb') as binary_file:
+        binary_file.write(_CACHE_MAGIC)
+        binary_file.write(np.int64(len(dataset)).tobytes())
+        binary_file.write(dataset.months.astype('<i8').tobytes())
+        for category in CATEGORIES:
+            dtype = np.dtype(_category_dtype(category)).newbyteorder('<')
+            binary_file.write(dataset.column(category).astype(dtype).tobytes())
+        for category in CATEGORIES:
+            binary_file.write(np.packbits(dataset.is_valid(category)).tobytes())
+    # Replace in one step, so a reader never sees a half written file.
+    os.replace(temporary_file, cache_file)
+
+
+def _load_cache_file(cache_file: str) -> Optional[MonthlyDataset]:
+    """Return the MonthlyDataset in cache_file, memory mapped, or None if the
+    file does not exist or is not a cache file of the current format.
+    Mark the file as recently used.
+    """
+    try:
+        with open(cache_file, 'rb') as binary_file:
+            header = binary_file.read(len(_CACHE_MAGIC) + 8)
+    except OSError:
+        return None
+    if len(header) < len(_CACHE_MAGIC) + 8 or not header.startswith(_CACHE_MAGIC):
+        return None
+
+    length = int(np.frombuffer(header[len(_CACHE_MAGIC):], dtype='<i8')[0])
+    bitmap_size = (length + 7) // 8
+    if os.path.getsize(cache_file) != len(header) + 8 * length * (len(CATEGORIES) + 1) \
+            + bitmap_size * len(CATEGORIES):
+        return None
+    if length == 0:
+        # np.memmap cannot map zero bytes.
+        return MonthlyDataset.empty()
+
+    offset = len(header)
+    months = np.memmap(cache_file, dtype='<i8', mode='r', offset=offset, shape=(length,))
+    columns = {}
+    for category in CATEGORIES:
+        offset += 8 * length
+        dtype = np.dtype(_category_dtype(category)).newbyteorder('<')
+        columns[category] = np.memmap(cache_file, dtype=dtype, mode='r',
+                                      offset=offset, shape=(length,))
+    offset += 8 * length
+    validity = {}
+    for category in CATEGORIES:
+        bitmap = np.memmap(cache_file, dtype=np.uint8, mode='r', offset=offset,
+                           shape=(bitmap_size,))
+        mask = np.unpackbits(bitmap, count=length).astype(bool)
+        # Only keep the masks that mark something missing.
+        if not mask.all():
+            validity[category] = mask
+        offset += bitmap_size
+    # Eviction goes by modification time, so touching the file marks it used.
+    os.utime(cache_file)
+    return MonthlyDataset(months, columns, validity)
+
+
+def _evict_cache_files(cache_dir: str, max_cache_bytes: int, keep: str) -> None:
+    """Delete the least recently used cache files in cache_dir until they
+    take up at most max_cache_bytes, never deleting keep. Files that cannot
+    be deleted yet are left for next time.
+    """
+    cache_files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+                   if name.endswith(_CACHE_SUFFIX)]
+    cache_files.sort(key=os.path.getmtime)
+    total_size = sum(os.path.getsize(cache_file) for cache_file in cache_files)
+    for cache_file in cache_files:
+        if total_size <= max_cache_bytes:
+            break
+        if os.path.abspath(cache_file) != os.path.abspath(keep):
+            size = os.path.getsize(cache_file)
+            try:
+                os.remove(cache_file)
+            except PermissionError:
+                # Windows cannot delete a file that is still memory mapped.
+                continue
+            total_size -= size
+
+
+def _read_cache_index(cache_dir: str) -> dict[str, dict]:
+    """Return the cache index in cache_dir, or an empty one if there is none
+    (or it cannot be read).
+    """
+    try:
+        with open(os.path.join(cache_dir, _CACHE_INDEX), encoding='utf-8') as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache_index(cache_dir: str, index: dict[str, dict]) -> None:
+    """Replace the cache index in cache_dir with index."""
+    index_path = os.path.join(cache_dir, _CACHE_INDEX)
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as index_file:
+        json.dump(index, index_file)
+    os.replace(index_path + '.tmp', index_path)
+
+
+def _decode_dataset(date_row: list[str], indicator_rows: dict[str, list[str]],
+                    columns: Optional[Iterable[int]] = None) -> MonthlyDataset:
+    """Return a MonthlyDataset of the months in the given columns of the row
+    of dates and indicator rows, as read by _read_indicator_rows (by default,
+    every column with a date).
+
+    Every column with a date is a month, even if some (or all) of its values
+    are missing. Each indicator row is decoded in one go, by decode_cells.
+    """
+    months, dated = _decode_dates(date_row)
+    if columns is not None:
+        columns = list(columns)
+        # The month of each chosen column, out of those of every dated column.
+        months = months[np.searchsorted(np.flatnonzero(dated), columns)]
+
+    data_columns = {}
+    validity = {}
+    for category in CATEGORIES:
+        row = indicator_rows[category]
+        # Rows may stop short of the last dates; the rest is empty.
+        if columns is None:
+            # Slicing whole rows is quicker than picking out every column.
+            values, valid = decode_cells(row[:len(date_row)] + [''] * (len(date_row) - len(row)))
+            values, valid = values[dated], valid[dated]
+        else:
+            values, valid = decode_cells([row[col] if col < len(row) else '' for col in columns])
+
+        values *= CATEGORY_SCALES[category]
+        if CATEGORY_TYPES[category] is int:
+            if np.any(values[valid] != np.round(values[valid])):
+                raise ValueError(f'The values of {category} must be whole numbers.')
+            values[~valid] = missing_placeholder(category)
+        data_columns[category] = values.astype(_category_dtype(category))
+        if not valid.all():
+            validity[category] = valid
+    return MonthlyDataset(months, data_columns, validity)
+
+
+def _decode_dates(date_row: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the month ordinals of the cells of the row of dates that are
+    not empty, and a boolean mask that is True for those cells.
+
+    Each distinct date is parsed once. Raise a BadMonthError if a month name
+    is not valid.
+    """
+    # Maps each date seen so far to its month ordinal.
+    ordinals = {}
+    months = []
+    dated = np.zeros(len(date_row), dtype=bool)
+    for col, cell in enumerate(date_row):
+        if cell == '':
+            continue
+        if cell not in ordinals:
+            month_name, year = cell.split()
+            if month_name not in OneMonthData._month_to_int:
+                raise BadMonthError
+            ordinals[cell] = int(year) * 12 + OneMonthData._month_to_int[month_name] - 1
+        months.append(ordinals[cell])
+        dated[col] = True
+    return np.array(months, dtype=np.int64), dated
+
+
+def _read_indicator_rows(filename: str) \
+        -> tuple[dict[str, str], list[str], dict[str, list[str]]]:
+    """Scan a raw .csv for its header block, its row of dates and its eight
+    indicator rows.
+    Return the header block as a mapping from each "Name: value" line's name
+    to its value, the row of dates, and a mapping from each category to its
+    row - the rows without their labels.
+
+    Stop reading as soon as every row has been found. Raise a
+    MissingIndicatorError if some are not in the file.
+    """
+    headers = {}
+    date_row = None
+    indicator_rows = {}
     # Need the UTF-8 encoding or python tries to use binary to decode.
-    raw_file = open(filename, encoding='UTF-8')
-    reader = csv.reader(raw_file)
-    data = [row for row in reader]
-    raw_file.close()
-
-    # Iterate over the columns. Manually assign appropriate values into a data
-    # class object. Return a list.
-    # Accumulator for OneMonthData objects.
-    data_so_far = []
-    for col in range(1, len(data[8])):
-        date_str = data[9][col]
-        # Quickly make sure no values are empty - if one is, ignore the object.
-        values = [date_str.split()[0], date_str.split()[1], data[11][col],
-                  data[12][col], data[13][col], data[15][col], data[17][col],
-                  data[18][col], data[20][col], data[21][col]]
-
-        if not any((value == '' for value in values)):
-            current_month_data = OneMonthData(
-                month=date_str.split()[0],
-                year=int(date_str.split()[1]),
-                # The dataset uses commas to separate sections of large numbers. They need to be culled.
-                passengers_can_us_int=int(data[11][col].replace(',', '')),
-                passengers_can_not_us=int(data[12][col].replace(',', '')),
-                freight_can_us_vehicles=int(data[13][col].replace(',', '')),
-                freight_intl_teu=float(data[15][col].replace(',', '')),
-                export_cash=float(data[17][col].replace(',', '')),
-                import_cash=float(data[18][col].replace(',', '')),
-                overall_air_passengers=int(data[20][col].replace(',', '')),
-                overall_rail_passengers=int(data[21][col].replace(',', ''))
-            )
-            data_so_far.append(current_month_data)
-
-    return data_so_far
+    # The -sig variant drops the byte order mark Statistics Canada puts first.
+    with open(filename, encoding='utf-8-sig', newline='') as raw_file:
+        for row in csv.reader(raw_file):
+            if not row:
+                continue
+            label = row[0].strip()
+            if date_row is None and len(row) == 1 and ': ' in label:
+                name, value = label.split(': ', 1)
+                headers[name] = value
+            elif label == DATE_ROW_LABEL:
+                date_row = row[1:]
+            else:
+                for category in CATEGORIES:
+                    if category not in indicator_rows \
+                            and label.startswith(INDICATOR_LABELS[category]):
+                        indicator_rows[category] = row[1:]
+                        break
+
+            if date_row is not None and len(indicator_rows) == len(CATEGORIES):
+                return headers, date_row, indicator_rows
+
+    missing = [INDICATOR_LABELS[category] for category in CATEGORIES
+               if category not in indicator_rows]
+    if date_row is None:
+        missing.insert(0, DATE_ROW_LABEL)
+    raise MissingIndicatorError(missing)
 
 
 if __name__ == '__main__':
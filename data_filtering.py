@@ -11,17 +11,21 @@ GROUP INFORMATION
 Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
 """
 import math
-import statistics
+from dataclasses import dataclass
+from typing import Optional, Union
 
-from data_collection import OneMonthData
-import datetime
+import numpy as np
+
+import instrumentation
+from data_collection import CATEGORIES, MonthlyDataset, OneMonthData
+from instrumentation import span
 
 earliest_yr_in_dataset = 2017
 latest_yr_in_dataset = 2021
 
 
-def calculate_aggregate_measurements(data: list[OneMonthData], value: str) \
-        -> dict[str, float]:
+def calculate_aggregate_measurements(data: Union[list[OneMonthData], MonthlyDataset],
+                                     value: str) -> dict[str, float]:
     """Calculate some aggregate statistical measurements on filtered data, for
     some particular measurement.
 
@@ -29,11 +33,16 @@ def calculate_aggregate_measurements(data: list[OneMonthData], value: str) \
 
     Statistical measurements are: mean, mode, median, standard deviation.
 
+    Missing values are left out.
+
     Preconditions:
     - data has been filtered, if appropriate.
     """
     statistical_measurements = {}
-    values = [getattr(x, value) for x in data]
+    if isinstance(data, MonthlyDataset):
+        values = data.valid_values(value).tolist()
+    else:
+        values = [getattr(x, value) for x in data if getattr(x, value) is not None]
     # calculate mean by summing and dividing.
     statistical_measurements['mean'] = sum(values) \
                                        / len(values)
@@ -69,85 +78,259 @@ def calculate_aggregate_measurements(data: list[OneMonthData], value: str) \
 
     return  statistical_measurements
 
+
+def calculate_all_aggregate_measurements(data: Union[list[OneMonthData], MonthlyDataset],
+                                         categories: tuple[str, ...] = CATEGORIES,
+                                         extremes: bool = False,
+                                         quantiles: tuple[float, ...] = ()) \
+        -> dict[str, dict[str, float]]:
+    """Calculate the aggregate statistical measurements of
+    calculate_aggregate_measurements for many categories at once.
+
+    Return a table: a dictionary mapping each category to a dictionary mapping
+    measurement name to its value. The values are the same as
+    calculate_aggregate_measurements gives, up to floating point rounding.
+
+    If extremes is True, also include the 'min' and 'max' of each category,
+    and for each q in quantiles, include the 'quantile q' (interpolated the
+    same way as statistics.quantiles(..., method='inclusive')).
+
+    All categories are sorted together in one vectorized call, and every
+    measurement is read off of that sort. Categories with missing values are
+    measured separately, over only the rows where they are present.
+
+    Preconditions:
+    - data has been filtered, if appropriate.
+    - len(data) > 0
+    - all(0 <= q <= 1 for q in quantiles)
+    """
+    dataset = _as_dataset(data)
+    if len(dataset) == 0:
+        raise ValueError('Cannot calculate measurements of no data.')
+    partial = [category for category in categories if dataset.has_missing(category)]
+    if partial:
+        complete = tuple(category for category in categories if category not in partial)
+        table = calculate_all_aggregate_measurements(dataset, complete, extremes, quantiles) \
+            if complete else {}
+        for category in partial:
+            table.update(calculate_all_aggregate_measurements(
+                dataset[dataset.is_valid(category)], (category,), extremes, quantiles))
+        return {category: table[category] for category in categories}
+    length = len(dataset)
+    columns = [dataset.column(category) for category in categories]
+    matrix = np.vstack([column.astype(np.float64) for column in columns])
+
+    means = matrix.mean(axis=1)
+    standard_deviations = np.sqrt(((matrix - means[:, np.newaxis]) ** 2).mean(axis=1))
+
+    # A stable sort keeps equal values in their original order, so the first
+    # of each run of equal values is the earliest occurrence of that value.
+    order = np.argsort(matrix, axis=1, kind='stable')
+    sorted_matrix = np.take_along_axis(matrix, order, axis=1)
+
+    table = {}
+    for row, category in enumerate(categories):
+        sorted_values = columns[row][order[row]]
+        statistical_measurements = {'mean': float(means[row]),
+                                    'mode': _mode_of_sorted(sorted_values, order[row])}
+        if length % 2 != 0:
+            statistical_measurements['median'] = sorted_values[length // 2].item()
+        else:
+            statistical_measurements['median'] = float(sorted_matrix[row, (length - 1) // 2]
+                                                       + sorted_matrix[row, (length + 1) // 2]) / 2
+        statistical_measurements['standard deviation'] = float(standard_deviations[row])
+
+        if extremes:
+            statistical_measurements['min'] = sorted_values[0].item()
+            statistical_measurements['max'] = sorted_values[-1].item()
+        for q in quantiles:
+            statistical_measurements[f'quantile {q}'] = \
+                _quantile_of_sorted(sorted_matrix[row], q)
+        table[category] = statistical_measurements
+
+    return table
+
+
+def _mode_of_sorted(sorted_values: np.ndarray, original_indices: np.ndarray) -> float:
+    """Return the most common value in sorted_values, which were sorted with a
+    stable sort from positions original_indices. Ties go to the value that
+    occurred first originally, as in calculate_aggregate_measurements.
+    """
+    # Where each run of equal values starts, and how long it is.
+    run_starts = np.flatnonzero(np.concatenate(([True], sorted_values[1:] != sorted_values[:-1])))
+    run_lengths = np.diff(np.append(run_starts, len(sorted_values)))
+    candidates = run_starts[run_lengths == run_lengths.max()]
+    return sorted_values[candidates[np.argmin(original_indices[candidates])]].item()
+
+
+def _quantile_of_sorted(sorted_values: np.ndarray, q: float) -> float:
+    """Return the q-th quantile of sorted_values by linear interpolation
+    between the closest ranks.
+    """
+    position = (len(sorted_values) - 1) * q
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return float(sorted_values[lower]
+                 + (position - lower) * (sorted_values[upper] - sorted_values[lower]))
+
+
+@dataclass
+class FilterResult:
+    """The outcome of evaluating the filtration rules on some monthly data.
+
+    No data is copied or mutated to produce a FilterResult: it only holds
+    row indices and masks into the data it was evaluated on.
+
+    Instance Attributes:
+        - kept: the indices of the rows that passed every rule, in order
+        - rejected: the indices of the rows that failed some rule, in order
+        - garbage: True for the rows with "garbage" values
+        - duplicates: True for the rows that are duplicates of an earlier row
+        - outliers: maps each category outliers were filtered for to a mask
+          that is True for the rows with an outlying value of it
+
+    Representation Invariants:
+        - sorted(list(self.kept) + list(self.rejected)) == list(range(n)),
+          where n is the number of rows the rules were evaluated on
+    """
+    kept: np.ndarray
+    rejected: np.ndarray
+    garbage: np.ndarray
+    duplicates: np.ndarray
+    outliers: dict[str, np.ndarray]
+
+
+def evaluate_filters(filter_garbage: bool, filter_duplicates: bool,
+                     values_to_filter_outliers_for: list[str],
+                     raw_data: Union[list[OneMonthData], MonthlyDataset]) -> FilterResult:
+    """Evaluate the garbage, duplicate and outlier rules on raw_data as
+    boolean masks, and combine them in one pass. raw_data is not mutated.
+
+    The rules are applied in the same order as in filter: the quartiles used
+    for outlier detection only consider rows that are not garbage or
+    duplicates (when those rules are on). Every outlier category is
+    evaluated against the same rows, rather than one after the other.
+
+    Preconditions:
+    - values_to_filter_outliers_for should consist only of valid value names.
+    """
+    dataset = _as_dataset(raw_data)
+    with span('evaluate_filters', rows_in=len(dataset)) as trace:
+        with span('garbage rule'):
+            garbage = _garbage_mask(dataset) if filter_garbage \
+                else np.zeros(len(dataset), dtype=bool)
+        with span('duplicate rule'):
+            duplicates = dataset.repeated_rows() if filter_duplicates \
+                else np.zeros(len(dataset), dtype=bool)
+
+        # Quartiles come from the rows that survived the earlier rules.
+        with span('outlier rule') as rule_trace:
+            if instrumentation.enabled():
+                rule_trace.set(categories=list(values_to_filter_outliers_for))
+            outliers, any_outlier = outlier_masks(dataset, values_to_filter_outliers_for,
+                                                  rows=~(garbage | duplicates))
+        rejected = garbage | duplicates | any_outlier
+        result = FilterResult(kept=np.flatnonzero(~rejected), rejected=np.flatnonzero(rejected),
+                              garbage=garbage, duplicates=duplicates, outliers=outliers)
+
+        # Counting what each rule rejected takes a pass over each mask, so
+        # only do it when someone is looking.
+        if instrumentation.enabled():
+            trace.set(rows_out=len(result.kept), garbage=int(garbage.sum()),
+                      duplicates=int(duplicates.sum()),
+                      outliers={value: int(mask.sum()) for value, mask in outliers.items()})
+    return result
+
+
+def outlier_masks(raw_data: Union[list[OneMonthData], MonthlyDataset],
+                  values_to_filter_outliers_for: list[str],
+                  rows: Optional[np.ndarray] = None) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """Check every category in values_to_filter_outliers_for for outliers at
+    once. Return a dictionary mapping each of those categories to a boolean
+    mask that is True for the rows with an outlying value of it, and a mask
+    that is True for the rows that are outliers in any of them.
+
+    If rows is given, it is a boolean mask of the rows to consider: the
+    quartiles are computed from those rows only, and no other row is ever an
+    outlier. A row missing a category's value is not considered for it.
+
+    Preconditions:
+    - values_to_filter_outliers_for should consist only of valid value names.
+    """
+    dataset = _as_dataset(raw_data)
+    if rows is None:
+        rows = np.ones(len(dataset), dtype=bool)
+    outliers = np.zeros((len(values_to_filter_outliers_for), len(dataset)), dtype=bool)
+    complete = [i for i, value in enumerate(values_to_filter_outliers_for)
+                if not dataset.has_missing(value)]
+    if complete:
+        matrix = np.vstack([dataset.column(values_to_filter_outliers_for[i])[rows]
+                            .astype(np.float64) for i in complete])
+        outliers[np.ix_(complete, rows)] = _outlier_matrix(matrix)
+    # Each category with missing values has rows of its own to consider.
+    for i, value in enumerate(values_to_filter_outliers_for):
+        if dataset.has_missing(value):
+            present = rows & dataset.is_valid(value)
+            matrix = dataset.column(value)[present].astype(np.float64)[np.newaxis]
+            outliers[i, present] = _outlier_matrix(matrix)[0]
+
+    return ({value: outliers[i] for i, value in enumerate(values_to_filter_outliers_for)},
+            outliers.any(axis=0))
+
+
 def filter(filter_garbage: bool, filter_duplicates: bool,
-           values_to_filter_outliers_for: list[str], raw_data: list[OneMonthData]) \
-        -> list[OneMonthData]:
+           values_to_filter_outliers_for: list[str],
+           raw_data: Union[list[OneMonthData], MonthlyDataset]) \
+        -> Union[list[OneMonthData], MonthlyDataset]:
     """Filter according to instructions given as arguments.
     Mutate the raw_data according to the arguments given.
     To filter no outliers, keep the list empty.
 
-    Return a list of all filtered elements.
+    Return a list of all filtered elements (or a MonthlyDataset of them, if
+    raw_data is a MonthlyDataset), in their original order.
+
+    This is a wrapper around evaluate_filters, which does not mutate anything.
 
     Preconditions:
     - values_to_filter_outliers_for should consist only of valid value names.
     """
-    filtered_values = []
-    if filter_garbage:
-        filtered_values.extend(filter_garbage_values(raw_data))
-
-    if filter_duplicates:
-        filtered_values.extend(filter_duplicate_data(raw_data))
-
-    for value in values_to_filter_outliers_for:
-        filtered_values.extend(filter_outlying_value(raw_data, value))
+    with span('filter', rows_in=len(raw_data)) as trace:
+        result = evaluate_filters(filter_garbage, filter_duplicates,
+                                  values_to_filter_outliers_for, raw_data)
+        filtered = _apply_filter_result(raw_data, result)
+        trace.set(rows_out=len(raw_data))
+    return filtered
 
-    return filtered_values
 
-
-def filter_garbage_values(raw_data: list[OneMonthData]) \
-        -> list[OneMonthData]:
+def filter_garbage_values(raw_data: Union[list[OneMonthData], MonthlyDataset]) \
+        -> Union[list[OneMonthData], MonthlyDataset]:
     """Mutate a list of OneMonthData objects, removing any objects
     with "garbage" instance attribute values.
     Return the list of objects removed.
 
+    Garbage values are impossible negative values, and dates (years) outside
+    of the dataset's range.
+
     We recommend that this filtration not be
     turned off, and always be run first. Though we leave the option to
     the user.
     """
-    # Remove impossible negative values, mostly.
-    removed_objects = []
-
-    for data_piece in raw_data:
-        data_piece_attributes = vars(data_piece)
-        if not all(
-                (type(data_piece_attributes[x]) is datetime.datetime
-                         or data_piece_attributes[x] >= 0 for x in vars(data_piece))
+    return _apply_filter_result(raw_data, evaluate_filters(True, False, [], raw_data))
 
-        ):
-            raw_data.remove(data_piece)
-            removed_objects.append(data_piece)
 
-    # Also, remove objects with impossible dates (year)
-    for data_piece in raw_data:
-        if latest_yr_in_dataset < data_piece.date.year < earliest_yr_in_dataset:
-            raw_data.remove(data_piece)
-            removed_objects.append(data_piece)
-
-    return removed_objects
-
-
-def filter_duplicate_data(raw_data: list[OneMonthData]):
+def filter_duplicate_data(raw_data: Union[list[OneMonthData], MonthlyDataset]) \
+        -> Union[list[OneMonthData], MonthlyDataset]:
     """Mutate a list of OneMonthData objects, to remove duplicate objects.
     A duplicate object is one that is completely identical to another one, in all
     respects. Return a list of culled duplicate objects.
 
     If, for some reason, duplicate data is permissible, this can be skipped.
     """
-    unique_values = set(raw_data)
-    # Vacuous re-assignment to break aliasing
-    value_copy_raw_data_list = raw_data + []
-    # Get non-unique values.
-    # unique_values should be within value_copy_raw_data_list.
-    for value in unique_values:
-        value_copy_raw_data_list.remove(value)
+    return _apply_filter_result(raw_data, evaluate_filters(False, True, [], raw_data))
 
-    for duplicate in value_copy_raw_data_list:
-        raw_data.remove(duplicate)
-    return value_copy_raw_data_list
 
-
-def filter_outlying_value(raw_data: list[OneMonthData], value_name: str) \
-        -> list[OneMonthData]:
+def filter_outlying_value(raw_data: Union[list[OneMonthData], MonthlyDataset],
+                          value_name: str) -> Union[list[OneMonthData], MonthlyDataset]:
     """
     Mutate raw_data to remove entries that include a statistically outlying
     value of some value. Return a list of removed entries.
@@ -158,23 +341,7 @@ def filter_outlying_value(raw_data: list[OneMonthData], value_name: str) \
     Preconditions:
     - value_name != 'date'
     """
-    # Generate a list of the value in question from all the OneMonthData values.
-    value_list_number_only = [getattr(bit, value_name) for bit in raw_data]
-    # Sort the list. Compute IQR, Q1, and Q3.
-    value_list_number_only = sorted(value_list_number_only)
-    quantiles = statistics.quantiles(data=value_list_number_only, n=4,
-                                     method='inclusive')
-    q1 = quantiles[0]
-    q3 = quantiles[2]
-    iqr = q3 - q1
-    # Iterate through all values and cull entries w/ outliers.
-    value_list = [(getattr(bit, value_name), bit) for bit in raw_data]
-    removed_entries = []
-    for value in value_list:
-        if is_outlier(value[0], q1, q3, iqr):
-            raw_data.remove(value[1])
-            removed_entries.append(value[1])
-    return removed_entries
+    return _apply_filter_result(raw_data, evaluate_filters(False, False, [value_name], raw_data))
 
 
 def is_outlier(value: int, q1: int, q3: int, iqr: int) -> bool:
@@ -184,6 +351,73 @@ def is_outlier(value: int, q1: int, q3: int, iqr: int) -> bool:
     return value > 1.5 * iqr + q3 or value < q1 - 1.5 * iqr
 
 
+def _as_dataset(raw_data: Union[list[OneMonthData], MonthlyDataset]) -> MonthlyDataset:
+    """Return raw_data as a MonthlyDataset, building one if it is a list."""
+    if isinstance(raw_data, MonthlyDataset):
+        return raw_data
+    return MonthlyDataset.from_records(raw_data)
+
+
+def _garbage_mask(dataset: MonthlyDataset) -> np.ndarray:
+    """Return a boolean array that is True for the rows of dataset with a
+    "garbage" value: a negative measurement, or a year outside of
+    earliest_yr_in_dataset to latest_yr_in_dataset.
+    """
+    years = dataset.months // 12
+    mask = (years < earliest_yr_in_dataset) | (years > latest_yr_in_dataset)
+    for category in CATEGORIES:
+        mask |= dataset.column(category) < 0
+    return mask
+
+
+def _outlier_matrix(matrix: np.ndarray) -> np.ndarray:
+    """Return a boolean matrix that is True for the entries of matrix that are
+    outliers within their row, as per is_outlier.
+
+    The quartiles of every row are found with one np.partition call (a
+    linear time selection), rather than by sorting.
+    """
+    length = matrix.shape[1]
+    if length < 2:
+        # There are no quartiles without at least two points.
+        return np.zeros(matrix.shape, dtype=bool)
+
+    # Linear interpolation between the closest ranks, the same as
+    # statistics.quantiles(..., method='inclusive').
+    ranks = {}
+    for q in (0.25, 0.75):
+        position = (length - 1) * q
+        lower = int(position)
+        ranks[q] = (lower, min(lower + 1, length - 1), position - lower)
+    kth = sorted({rank for q in ranks for rank in ranks[q][:2]})
+    partitioned = np.partition(matrix, kth, axis=1)
+
+    quartiles = {}
+    for q in ranks:
+        lower, upper, fraction = ranks[q]
+        quartiles[q] = partitioned[:, lower] + fraction * (partitioned[:, upper]
+                                                           - partitioned[:, lower])
+    q1 = quartiles[0.25][:, np.newaxis]
+    q3 = quartiles[0.75][:, np.newaxis]
+    iqr = q3 - q1
+    return (matrix > 1.5 * iqr + q3) | (matrix < q1 - 1.5 * iqr)
+
+
+def _apply_filter_result(raw_data: Union[list[OneMonthData], MonthlyDataset],
+                         result: FilterResult) -> Union[list[OneMonthData], MonthlyDataset]:
+    """Mutate raw_data to keep only the rows result kept.
+    Return the rows result rejected, in the same form as raw_data.
+    """
+    if isinstance(raw_data, MonthlyDataset):
+        removed_rows = raw_data[result.rejected]
+        raw_data.retain(result.kept)
+        return removed_rows
+
+    removed_objects = [raw_data[i] for i in result.rejected]
+    raw_data[:] = [raw_data[i] for i in result.kept]
+    return removed_objects
+
+
 if __name__ == '__main__':
     pass
     # whatever I decide to put into the main block.
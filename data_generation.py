@@ -0,0 +1,221 @@
+"""CSC110 Project Phase 2
+
+FILE DESCRIPTION
+================
+This file generates synthetic monthly data, for testing and load-testing:
+millions of months at once if need be, with a chosen share of garbage values,
+exact duplicates, outliers and missing values. Generated data can be written
+out as a raw .csv laid out exactly like the transportation activity dataset,
+so that it goes through the same parsing as the real thing.
+
+GROUP INFORMATION
+=================
+Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from data_collection import CATEGORIES, CATEGORY_SCALES, CATEGORY_TYPES, DATE_ROW_LABEL, \
+    MonthlyDataset, OneMonthData
+
+# A typical raw (scaled down) value of each category, before the pandemic.
+# Generated values are spread around these.
+TYPICAL_RAW_VALUES = {
+    'passengers_can_us_int': 3500,
+    'passengers_can_not_us': 900,
+    'freight_can_us_vehicles': 450,
+    'freight_intl_teu': 600.0,
+    'export_cash': 48000.0,
+    'import_cash': 49000.0,
+    'overall_air_passengers': 6000,
+    'overall_rail_passengers': 350
+}
+
+# The full label of each category's indicator row in the raw .csv, and the
+# unit row that comes before some of them.
+RAW_LABELS = {
+    'passengers_can_us_int': 'International passengers, number of Canadian and U.S. travellers '
+                             'between Canada and the United States 1  (x 1,000)',
+    'passengers_can_not_us': 'International passengers, number of Canadian and non-U.S. '
+                             'travellers overseas, all modes of transport 2  (x 1,000)',
+    'freight_can_us_vehicles': 'International freight, number of commercial vehicles travelling '
+                               'between Canada and the United States 3  (x 1,000)',
+    'freight_intl_teu': 'International freight, total twenty-foot equivalent units (TEUs) handled '
+                        'at four major container ports 4  (x 1,000)',
+    'export_cash': 'Merchandise trade, total export of goods 5  (x 1,000,000)',
+    'import_cash': 'Merchandise trade, total import of goods 6  (x 1,000,000)',
+    'overall_air_passengers': 'Domestic and international passengers, air 7  (x 1,000)',
+    'overall_rail_passengers': 'Domestic and international passengers, rail (VIA Rail) 8  '
+                               '(x 1,000)'
+}
+RAW_UNITS = {
+    'passengers_can_us_int': 'Number',
+    'freight_intl_teu': 'Twenty feet equivalent units',
+    'export_cash': 'Dollars',
+    'overall_air_passengers': 'Number'
+}
+
+_MONTH_NAMES = {number: name for name, number in OneMonthData._month_to_int.items()}
+
+
+@dataclass
+class SyntheticData:
+    """A generated dataset, and which of its rows were made bad on purpose.
+
+    Instance Attributes:
+        - dataset: the generated data
+        - garbage: True for the rows with a garbage value or date
+        - duplicates: True for the rows that exactly repeat an earlier row
+        - outliers: maps each category to a mask that is True for the rows
+          given an outlying value of it
+    """
+    dataset: MonthlyDataset
+    garbage: np.ndarray
+    duplicates: np.ndarray
+    outliers: dict[str, np.ndarray]
+
+
+def generate_dataset(size: int, garbage_rate: float = 0.0, duplicate_rate: float = 0.0,
+                     outlier_rate: float = 0.0, missing_rate: float = 0.0,
+                     start_year: int = 2017, end_year: int = 2021,
+                     seed: Optional[int] = None) -> SyntheticData:
+    """Generate size months of data, all at once.
+
+    Clean rows fall in a random month from start_year to end_year, with every
+    value within 30% of its TYPICAL_RAW_VALUES (at full scale). That is too
+    narrow a spread for any clean value to be an outlier. Then, out of the
+    rows picked at random:
+    - garbage_rate of them get a negative value in one category, or (for
+      half of them) a month outside the years from start_year to end_year
+    - outlier_rate of them get a value 10 to 50 times typical in one category
+    - duplicate_rate of them are overwritten with a copy of a clean row
+    - missing_rate of them are missing the value of one category (see
+      MonthlyDataset.validity)
+
+    Preconditions:
+    - size >= 0
+    - all rates are at least 0
+    - garbage_rate + duplicate_rate + outlier_rate + missing_rate <= 1
+    - start_year <= end_year
+    """
+    rng = np.random.default_rng(seed)
+    months = rng.integers(start_year * 12, (end_year + 1) * 12, size, dtype=np.int64)
+    raw_values = {category: TYPICAL_RAW_VALUES[category] * rng.triangular(0.7, 1.0, 1.3, size)
+                  for category in CATEGORIES}
+
+    # Disjoint sets of rows to spoil in each way.
+    order = rng.permutation(size)
+    garbage_rows, outlier_rows, duplicate_rows, missing_rows, clean_rows = np.split(
+        order, np.cumsum([round(rate * size) for rate in
+                          (garbage_rate, outlier_rate, duplicate_rate, missing_rate)]))
+
+    garbage = np.zeros(size, dtype=bool)
+    garbage[garbage_rows] = True
+    bad_dates = rng.random(len(garbage_rows)) < 0.5
+    # Up to ten years before start_year, or after end_year.
+    years_off = rng.integers(1, 11, len(garbage_rows)) * rng.choice([-1, 1], len(garbage_rows))
+    off_years = np.where(years_off < 0, start_year, end_year) + years_off
+    date_rows = garbage_rows[bad_dates]
+    months[date_rows] = off_years[bad_dates] * 12 + months[date_rows] % 12
+    _spoil(rng, raw_values, garbage_rows[~bad_dates], -1.0, -1.0)
+
+    outliers = {category: np.zeros(size, dtype=bool) for category in CATEGORIES}
+    for category, rows in _spoil(rng, raw_values, outlier_rows, 10.0, 50.0).items():
+        outliers[category][rows] = True
+
+    columns = {}
+    for category in CATEGORIES:
+        if CATEGORY_TYPES[category] is int:
+            columns[category] = np.round(raw_values[category]).astype(np.int64) \
+                                * CATEGORY_SCALES[category]
+        else:
+            # A whole number of tenths divided by 10 is the same float that
+            # parsing the rounded value gives.
+            columns[category] = np.round(raw_values[category] * 10) / 10 \
+                                * CATEGORY_SCALES[category]
+
+    if len(clean_rows) > 0 and len(duplicate_rows) > 0:
+        originals = clean_rows[rng.integers(0, len(clean_rows), len(duplicate_rows))]
+        months[duplicate_rows] = months[originals]
+        for category in CATEGORIES:
+            columns[category][duplicate_rows] = columns[category][originals]
+
+    validity = {}
+    missing_categories = rng.integers(0, len(CATEGORIES), len(missing_rows))
+    for i, category in enumerate(CATEGORIES):
+        rows = missing_rows[missing_categories == i]
+        if len(rows) > 0:
+            validity[category] = np.ones(size, dtype=bool)
+            validity[category][rows] = False
+            columns[category][rows] = 0 if CATEGORY_TYPES[category] is int else np.nan
+
+    dataset = MonthlyDataset(months, columns, validity)
+    return SyntheticData(dataset, garbage, dataset.repeated_rows(), outliers)
+
+
+def write_raw_csv(dataset: MonthlyDataset, filename: str,
+                  release_date: Optional[datetime] = None) -> None:
+    """Write dataset to filename as a raw .csv laid out like the
+    transportation activity dataset: a header block, a row of month names,
+    and a row of (scaled down) values per category, with unit rows between
+    them and thousands separators in the values. Each row of dataset is one
+    column of the file.
+
+    The values are rounded as in the real dataset: integer categories to
+    whole numbers, and the others to one decimal place. Missing values are
+    written as '..'.
+    """
+    def csv_row(label: str, cells: list[str]) -> str:
+        return '"' + '","'.join([label] + cells) + '"\n'
+
+    empty_cells = ',' * len(dataset)
+    with open(filename, 'w', encoding='utf-8-sig', newline='') as raw_file:
+        raw_file.write('"Transportation activity indicators, Transport Canada"\n'
+                       '"Frequency:\N{NO-BREAK SPACE}Monthly"\n'
+                       '"Table: 23-10-0269-01"\n')
+        if release_date is not None:
+            raw_file.write(f'"Release date: {release_date:%Y-%m-%d}"\n')
+        raw_file.write('"Geography: Canada"\n""\n""\n\n')
+        raw_file.write('"Geography","Canada"' + empty_cells[1:] + '\n')
+
+        raw_file.write(csv_row(DATE_ROW_LABEL,
+                               [_MONTH_NAMES[month % 12 + 1] + ' ' + str(month // 12)
+                                for month in dataset.months.tolist()]))
+        for category in CATEGORIES:
+            if category in RAW_UNITS:
+                raw_file.write(',"' + RAW_UNITS[category] + '"' + empty_cells[1:] + '\n')
+            if CATEGORY_TYPES[category] is int:
+                cells = list(map('{:,}'.format,
+                                 (dataset.column(category) // CATEGORY_SCALES[category]).tolist()))
+            else:
+                cells = list(map('{:,.1f}'.format,
+                                 (dataset.column(category) / CATEGORY_SCALES[category]).tolist()))
+            for index in np.flatnonzero(~dataset.is_valid(category)).tolist():
+                cells[index] = '..'
+            raw_file.write(csv_row(RAW_LABELS[category], cells))
+
+        raw_file.write('\n\n\n"How to cite: Statistics Canada. Table 23-10-0269-01  '
+                       'Transportation activity indicators, Transport Canada"\n')
+
+
+def _spoil(rng: np.random.Generator, raw_values: dict[str, np.ndarray], rows: np.ndarray,
+           low: float, high: float) -> dict[str, np.ndarray]:
+    """Mutate raw_values so that each of rows has one value, of a random
+    category, set to between low and high times its category's typical value.
+    Return a dictionary mapping each category to the rows spoiled in it.
+    """
+    categories = rng.integers(0, len(CATEGORIES), len(rows))
+    factors = rng.uniform(low, high, len(rows))
+    spoiled = {}
+    for i, category in enumerate(CATEGORIES):
+        chosen = categories == i
+        raw_values[category][rows[chosen]] = TYPICAL_RAW_VALUES[category] * factors[chosen]
+        spoiled[category] = rows[chosen]
+    return spoiled
+
+
+if __name__ == '__main__':
+    pass
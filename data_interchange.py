@@ -0,0 +1,300 @@
+"""CSC110 Project Phase 2
+
+FILE DESCRIPTION
+================
+This file exports parsed (and optionally filtered) monthly data to columnar
+files that other programs can read without parsing the raw .csv again, and
+imports them back.
+
+Three formats are supported, chosen by the file's extension:
+    - Arrow IPC (.arrow, .feather or .ipc), which is imported by memory
+      mapping the file: the columns are read straight out of it, without
+      copying.
+    - Parquet (.parquet), which is compressed, so it is smaller but has to be
+      decoded when it is imported.
+    - NumPy (.npz), an uncompressed archive of one .npy array per column,
+      which is also imported by memory mapping each array in place.
+
+Arrow IPC and Parquet need pyarrow, which is optional. Without it, exporting
+to either writes a .npz file next to the one asked for instead.
+
+Missing values are Arrow nulls in Arrow IPC and Parquet files. In .npz files,
+each category with missing values has a boolean validity mask as well
+(see MonthlyDataset).
+
+Usage:
+    python data_interchange.py TestData.csv exported.arrow --filter-garbage
+
+GROUP INFORMATION
+=================
+Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
+"""
+import argparse
+import importlib.util
+import os
+import struct
+import warnings
+import zipfile
+from typing import Optional
+
+import numpy as np
+
+from data_collection import CATEGORIES, DEFAULT_CACHE_DIR, MonthlyDataset, missing_placeholder, \
+    process_file_cached, process_files
+from data_filtering import evaluate_filters
+from data_storage import DataStore, is_store
+from instrumentation import span
+
+# Maps each file extension that can be exported to its format.
+EXPORT_FORMATS = {'.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow',
+                  '.parquet': 'parquet', '.npz': 'npz'}
+
+# The name of the validity mask of a category in a .npz file is this,
+# followed by the category.
+_VALIDITY_PREFIX = 'valid_'
+
+# The length of the fixed part of a zip archive's local file header, which
+# comes just before each member's name, extra field and data.
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def has_pyarrow() -> bool:
+    """Return whether pyarrow is installed, without importing it."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def export_format(filename: str) -> Optional[str]:
+    """Return the format of filename, going by its extension (see
+    EXPORT_FORMATS), or None if it is not one that can be exported.
+    """
+    return EXPORT_FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def export_dataset(dataset: MonthlyDataset, filename: str) -> str:
+    """Write dataset to filename, in the format its extension calls for.
+    Return the name of the file written: if pyarrow is not installed, an
+    Arrow IPC or Parquet file is written as a .npz file of the same name
+    instead, with a warning.
+
+    Preconditions:
+    - export_format(filename) is not None
+    """
+    file_format = export_format(filename)
+    if file_format is None:
+        raise ValueError(f'Cannot export to {filename}: the extension must be one of '
+                         f'{", ".join(EXPORT_FORMATS)}')
+    if file_format != 'npz' and not has_pyarrow():
+        fallback = os.path.splitext(filename)[0] + '.npz'
+        warnings.warn(f'pyarrow is not installed, so {fallback} was written instead of {filename}')
+        filename, file_format = fallback, 'npz'
+
+    with span('export_dataset', rows_in=len(dataset), format=file_format):
+        if file_format == 'npz':
+            _write_npz(dataset, filename)
+        else:
+            import pyarrow.ipc
+            import pyarrow.parquet
+
+            table = _to_arrow_table(dataset)
+            if file_format == 'parquet':
+                pyarrow.parquet.write_table(table, filename)
+            else:
+                with pyarrow.OSFile(filename, 'wb') as sink, \
+                        pyarrow.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+    return filename
+
+
+def import_dataset(filename: str) -> MonthlyDataset:
+    """Return the dataset exported to filename by export_dataset.
+
+    Arrow IPC and .npz files are memory mapped: the dataset's columns are
+    read-only views of the file, so only the pages that are used are read,
+    and nothing is copied. The exception is a column of an Arrow IPC file
+    with missing values, whose nulls are filled in a copy. Parquet files are
+    decoded in full.
+
+    Preconditions:
+    - export_format(filename) is not None
+    """
+    file_format = export_format(filename)
+    if file_format is None:
+        raise ValueError(f'Cannot import {filename}: the extension must be one of '
+                         f'{", ".join(EXPORT_FORMATS)}')
+    if file_format != 'npz' and not has_pyarrow():
+        raise ImportError(f'pyarrow is needed to read {filename}')
+
+    with span('import_dataset', format=file_format) as trace:
+        if file_format == 'npz':
+            dataset = _read_npz(filename)
+        else:
+            import pyarrow.ipc
+            import pyarrow.parquet
+
+            if file_format == 'parquet':
+                table = pyarrow.parquet.read_table(filename, memory_map=True)
+            else:
+                # The memory map stays open as long as the arrays using it.
+                table = pyarrow.ipc.open_file(pyarrow.memory_map(filename, 'r')).read_all()
+            dataset = _from_arrow_table(table, filename)
+        trace.set(rows_out=len(dataset))
+    return dataset
+
+
+def load_dataset(source: str, cache_dir: str = DEFAULT_CACHE_DIR) -> MonthlyDataset:
+    """Return the dataset in source: a database of every month (see
+    data_storage), an exported file (see export_dataset), a single raw .csv
+    (parsed through the cache in cache_dir), or a directory or glob pattern
+    of them (see process_files).
+    """
+    if is_store(source):
+        with DataStore(source) as store:
+            return store.load()
+    if os.path.isfile(source) and export_format(source) is not None:
+        return import_dataset(source)
+    if os.path.isfile(source):
+        return process_file_cached(source, cache_dir)
+    return process_files(source)
+
+
+def _to_arrow_table(dataset: MonthlyDataset) -> 'pyarrow.Table':
+    """Return dataset as an Arrow table: a column of month ordinals, a
+    column of the first day of each month (for other programs' convenience),
+    and one column per category, with missing values as nulls.
+    """
+    import pyarrow
+
+    dates = (dataset.months - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]')
+    arrays = {'month': pyarrow.array(dataset.months), 'date': pyarrow.array(dates)}
+    for category in CATEGORIES:
+        mask = ~dataset.is_valid(category) if dataset.has_missing(category) else None
+        arrays[category] = pyarrow.array(dataset.column(category), mask=mask)
+    return pyarrow.table(arrays)
+
+
+def _from_arrow_table(table: 'pyarrow.Table', filename: str) -> MonthlyDataset:
+    """Return the dataset in table, which was read from filename. Columns
+    without nulls are used without copying.
+    """
+    missing = [name for name in ('month',) + CATEGORIES if name not in table.column_names]
+    if missing:
+        raise ValueError(f'{filename} has no column for {", ".join(missing)}')
+
+    def column_values(name: str) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        """Return the values of the column called name, and its validity mask
+        (None if it has no nulls).
+        """
+        column = table.column(name)
+        # An IPC file written by export_dataset holds a single chunk.
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        if column.null_count == 0:
+            return column.to_numpy(zero_copy_only=True), None
+        if name == 'month':
+            raise ValueError(f'{filename} has rows with no month')
+        valid = column.is_valid().to_numpy(zero_copy_only=False)
+        return column.fill_null(missing_placeholder(name)).to_numpy(), valid
+
+    months, _ = column_values('month')
+    columns = {}
+    validity = {}
+    for category in CATEGORIES:
+        columns[category], valid = column_values(category)
+        if valid is not None:
+            validity[category] = valid
+    return MonthlyDataset(months, columns, validity)
+
+
+def _write_npz(dataset: MonthlyDataset, filename: str) -> None:
+    """Write dataset to filename as an uncompressed .npz file: months, every
+    column, and the validity masks of the categories with missing values.
+    """
+    arrays = {'months': dataset.months}
+    for category in CATEGORIES:
+        arrays[category] = dataset.column(category)
+        if dataset.has_missing(category):
+            arrays[_VALIDITY_PREFIX + category] = dataset.is_valid(category)
+    # np.savez would add .npz to a name without it; it is already there.
+    with open(filename, 'wb') as npz_file:
+        np.savez(npz_file, **arrays)
+
+
+def _read_npz(filename: str) -> MonthlyDataset:
+    """Return the dataset in filename, a .npz file written by _write_npz,
+    memory mapped.
+    """
+    arrays = _memory_map_npz(filename)
+    missing = [name for name in ('months',) + CATEGORIES if name not in arrays]
+    if missing:
+        raise ValueError(f'{filename} has no array for {", ".join(missing)}')
+    return MonthlyDataset(arrays['months'],
+                          {category: arrays[category] for category in CATEGORIES},
+                          {category: arrays[_VALIDITY_PREFIX + category] for category in CATEGORIES
+                           if _VALIDITY_PREFIX + category in arrays})
+
+
+def _memory_map_npz(filename: str) -> dict[str, np.ndarray]:
+    """Return every array in the .npz file filename, by name.
+
+    np.load cannot memory map the arrays in a .npz file, only a lone .npy
+    file. But in an uncompressed .npz file, each .npy file is stored as is,
+    so its data can be memory mapped at its offset in the archive. Arrays
+    that are compressed, empty, or hold Python objects are read normally.
+    """
+    arrays = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as npz_file:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') \
+                else info.filename
+            if info.compress_type == zipfile.ZIP_STORED:
+                # The member's data follows its local header, name and extra
+                # field, whose lengths are the last two fields of the header.
+                npz_file.seek(info.header_offset)
+                header = npz_file.read(_ZIP_LOCAL_HEADER_SIZE)
+                name_length, extra_length = struct.unpack('<HH', header[-4:])
+                npz_file.seek(info.header_offset + _ZIP_LOCAL_HEADER_SIZE
+                              + name_length + extra_length)
+                version = np.lib.format.read_magic(npz_file)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npz_file)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npz_file)
+                if np.prod(shape) > 0 and not dtype.hasobject:
+                    arrays[name] = np.memmap(filename, dtype=dtype, mode='r',
+                                             offset=npz_file.tell(), shape=shape,
+                                             order='F' if fortran_order else 'C')
+                    continue
+            with archive.open(info) as member:
+                arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+    return arrays
+
+
+def main(arguments: Optional[list[str]] = None) -> None:
+    """Export the dataset named on the command line (by default, sys.argv),
+    optionally filtered.
+    """
+    parser = argparse.ArgumentParser(description='Export the transportation activity dataset to '
+                                                 'Arrow IPC, Parquet or NumPy .npz.')
+    parser.add_argument('source', help='a raw .csv file, a directory or glob pattern of them, '
+                                       'a database, or an exported file')
+    parser.add_argument('destination',
+                        help=f'the file to write, ending in one of {", ".join(EXPORT_FORMATS)}')
+    parser.add_argument('--filter-garbage', action='store_true',
+                        help='leave out months with garbage values')
+    parser.add_argument('--filter-duplicates', action='store_true',
+                        help='leave out months that duplicate an earlier one')
+    parser.add_argument('--outliers', nargs='+', choices=list(CATEGORIES), default=[],
+                        metavar='CATEGORY', help='leave out months with outlying values of these')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='where to keep parsed .csv files')
+    options = parser.parse_args(arguments)
+
+    dataset = load_dataset(options.source, options.cache_dir)
+    result = evaluate_filters(options.filter_garbage, options.filter_duplicates,
+                              options.outliers, dataset)
+    filename = export_dataset(dataset[result.kept], options.destination)
+    print(f'{len(result.kept)} months written to {filename} '
+          f'({len(result.rejected)} left out by the filters)')
+
+
+if __name__ == '__main__':
+    main()
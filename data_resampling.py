@@ -0,0 +1,216 @@
+"""CSC110 Project Phase 2
+
+FILE DESCRIPTION
+================
+This file aggregates monthly data over longer periods: calendar quarters and
+years, arbitrary date ranges, and rolling windows of some number of months.
+Sums, means and standard deviations are calculated for every category at
+once.
+
+GROUP INFORMATION
+=================
+Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Union
+
+import numpy as np
+
+from data_collection import CATEGORIES, MonthlyDataset, OneMonthData, date_to_ordinal, \
+    ordinal_to_date
+
+# Maps each calendar period resample understands to its length in months.
+PERIOD_LENGTHS = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+@dataclass
+class AggregatedSeries:
+    """Aggregates of monthly data over a series of periods (or windows).
+
+    Instance Attributes:
+        - starts: the month ordinal of the first month of each period
+        - ends: the month ordinal of the last month of each period
+        - counts: the number of rows of data in each period
+        - value_counts: maps each category to the number of its values in
+          each period - fewer than counts, where some values are missing
+        - sums: maps each category to the sum of its values in each period
+        - means: maps each category to the mean of its values in each period
+        - standard_deviations: maps each category to the (population)
+          standard deviation of its values in each period
+
+    Representation Invariants:
+        - all arrays have one entry per period
+        - periods with no data have a count of 0, and a mean and standard
+          deviation of nan
+        - a category with a value count of 0 in a period has a mean and
+          standard deviation of nan there
+    """
+    starts: np.ndarray
+    ends: np.ndarray
+    counts: np.ndarray
+    value_counts: dict[str, np.ndarray]
+    sums: dict[str, np.ndarray]
+    means: dict[str, np.ndarray]
+    standard_deviations: dict[str, np.ndarray]
+
+    def dates(self) -> list[datetime]:
+        """Return the date of the first month of each period."""
+        return [ordinal_to_date(ordinal) for ordinal in self.starts.tolist()]
+
+
+class Resampler:
+    """Aggregates one MonthlyDataset over many periods.
+
+    The data is put in order of month once, and prefix sums of every
+    category (and of its squares) are computed once, in one vectorized pass.
+    After that, the sum, mean and standard deviation of any run of months
+    take O(1) time per category, however long the run is. Missing values are
+    left out, so they are counted in prefix sums of their own.
+
+    Instance Attributes:
+        - categories: the categories being aggregated
+        - months: the month ordinal of each row, in order
+    """
+    categories: tuple[str, ...]
+    months: np.ndarray
+
+    # Private attributes:
+    # _centres: the overall mean of each category. Values are summed relative
+    #   to it, which keeps the sums of squares from losing precision.
+    # _prefix_sums: _prefix_sums[i, j] is the sum of the first j (centred)
+    #   values of categories[i].
+    # _prefix_squares: the same, for the squares of the centred values.
+    # _prefix_counts: _prefix_counts[i, j] is how many of the first j values
+    #   of categories[i] are present.
+    _centres: np.ndarray
+    _prefix_sums: np.ndarray
+    _prefix_squares: np.ndarray
+    _prefix_counts: np.ndarray
+
+    def __init__(self, data: Union[list[OneMonthData], MonthlyDataset],
+                 categories: tuple[str, ...] = CATEGORIES) -> None:
+        if not isinstance(data, MonthlyDataset):
+            data = MonthlyDataset.from_records(data)
+        data = data.sort_by_date()
+        self.categories = tuple(categories)
+        self.months = data.months
+
+        matrix = np.vstack([data.column(category).astype(np.float64)
+                            for category in self.categories]) \
+            if self.categories else np.zeros((0, len(data)))
+        valid = np.vstack([data.is_valid(category) for category in self.categories]) \
+            if self.categories else np.zeros((0, len(data)), dtype=bool)
+        value_counts = valid.sum(axis=1)
+        self._centres = np.zeros(len(self.categories))
+        present = value_counts > 0
+        self._centres[present] = np.where(valid, matrix, 0.0)[present].sum(axis=1) \
+            / value_counts[present]
+        # Missing values add nothing to the sums.
+        centred = np.where(valid, matrix - self._centres[:, np.newaxis], 0.0)
+        zeros = np.zeros((len(self.categories), 1))
+        self._prefix_sums = np.hstack([zeros, np.cumsum(centred, axis=1)])
+        self._prefix_squares = np.hstack([zeros, np.cumsum(centred ** 2, axis=1)])
+        self._prefix_counts = np.hstack([zeros.astype(np.int64),
+                                         np.cumsum(valid, axis=1, dtype=np.int64)])
+
+    def periods(self, period: str) -> AggregatedSeries:
+        """Return the aggregates for every calendar period ('month',
+        'quarter' or 'year') from the first to the last month of data.
+
+        Preconditions:
+        - period in PERIOD_LENGTHS
+        """
+        if len(self.months) == 0:
+            return self._aggregate(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        length = PERIOD_LENGTHS[period]
+        first = self.months[0] // length * length
+        starts = np.arange(first, self.months[-1] + 1, length, dtype=np.int64)
+        return self._aggregate(starts, starts + length - 1)
+
+    def rolling(self, window: int) -> AggregatedSeries:
+        """Return the aggregates for every window of window consecutive
+        calendar months that lies within the data, one ending at each month
+        from the (window)th month of data to the last.
+
+        Preconditions:
+        - window >= 1
+        """
+        if len(self.months) == 0:
+            return self._aggregate(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        ends = np.arange(self.months[0] + window - 1, self.months[-1] + 1, dtype=np.int64)
+        return self._aggregate(ends - window + 1, ends)
+
+    def between(self, start: datetime, end: datetime) -> dict[str, dict[str, float]]:
+        """Return the aggregates over the months from the month of start to
+        the month of end, inclusive: a dictionary mapping each category to a
+        dictionary of its 'sum', 'mean' and 'standard deviation' there. If end
+        is before start, the range is empty: the sum is 0, and the mean and
+        standard deviation are nan.
+        """
+        series = self._aggregate(np.array([date_to_ordinal(start)]),
+                                 np.array([date_to_ordinal(end)]))
+        return {category: {'sum': float(series.sums[category][0]),
+                           'mean': float(series.means[category][0]),
+                           'standard deviation':
+                               float(series.standard_deviations[category][0])}
+                for category in self.categories}
+
+    def _aggregate(self, starts: np.ndarray, ends: np.ndarray) -> AggregatedSeries:
+        """Return the aggregates for the periods from each month ordinal in
+        starts to the corresponding one in ends, inclusive. A period that ends
+        before it starts is empty.
+        """
+        # The rows in each period are low:high, found by bisection.
+        low = np.searchsorted(self.months, starts, side='left')
+        high = np.maximum(np.searchsorted(self.months, ends, side='right'), low)
+        counts = high - low
+        value_counts = self._prefix_counts[:, high] - self._prefix_counts[:, low]
+
+        centred_sums = self._prefix_sums[:, high] - self._prefix_sums[:, low]
+        centred_squares = self._prefix_squares[:, high] - self._prefix_squares[:, low]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centred_means = centred_sums / value_counts
+            variances = centred_squares / value_counts - centred_means ** 2
+        # Subtracting prefix sums leaves some rounding error, which can make a
+        # variance a little negative, and a single value has no spread at
+        # all. Periods with no values keep a variance of nan.
+        variances[variances < 0] = 0.0
+        variances[value_counts == 1] = 0.0
+        sums = centred_sums + self._centres[:, np.newaxis] * value_counts
+        means = centred_means + self._centres[:, np.newaxis]
+
+        return AggregatedSeries(
+            starts=starts, ends=ends, counts=counts,
+            value_counts={category: value_counts[i]
+                          for i, category in enumerate(self.categories)},
+            sums={category: sums[i] for i, category in enumerate(self.categories)},
+            means={category: means[i] for i, category in enumerate(self.categories)},
+            standard_deviations={category: np.sqrt(variances[i])
+                                 for i, category in enumerate(self.categories)})
+
+
+def resample(data: Union[list[OneMonthData], MonthlyDataset], period: str,
+             categories: tuple[str, ...] = CATEGORIES) -> AggregatedSeries:
+    """Return the aggregates of data for every calendar period ('month',
+    'quarter' or 'year') that it covers. See Resampler.periods.
+
+    Preconditions:
+    - period in PERIOD_LENGTHS
+    """
+    return Resampler(data, categories).periods(period)
+
+
+def rolling(data: Union[list[OneMonthData], MonthlyDataset], window: int,
+            categories: tuple[str, ...] = CATEGORIES) -> AggregatedSeries:
+    """Return the aggregates of data over every rolling window of window
+    months. See Resampler.rolling.
+
+    Preconditions:
+    - window >= 1
+    """
+    return Resampler(data, categories).rolling(window)
+
+
+if __name__ == '__main__':
+    pass
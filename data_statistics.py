@@ -0,0 +1,336 @@
+"""CSC110 Project Phase 2
+
+FILE DESCRIPTION
+================
+This file accumulates statistical measurements incrementally: one month at a
+time, as new data arrives, without keeping every past value around.
+Accumulators for different partitions of the data can be merged together.
+
+GROUP INFORMATION
+=================
+Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
+"""
+import math
+from typing import Union
+
+from data_collection import CATEGORIES, MonthlyDataset, OneMonthData
+from data_filtering import is_outlier
+
+
+class RunningMoments:
+    """The count, mean and variance of a stream of values, updated one value
+    at a time using Welford's algorithm.
+
+    Instance Attributes:
+        - count: the number of values seen so far
+        - mean: the mean of the values seen so far
+
+    Representation Invariants:
+        - self.count >= 0
+    """
+    count: int
+    mean: float
+
+    # Private attributes:
+    # _m2: the sum of squared differences between each value and the mean.
+    _m2: float
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, value: float) -> None:
+        """Include value in the moments."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def merge(self, other: 'RunningMoments') -> None:
+        """Mutate these moments to also include every value other has seen."""
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+
+    def variance(self) -> float:
+        """Return the (population) variance of the values seen so far.
+
+        Preconditions:
+        - self.count > 0
+        """
+        return self._m2 / self.count
+
+    def standard_deviation(self) -> float:
+        """Return the (population) standard deviation of the values seen so
+        far, as calculate_aggregate_measurements does.
+
+        Preconditions:
+        - self.count > 0
+        """
+        return math.sqrt(self.variance())
+
+
+class RunningMode:
+    """The most common value in a stream of values, kept by counting how many
+    times each distinct value occurs.
+
+    Ties go to the value that was seen first, as in
+    calculate_aggregate_measurements.
+    """
+    # Private attributes:
+    # _occurrences: maps each value seen so far to the number of times it
+    #   occurred, in the order the values were first seen.
+    _occurrences: dict[float, int]
+
+    def __init__(self) -> None:
+        self._occurrences = {}
+
+    def update(self, value: float) -> None:
+        """Count one more occurrence of value."""
+        self._occurrences[value] = self._occurrences.get(value, 0) + 1
+
+    def merge(self, other: 'RunningMode') -> None:
+        """Mutate this mode to also count every value other has seen."""
+        for value in other._occurrences:
+            self._occurrences[value] = self._occurrences.get(value, 0) + \
+                                       other._occurrences[value]
+
+    def mode(self) -> float:
+        """Return the most common value seen so far.
+
+        Preconditions:
+        - at least one value has been seen
+        """
+        return max(self._occurrences, key=self._occurrences.get)
+
+
+class QuantileSketch:
+    """A bounded-memory summary of a stream of values, from which approximate
+    quantiles can be read. This is a merging t-digest: values are grouped
+    into weighted centroids, which are kept small near the extremes (where
+    accuracy matters most for outlier checks) and allowed to grow in the
+    middle.
+
+    While fewer than compression values have been seen, every value is its own
+    centroid and quantiles are exact, and interpolated the same way as
+    statistics.quantiles(..., method='inclusive').
+
+    Instance Attributes:
+        - compression: roughly the most centroids the sketch keeps
+        - count: the number of values seen so far
+
+    Representation Invariants:
+        - self.compression > 0
+    """
+    compression: int
+    count: int
+
+    # Private attributes:
+    # _centroids: [mean, weight] pairs, sorted by mean, summarizing the values
+    #   compressed so far.
+    # _buffer: values seen since the last compression.
+    # _min, _max: the smallest and largest values seen so far.
+    _centroids: list[list[float]]
+    _buffer: list[float]
+    _min: float
+    _max: float
+
+    def __init__(self, compression: int = 100) -> None:
+        self.compression = compression
+        self.count = 0
+        self._centroids = []
+        self._buffer = []
+        self._min = math.inf
+        self._max = -math.inf
+
+    def update(self, value: float) -> None:
+        """Include value in the sketch."""
+        self.count += 1
+        self._buffer.append(value)
+        self._min = min(self._min, value)
+        self._max = max(self._max, value)
+        if len(self._buffer) >= self.compression:
+            self._compress()
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Mutate this sketch to also summarize every value other has seen."""
+        if other.count == 0:
+            return
+        self._buffer.extend(other._buffer)
+        self._centroids.extend([mean, weight] for mean, weight in other._centroids)
+        self.count += other.count
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+        self._compress()
+
+    def quantile(self, q: float) -> float:
+        """Return the approximate q-th quantile of the values seen so far.
+
+        Preconditions:
+        - self.count > 0
+        - 0 <= q <= 1
+        """
+        self._compress()
+        # Each centroid stands for its weight's worth of consecutive ranks;
+        # place it at the middle one, and interpolate between centroids.
+        target = q * (self.count - 1)
+        previous_rank, previous_mean = 0.0, self._min
+        ranks_so_far = 0.0
+        for mean, weight in self._centroids:
+            rank = ranks_so_far + (weight - 1) / 2
+            if target <= rank:
+                if rank == previous_rank:
+                    return mean
+                fraction = (target - previous_rank) / (rank - previous_rank)
+                return previous_mean + fraction * (mean - previous_mean)
+            previous_rank, previous_mean = rank, mean
+            ranks_so_far += weight
+
+        last_rank = self.count - 1
+        if last_rank == previous_rank:
+            return self._max
+        fraction = (target - previous_rank) / (last_rank - previous_rank)
+        return previous_mean + fraction * (self._max - previous_mean)
+
+    def _compress(self) -> None:
+        """Fold the buffer into the centroids, merging neighbouring centroids
+        as long as the merged one is not too big for where it sits.
+        """
+        if not self._buffer and len(self._centroids) <= self.compression:
+            return
+        pending = sorted(self._centroids + [[value, 1] for value in self._buffer])
+        self._buffer = []
+        if self.count <= self.compression:
+            # Small enough to keep every value exactly.
+            self._centroids = pending
+            return
+
+        merged = [pending[0]]
+        weight_so_far = 0.0
+        for mean, weight in pending[1:]:
+            last = merged[-1]
+            # The scale function limits a centroid's share of the quantile
+            # range: small near q = 0 and q = 1, large near the median.
+            q_left = weight_so_far / self.count
+            q_right = (weight_so_far + last[1] + weight) / self.count
+            if self._scale(q_right) - self._scale(q_left) <= 1:
+                total = last[1] + weight
+                last[0] += (mean - last[0]) * weight / total
+                last[1] = total
+            else:
+                weight_so_far += last[1]
+                merged.append([mean, weight])
+        self._centroids = merged
+
+    def _scale(self, q: float) -> float:
+        """The t-digest k1 scale function."""
+        q = min(max(q, 0.0), 1.0)
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+
+class RunningMeasurements:
+    """Running aggregate statistical measurements for every category, for a
+    live feed of monthly data.
+
+    Months can be added one at a time (or a MonthlyDataset at a time), and
+    running measurements for separate partitions of the data can be merged.
+    Outlier checks use the current approximate quartiles, so a new month can
+    be flagged without re-scanning all of history.
+
+    Instance Attributes:
+        - moments: maps each category to the RunningMoments of its values
+        - modes: maps each category to the RunningMode of its values
+        - sketches: maps each category to a QuantileSketch of its values
+    """
+    moments: dict[str, RunningMoments]
+    modes: dict[str, RunningMode]
+    sketches: dict[str, QuantileSketch]
+
+    def __init__(self, compression: int = 100) -> None:
+        self.moments = {category: RunningMoments() for category in CATEGORIES}
+        self.modes = {category: RunningMode() for category in CATEGORIES}
+        self.sketches = {category: QuantileSketch(compression) for category in CATEGORIES}
+
+    def update(self, data: Union[OneMonthData, MonthlyDataset]) -> None:
+        """Include one month (or every month of a MonthlyDataset) in the
+        running measurements. Missing values are left out.
+        """
+        if isinstance(data, MonthlyDataset):
+            for category in CATEGORIES:
+                for value in data.valid_values(category).tolist():
+                    self._update_category(category, value)
+        else:
+            for category in CATEGORIES:
+                if getattr(data, category) is not None:
+                    self._update_category(category, getattr(data, category))
+
+    def merge(self, other: 'RunningMeasurements') -> None:
+        """Mutate these running measurements to also include every month
+        other has seen.
+        """
+        for category in CATEGORIES:
+            self.moments[category].merge(other.moments[category])
+            self.modes[category].merge(other.modes[category])
+            self.sketches[category].merge(other.sketches[category])
+
+    def measurements(self, category: str) -> dict[str, float]:
+        """Return the measurements of calculate_aggregate_measurements for
+        category: mean, mode, median and standard deviation, over every month
+        seen so far. The median is approximate once many months have been seen.
+
+        Preconditions:
+        - at least one month has been seen
+        """
+        return {'mean': self.moments[category].mean,
+                'mode': self.modes[category].mode(),
+                'median': self.sketches[category].quantile(0.5),
+                'standard deviation': self.moments[category].standard_deviation()}
+
+    def quartiles(self, category: str) -> tuple[float, float]:
+        """Return the approximate first and third quartiles of category.
+
+        Preconditions:
+        - at least one month has been seen
+        """
+        return self.sketches[category].quantile(0.25), self.sketches[category].quantile(0.75)
+
+    def outlying_categories(self, month: OneMonthData,
+                            categories: tuple[str, ...] = CATEGORIES) -> list[str]:
+        """Return the categories (out of categories) in which month has an
+        outlying value, relative to the months seen so far. A category is
+        never outlying if month is missing its value, or if fewer than two
+        months with a value of it have been seen.
+        """
+        outlying = []
+        for category in categories:
+            if self.sketches[category].count < 2 or getattr(month, category) is None:
+                continue
+            q1, q3 = self.quartiles(category)
+            if is_outlier(getattr(month, category), q1, q3, q3 - q1):
+                outlying.append(category)
+        return outlying
+
+    def flag_and_update(self, month: OneMonthData,
+                        categories: tuple[str, ...] = CATEGORIES) -> list[str]:
+        """Return the categories in which the newly arrived month is an
+        outlier, relative to the months before it, then include the month in
+        the running measurements.
+        """
+        outlying = self.outlying_categories(month, categories)
+        self.update(month)
+        return outlying
+
+    def _update_category(self, category: str, value: float) -> None:
+        """Include value in the accumulators of category."""
+        self.moments[category].update(value)
+        self.modes[category].update(value)
+        self.sketches[category].update(value)
+
+
+if __name__ == '__main__':
+    pass
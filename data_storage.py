@@ -0,0 +1,460 @@
+"""CSC110 Project Phase 2
+
+FILE DESCRIPTION
+================
+This file keeps parsed monthly data in a local SQLite database, so that it
+outlives one run of the program and can be shared by every tool that reads
+it, instead of each of them parsing the raw .csv files again.
+
+Each row of the database is one month of one geography, keyed by both, so
+adding the same file twice changes nothing, and adding a newer release
+updates the months it revised. Months can be read back by date range, and a
+single category's values on their own.
+
+Files can also be ingested incrementally: the database remembers which files
+it has seen and what each month's cells said, so that only new months (and
+months whose cells changed) are parsed, and revised values are reported.
+
+Usage:
+    python data_storage.py history.sqlite archive/23100269-*.csv
+
+GROUP INFORMATION
+=================
+Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
+"""
+import argparse
+import glob
+import hashlib
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from data_collection import CATEGORIES, CATEGORY_TYPES, MonthlyDataset, date_to_ordinal, \
+    file_sha256, ordinal_to_date, read_raw_release, read_release
+from instrumentation import span
+
+# The geography of every release of the transportation activity dataset.
+DEFAULT_GEOGRAPHY = 'Canada'
+
+# The file name endings of databases, as opposed to raw .csv files.
+STORE_SUFFIXES = ('.sqlite', '.sqlite3', '.db')
+
+# The layout of the database. Bump SCHEMA_VERSION when it changes, and add
+# the statements that bring the previous version up to date to _MIGRATIONS.
+SCHEMA_VERSION = 2
+_SCHEMA = (f"""
+CREATE TABLE IF NOT EXISTS monthly_data (
+    geography TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    release_date TEXT,
+    {', '.join(f'{category} {"INTEGER" if CATEGORY_TYPES[category] is int else "REAL"}'
+               for category in CATEGORIES)},
+    source_digest TEXT,
+    PRIMARY KEY (geography, month)
+) WITHOUT ROWID
+""", """
+CREATE TABLE IF NOT EXISTS releases (
+    geography TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    release_date TEXT,
+    ingested_at TEXT NOT NULL,
+    PRIMARY KEY (geography, sha256)
+) WITHOUT ROWID
+""")
+# Maps each old schema version to the statements that upgrade it to the next.
+_MIGRATIONS = {
+    1: ('ALTER TABLE monthly_data ADD COLUMN source_digest TEXT',)
+}
+
+# Adds a row, or updates the month's existing row if the new row is from a
+# release at least as new. Only actual changes are written, so unchanged
+# months do not count as updated. A row without a digest of its cells (one
+# that was not ingested from a raw .csv) clears the old digest if it changes
+# anything else.
+_UPSERT = f"""
+INSERT INTO monthly_data (geography, release_date, source_digest, month, {', '.join(CATEGORIES)})
+VALUES ({', '.join('?' * (len(CATEGORIES) + 4))})
+ON CONFLICT (geography, month) DO UPDATE SET
+    {', '.join(f'{name} = excluded.{name}'
+               for name in ('release_date', 'source_digest') + CATEGORIES)}
+WHERE (excluded.release_date >= monthly_data.release_date
+       OR monthly_data.release_date IS NULL)
+  AND ({' OR '.join(f'monthly_data.{name} IS NOT excluded.{name}'
+                    for name in ('release_date',) + CATEGORIES)}
+       OR (excluded.source_digest IS NOT NULL
+           AND monthly_data.source_digest IS NOT excluded.source_digest))
+"""
+
+
+@dataclass
+class Revision:
+    """A value that a newer release changed.
+
+    Instance Attributes:
+        - month: the month of the value
+        - category: the category of the value
+        - old_value: the value before (None if it was missing)
+        - new_value: the value after (None if it is now missing)
+    """
+    month: datetime
+    category: str
+    old_value: Optional[float]
+    new_value: Optional[float]
+
+
+@dataclass
+class IngestReport:
+    """What ingesting one raw .csv into a DataStore did.
+
+    Instance Attributes:
+        - filename: the raw .csv
+        - release_date: its release date (None if it has none)
+        - skipped: whether the file was skipped because a file with the same
+          contents had been ingested before
+        - new_months: the months that were not in the database before
+        - revisions: every value of a month already in the database that
+          this release changed
+        - unchanged: how many months already in the database this release
+          left with the same values
+        - outdated: how many of its months were left alone because the
+          database has them from a newer release
+    """
+    filename: str
+    release_date: Optional[datetime]
+    skipped: bool
+    new_months: list[datetime]
+    revisions: list[Revision]
+    unchanged: int
+    outdated: int
+
+
+class DataStore:
+    """A SQLite database of monthly data, for any number of geographies.
+
+    Months are stored by month ordinal (see date_to_ordinal), along with the
+    release date of the file they came from, and missing values are NULL.
+    The table is keyed - and so indexed and ordered - by geography and
+    month, so date range queries read only the rows in the range.
+
+    Months ingested from a raw .csv also keep a digest of their cells, and
+    every ingested file is recorded by the SHA-256 of its contents (see
+    ingest).
+
+    Instance Attributes:
+        - path: the file the database is in
+
+    Representation Invariants:
+        - there is at most one row for each geography and month
+    """
+    path: str
+
+    # Private attributes:
+    # _connection: the open connection to the database.
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str) -> None:
+        """Open the database in path, creating it if it does not exist."""
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            self._connection.close()
+            raise ValueError(f'{path} has schema version {version}, newer than '
+                             f'{SCHEMA_VERSION}.')
+        # Write-ahead logging lets other processes read while one writes.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            if version > 0:
+                for old_version in range(version, SCHEMA_VERSION):
+                    for statement in _MIGRATIONS[old_version]:
+                        self._connection.execute(statement)
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+            self._connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def __enter__(self) -> 'DataStore':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+    def append(self, dataset: MonthlyDataset, release_date: Optional[datetime] = None,
+               geography: str = DEFAULT_GEOGRAPHY) -> int:
+        """Add every month of dataset, from the release of release_date, to
+        the database in one transaction. Return how many months were added
+        or updated.
+
+        A month already in the database is replaced only if this release is
+        at least as new as the one it came from, as in merge_releases:
+        months without a release date count as older than all the others.
+        So adding the same data twice changes nothing the second time. If
+        dataset has several rows for one month, the last of them is kept.
+        """
+        with self._connection:
+            return self._upsert(dataset, release_date, geography)
+
+    def append_file(self, filename: str, geography: str = DEFAULT_GEOGRAPHY) -> int:
+        """Parse the raw .csv filename (see read_release) and add its months
+        to the database, as per append. Return how many months were added or
+        updated.
+        """
+        release_date, dataset = read_release(filename)
+        return self.append(dataset, release_date, geography)
+
+    def ingest(self, filename: str, geography: str = DEFAULT_GEOGRAPHY) -> IngestReport:
+        """Add the months of the raw .csv filename to the database
+        incrementally, and report what changed.
+
+        A file with the same contents as one ingested before is skipped
+        without being parsed. Otherwise, the cells of each of its months are
+        compared (by digest) with those the month was last ingested from, and
+        only the months that are new or whose cells changed are converted to
+        numbers and written. Months the database has from a newer release are
+        left alone, as in append.
+        """
+        with span('store ingest', file=filename, geography=geography) as trace:
+            content_hash = file_sha256(filename)
+            seen = self._connection.execute(
+                'SELECT release_date FROM releases WHERE geography = ? AND sha256 = ?',
+                (geography, content_hash)).fetchone()
+            if seen is not None:
+                trace.set(rows_out=0, skipped=True)
+                return IngestReport(filename, _parse_date(seen[0]), True, [], [], 0, 0)
+
+            raw_release = read_raw_release(filename)
+            release = _format_date(raw_release.release_date)
+            months, columns = raw_release.columns()
+            stored = {}
+            if len(months) > 0:
+                stored = {month: (release_date, digest) for month, release_date, digest
+                          in self._connection.execute(
+                              'SELECT month, release_date, source_digest FROM monthly_data '
+                              'WHERE geography = ? AND month BETWEEN ? AND ?',
+                              (geography, int(months.min()), int(months.max())))}
+
+            # The columns to convert and write, their digests, and the months
+            # whose cells have not changed since a release this one is newer
+            # than.
+            to_decode, digests, unchanged = [], [], []
+            new_months, outdated = [], 0
+            for month, column in zip(months.tolist(), columns.tolist()):
+                digest = _cells_digest(raw_release.cells(column))
+                if month not in stored:
+                    new_months.append(month)
+                elif not _at_least_as_new(release, stored[month][0]):
+                    outdated += 1
+                    continue
+                elif digest == stored[month][1]:
+                    unchanged.append(month)
+                    continue
+                to_decode.append(column)
+                digests.append(digest)
+
+            dataset = raw_release.decode(to_decode)
+            revised = dataset[~np.isin(dataset.months, new_months)]
+            revisions = self._revisions(revised, geography)
+            with self._connection:
+                self._upsert(dataset, raw_release.release_date, geography, digests)
+                # Unchanged months now come from this release, too.
+                self._connection.executemany(
+                    'UPDATE monthly_data SET release_date = ? WHERE geography = ? AND month = ?',
+                    ((release, geography, month) for month in unchanged))
+                self._connection.execute(
+                    'INSERT INTO releases (geography, sha256, filename, release_date, ingested_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (geography, content_hash, filename, release,
+                     datetime.now().isoformat(timespec='seconds')))
+            # Months whose cells changed (say, in formatting) but not their
+            # values are unchanged too.
+            unchanged_count = len(unchanged) + len(revised) \
+                - len({revision.month for revision in revisions})
+            trace.set(rows_out=len(dataset), new_months=len(new_months),
+                      revisions=len(revisions), unchanged=unchanged_count, outdated=outdated)
+        return IngestReport(filename, raw_release.release_date, False,
+                            [ordinal_to_date(month) for month in new_months], revisions,
+                            unchanged_count, outdated)
+
+    def last_release(self, geography: str = DEFAULT_GEOGRAPHY) -> Optional[datetime]:
+        """Return the newest release date of the files ingested for
+        geography, or None if no file with a release date has been.
+        """
+        return _parse_date(self._connection.execute(
+            'SELECT MAX(release_date) FROM releases WHERE geography = ?',
+            (geography,)).fetchone()[0])
+
+    def load(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+             geography: str = DEFAULT_GEOGRAPHY) -> MonthlyDataset:
+        """Return the months of geography from the month of start to the month
+        of end, inclusive, in order of month. Without start (or end), start
+        from the first month (or end at the last one).
+        """
+        with span('store load', geography=geography) as trace:
+            rows = self._connection.execute(
+                f'SELECT month, {", ".join(CATEGORIES)} FROM monthly_data '
+                f'WHERE geography = ? AND month BETWEEN ? AND ? ORDER BY month',
+                (geography,) + _ordinal_range(start, end)).fetchall()
+            if rows:
+                columns = list(zip(*rows))
+                dataset = MonthlyDataset.from_columns(
+                    list(columns[0]), {category: list(values)
+                                       for category, values in zip(CATEGORIES, columns[1:])})
+            else:
+                dataset = MonthlyDataset.empty()
+            trace.set(rows_out=len(dataset))
+        return dataset
+
+    def series(self, category: str, start: Optional[datetime] = None,
+               end: Optional[datetime] = None,
+               geography: str = DEFAULT_GEOGRAPHY) -> tuple[np.ndarray, np.ndarray]:
+        """Return the month ordinals and values of category, in order of
+        month, for the months of geography from start to end as per load.
+        Months missing the value of category are left out.
+
+        Preconditions:
+        - category in CATEGORIES
+        """
+        if category not in CATEGORIES:
+            # The name goes into the query itself, so it must be checked.
+            raise ValueError(f'Unknown category: {category}')
+        rows = self._connection.execute(
+            f'SELECT month, {category} FROM monthly_data '
+            f'WHERE geography = ? AND month BETWEEN ? AND ? AND {category} IS NOT NULL '
+            f'ORDER BY month', (geography,) + _ordinal_range(start, end)).fetchall()
+        dtype = np.int64 if CATEGORY_TYPES[category] is int else np.float64
+        return (np.array([row[0] for row in rows], dtype=np.int64),
+                np.array([row[1] for row in rows], dtype=dtype))
+
+    def geographies(self) -> list[str]:
+        """Return every geography with months in the database, in order."""
+        return [row[0] for row in self._connection.execute(
+            'SELECT DISTINCT geography FROM monthly_data ORDER BY geography')]
+
+    def count(self, geography: str = DEFAULT_GEOGRAPHY) -> int:
+        """Return how many months of geography are in the database."""
+        return self._connection.execute('SELECT COUNT(*) FROM monthly_data WHERE geography = ?',
+                                        (geography,)).fetchone()[0]
+
+    def _upsert(self, dataset: MonthlyDataset, release_date: Optional[datetime], geography: str,
+                digests: Optional[list[str]] = None) -> int:
+        """Add or update every month of dataset, as per append, along with the
+        digest of the cells each came from (if known). Return how many months
+        were added or updated. The caller commits the transaction.
+        """
+        columns = [dataset.months.tolist()]
+        for category in CATEGORIES:
+            values = dataset.column(category).tolist()
+            if dataset.has_missing(category):
+                values = [value if valid else None for value, valid
+                          in zip(values, dataset.is_valid(category).tolist())]
+            columns.append(values)
+        release = _format_date(release_date)
+        if digests is None:
+            digests = [None] * len(dataset)
+        rows = ((geography, release, digest) + row for digest, row in zip(digests, zip(*columns)))
+
+        with span('store append', rows_in=len(dataset), geography=geography) as trace:
+            changes_before = self._connection.total_changes
+            self._connection.executemany(_UPSERT, rows)
+            changes = self._connection.total_changes - changes_before
+            trace.set(rows_out=changes)
+        return changes
+
+    def _revisions(self, dataset: MonthlyDataset, geography: str) -> list[Revision]:
+        """Return every value of dataset that differs from the value of the
+        same month and category in the database.
+
+        Preconditions:
+        - every month of dataset is in the database, once
+        """
+        if len(dataset) == 0:
+            return []
+        stored = self.load(ordinal_to_date(dataset.months.min()),
+                           ordinal_to_date(dataset.months.max()), geography)
+        stored_rows = {month: index for index, month in enumerate(stored.months.tolist())}
+        revisions = []
+        for index, month in enumerate(dataset.months.tolist()):
+            old_values = stored.row_values(stored_rows[month])
+            new_values = dataset.row_values(index)
+            revisions.extend(Revision(ordinal_to_date(month), category, old_values[category],
+                                      new_values[category])
+                             for category in CATEGORIES
+                             if old_values[category] != new_values[category])
+        return revisions
+
+
+def is_store(path: str) -> bool:
+    """Return whether path names a database (by its ending), rather than a
+    raw .csv or a directory or glob pattern of them.
+    """
+    return path.lower().endswith(STORE_SUFFIXES)
+
+
+def _ordinal_range(start: Optional[datetime], end: Optional[datetime]) -> tuple[int, int]:
+    """Return the month ordinals of start and end, with no bound where either
+    is None.
+    """
+    return (date_to_ordinal(start) if start is not None else -2 ** 63,
+            date_to_ordinal(end) if end is not None else 2 ** 63 - 1)
+
+
+def _cells_digest(cells: tuple[str, ...]) -> str:
+    """Return a digest of a month's cells, as they are in a raw .csv."""
+    return hashlib.blake2b('\x1f'.join(cells).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _at_least_as_new(release: Optional[str], other: Optional[str]) -> bool:
+    """Return whether the release with (ISO) release date release is at
+    least as new as the one with release date other. Releases without a
+    release date are older than all the others.
+    """
+    return other is None or (release is not None and release >= other)
+
+
+def _format_date(date: Optional[datetime]) -> Optional[str]:
+    """Return date as it is stored in the database: in ISO format."""
+    return date.strftime('%Y-%m-%d') if date is not None else None
+
+
+def _parse_date(text: Optional[str]) -> Optional[datetime]:
+    """Return the date stored in the database as text."""
+    return datetime.strptime(text, '%Y-%m-%d') if text is not None else None
+
+
+def main(arguments: Optional[list[str]] = None) -> None:
+    """Add the raw .csv files given on the command line (by default,
+    sys.argv) to a database.
+    """
+    parser = argparse.ArgumentParser(description='Add raw .csv files of the transportation '
+                                                 'activity dataset to a SQLite database.')
+    parser.add_argument('store', help='the database file (created if need be)')
+    parser.add_argument('files', nargs='+', help='raw .csv files, or glob patterns of them')
+    parser.add_argument('--geography', default=DEFAULT_GEOGRAPHY,
+                        help='the geography the files are about')
+    options = parser.parse_args(arguments)
+
+    with DataStore(options.store) as store:
+        for pattern in options.files:
+            for filename in sorted(glob.glob(pattern)) or [pattern]:
+                report = store.ingest(filename, options.geography)
+                if report.skipped:
+                    print(f'{filename}: already ingested')
+                    continue
+                print(f'{filename}: {len(report.new_months)} new months, '
+                      f'{len(report.revisions)} revised values, {report.unchanged} months '
+                      f'unchanged, {report.outdated} months outdated')
+                for revision in report.revisions:
+                    print(f'    {revision.month:%B %Y} {revision.category}: '
+                          f'{revision.old_value} -> {revision.new_value}')
+        print(f'{store.count(options.geography)} months of {options.geography} in {options.store}')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,35 +8,488 @@ GROUP INFORMATION
 =================
 Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
 """
+from collections import OrderedDict
+from dataclasses import dataclass
 from random import random
-import matplotlib.pyplot as plt
-from data_collection import OneMonthData
+from typing import Hashable, Optional, Union
 
+import matplotlib
+import matplotlib.style
+import numpy as np
+from matplotlib import dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import instrumentation
+from data_collection import CATEGORIES, MonthlyDataset, OneMonthData
+from instrumentation import span
 
-def get_data(data: list[OneMonthData], categories_to_plot: list[str]) -> dict[str, tuple[list[int], list[int]]]:
-    values = {}
-    for category in categories_to_plot:
-        values[category] = (list(), list())
-        for one_month_data in data:
-            values[category][0].append(getattr(one_month_data, category))
-            time = one_month_data.date
-            values[category][1].append(time.strftime("%m/%d/%Y"))
+# The data get_data prepares: maps each category to its values and their
+# dates (as matplotlib date numbers).
+PlotData = dict[str, tuple[np.ndarray, np.ndarray]]
 
-    return values
+# The ways decimate can reduce a series.
+DECIMATION_METHODS = ('lttb', 'minmax', 'none')
 
+# matplotlib 3.6 renamed the 'seaborn' style.
+GRAPH_STYLE = 'seaborn' if 'seaborn' in matplotlib.style.available else 'seaborn-v0_8'
 
-def generate_graph(data: list[OneMonthData], categories_to_plot: list[str]) -> None:
+
+def get_data(data: Union[list[OneMonthData], MonthlyDataset],
+             categories_to_plot: list[str]) -> PlotData:
+    """Return the data to plot for each category in categories_to_plot: a
+    dictionary mapping each category to its values and their dates.
+
+    The dates are matplotlib date numbers (days since the epoch), computed
+    once for the whole dataset and shared by every category. The values are
+    the dataset's columns themselves, not copies - except for categories with
+    missing values, whose months without a value are left out.
+    """
+    with span('get_data', rows_in=len(data)) as trace:
+        if instrumentation.enabled():
+            trace.set(categories=list(categories_to_plot))
+        if not isinstance(data, MonthlyDataset):
+            data = MonthlyDataset.from_records(data)
+        dates = date_numbers(data.months)
+        plot_data = {}
+        for category in categories_to_plot:
+            if data.has_missing(category):
+                valid = data.is_valid(category)
+                plot_data[category] = (data.column(category)[valid], dates[valid])
+            else:
+                plot_data[category] = (data.column(category), dates)
+        return plot_data
+
+
+def date_numbers(months: np.ndarray) -> np.ndarray:
+    """Return the matplotlib date number of the first day of each month with
+    the given month ordinals, without making any datetime objects.
+    """
+    # datetime64[M] counts months since January 1970.
+    first_days = (months - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]')
+    return mdates.date2num(first_days)
+
+
+def decimate(filtered_data: PlotData, max_points: int, method: str = 'lttb') -> PlotData:
+    """Return data prepared by get_data with each category's series reduced to
+    at most about max_points points, keeping its visual shape. Series that
+    are already short enough are returned unchanged.
+
+    method is one of:
+    - 'lttb': Largest-Triangle-Three-Buckets, which keeps max_points points
+    - 'minmax': the lowest and highest point of each of max_points // 2
+      buckets (e.g. one bucket per pixel column, with max_points twice the
+      plot's width in pixels)
+    - 'none': no decimation at all
+
+    Preconditions:
+    - method in DECIMATION_METHODS
+    - max_points >= 3
+    """
+    if method == 'none':
+        return filtered_data
+    with span('decimate', rows_in=sum(len(values) for values, _ in filtered_data.values()),
+              method=method, max_points=max_points) as trace:
+        decimated = {}
+        for category in filtered_data:
+            values, dates = filtered_data[category]
+            if len(values) <= max_points:
+                decimated[category] = filtered_data[category]
+                continue
+            if method == 'lttb':
+                indices = lttb_indices(np.asarray(values, dtype=np.float64), max_points)
+            else:
+                indices = min_max_indices(np.asarray(values, dtype=np.float64),
+                                          max(max_points // 2, 1))
+            decimated[category] = (np.asarray(values)[indices], np.asarray(dates)[indices])
+        trace.set(rows_out=sum(len(values) for values, _ in decimated.values()))
+    return decimated
+
+
+def lttb_indices(values: np.ndarray, threshold: int) -> np.ndarray:
+    """Return the indices of the threshold points of the series values (at
+    evenly spaced x positions) chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The rest of the series is
+    split into threshold - 2 buckets, and from each bucket the point forming
+    the largest triangle with the previously chosen point and the average of
+    the next bucket is kept.
+
+    Preconditions:
+    - 3 <= threshold < len(values)
+    """
+    length = len(values)
+    x = np.arange(length, dtype=np.float64)
+    # Bucket boundaries for the points between the first and the last.
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+
+    chosen = np.empty(threshold, dtype=np.int64)
+    chosen[0] = 0
+    chosen[-1] = length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_stop = length - 1, length
+        next_x = x[next_start:next_stop].mean()
+        next_y = values[next_start:next_stop].mean()
+
+        # Twice the area of each candidate's triangle.
+        areas = np.abs((x[previous] - next_x) * (values[start:stop] - values[previous])
+                       - (x[previous] - x[start:stop]) * (next_y - values[previous]))
+        previous = start + int(np.argmax(areas))
+        chosen[bucket + 1] = previous
+    return chosen
+
+
+def min_max_indices(values: np.ndarray, buckets: int) -> np.ndarray:
+    """Return the indices of the lowest and highest point in each of buckets
+    equally sized runs of the series values, in order.
+
+    Preconditions:
+    - 1 <= buckets <= len(values)
+    """
+    edges = np.linspace(0, len(values), buckets + 1).astype(np.int64)
+    # Accumulator for the chosen indices.
+    chosen = []
+    for bucket in range(buckets):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if start == stop:
+            continue
+        low = start + int(np.argmin(values[start:stop]))
+        high = start + int(np.argmax(values[start:stop]))
+        chosen.extend(sorted({low, high}))
+    return np.array(chosen, dtype=np.int64)
+
+
+def generate_graph(data: Union[list[OneMonthData], MonthlyDataset], categories_to_plot: list[str]) -> None:
     """Creates a scatter plot graph of the categories in categories_to_plot using the data in data."""
-    filtered_data = get_data(data, categories_to_plot)
+    with span('generate_graph', rows_in=len(data)):
+        draw_graph_data(get_data(data, categories_to_plot), categories_to_plot)
+
+
+def draw_graph_data(filtered_data: PlotData, categories_to_plot: list[str]) -> None:
+    """Creates a scatter plot graph of data already prepared by get_data.
+
+    Unlike get_data, this must be called from the main (Tk) thread.
+    """
+    # pyplot (and the GUI backend it starts) is only needed here.
+    import matplotlib.pyplot as plt
+
     title = 'Graph of '+', '.join(categories_to_plot)
-    plt.style.use('seaborn')
-    for category in filtered_data:
-        plt.scatter(filtered_data[category][1], filtered_data[category][0], s=300, c=((random(), random(), random()),), marker='o')
-    plt.xlabel('Date')
-    plt.ylabel('Value')
-    plt.title(title)
-    plt.legend(categories_to_plot)
+    with span('draw_graph_data'):
+        plt.style.use(GRAPH_STYLE)
+        for category in filtered_data:
+            plt.scatter(filtered_data[category][1], filtered_data[category][0], s=300, c=((random(), random(), random()),), marker='o')
+        _format_date_axis(plt.gca())
+        plt.xlabel('Date')
+        plt.ylabel('Value')
+        plt.title(title)
+        plt.legend(categories_to_plot)
     plt.show()
 
 
+class GraphCanvas:
+    """A single figure that is reused for every graph, instead of building a
+    new figure (and opening a new window) each time.
+
+    The axes and one scatter artist per category are made once. Rendering new
+    data only updates the artists' offsets and visibility. When the axes
+    themselves are unchanged (same dates, limits and categories), only the
+    artists are redrawn over a saved background (blitting); otherwise the
+    whole figure is redrawn.
+
+    Instance Attributes:
+        - figure: the figure being drawn on
+        - axes: the figure's one set of axes
+        - canvas: the canvas the figure is drawn on - a FigureCanvasTkAgg
+          embedded in a Tk widget, or an off-screen FigureCanvasAgg
+        - artists: maps each category to its scatter artist
+    """
+    figure: Figure
+    axes: object
+    canvas: FigureCanvasAgg
+    artists: dict[str, object]
+
+    # Private attributes:
+    # _background: the figure without the artists, saved after the last full
+    #   draw, for blitting (None before the first draw).
+    # _layout: everything about the last render that affects more than the
+    #   artists - the date labels, y limits and categories plotted.
+    # _saving: whether the figure is being saved to a file, rather than drawn
+    #   on the canvas.
+    # _shown: the data and categories last rendered (None before the first
+    #   render).
+    _background: Optional[object]
+    _layout: Optional[tuple]
+    _saving: bool
+    _shown: Optional[tuple[PlotData, list[str]]]
+
+    def __init__(self, master: object = None, figsize: tuple[float, float] = (8, 6),
+                 dpi: int = 100) -> None:
+        """Initialize the figure, axes and artists.
+
+        If master is a Tk widget, embed the canvas in it (the caller still
+        has to place canvas.get_tk_widget() in the window). Otherwise, draw
+        off-screen.
+        """
+        with matplotlib.style.context(GRAPH_STYLE):
+            self.figure = Figure(figsize=figsize, dpi=dpi)
+            if master is not None:
+                from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+                self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+            else:
+                self.canvas = FigureCanvasAgg(self.figure)
+            self.axes = self.figure.add_subplot()
+            _format_date_axis(self.axes)
+            self.axes.set_xlabel('Date')
+            self.axes.set_ylabel('Value')
+
+            colours = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+            self.artists = {}
+            for i, category in enumerate(CATEGORIES):
+                # Animated artists are left out of full draws; they are drawn
+                # by _draw_artists instead, over the saved background.
+                self.artists[category] = self.axes.scatter(
+                    [], [], s=300, marker='o', label=category,
+                    color=colours[i % len(colours)], animated=True, visible=False)
+
+        self._background = None
+        self._layout = None
+        self._saving = False
+        self._shown = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def render(self, filtered_data: PlotData, categories_to_plot: list[str]) -> None:
+        """Show data prepared by get_data, for the categories in
+        categories_to_plot, replacing whatever was shown before.
+
+        This must be called from the main (Tk) thread.
+        """
+        # Accumulators for every plotted date and value, for the limits.
+        plotted_dates = []
+        plotted_values = []
+        for category in CATEGORIES:
+            artist = self.artists[category]
+            if category in categories_to_plot:
+                values, dates = filtered_data[category]
+                artist.set_offsets(np.column_stack([dates, values]))
+                artist.set_visible(True)
+                plotted_dates.append(np.asarray(dates))
+                plotted_values.append(np.asarray(values, dtype=np.float64))
+            else:
+                artist.set_visible(False)
+        self._shown = (filtered_data, list(categories_to_plot))
+
+        # Dates get at least half a month of room on either side.
+        x_limits = _padded_limits(np.concatenate(plotted_dates) if plotted_dates else np.zeros(0),
+                                  0.02, 15)
+        y_limits = _padded_limits(np.concatenate(plotted_values) if plotted_values else np.zeros(0),
+                                  0.05)
+        layout = (x_limits, y_limits, tuple(categories_to_plot))
+
+        if layout != self._layout or self._background is None:
+            with span('render', blit=False):
+                self._set_layout(layout)
+                # Triggers _on_draw, which saves the background and draws the artists.
+                self.canvas.draw()
+        else:
+            with span('render', blit=True):
+                self.canvas.restore_region(self._background)
+                self._draw_artists()
+                self.canvas.blit(self.figure.bbox)
+
+    def snapshot(self) -> Optional['GraphSnapshot']:
+        """Return a snapshot of the graph as currently shown, or None if
+        nothing has been rendered yet.
+        """
+        if self._shown is None or self._background is None:
+            return None
+        filtered_data, categories_to_plot = self._shown
+        return GraphSnapshot(filtered_data, categories_to_plot, self._canvas_size(),
+                             self._layout, self._background,
+                             self.canvas.copy_from_bbox(self.figure.bbox))
+
+    def show(self, snapshot: 'GraphSnapshot') -> None:
+        """Show the graph in snapshot again. If the canvas is still the size
+        it was, its saved pixels are copied back without drawing anything;
+        otherwise it is rendered again from its data.
+
+        This must be called from the main (Tk) thread.
+        """
+        if snapshot.size != self._canvas_size():
+            self.render(snapshot.filtered_data, snapshot.categories_to_plot)
+            return
+        for category in CATEGORIES:
+            artist = self.artists[category]
+            if category in snapshot.categories_to_plot:
+                values, dates = snapshot.filtered_data[category]
+                artist.set_offsets(np.column_stack([dates, values]))
+                artist.set_visible(True)
+            else:
+                artist.set_visible(False)
+        self._shown = (snapshot.filtered_data, snapshot.categories_to_plot)
+        # Keep the axes as the snapshot shows them, for any later redraw.
+        self._set_layout(snapshot.layout)
+        self._background = snapshot.background
+        self.canvas.restore_region(snapshot.image)
+        self.canvas.blit(self.figure.bbox)
+
+    def save(self, filename: str, **savefig_options: object) -> None:
+        """Save the figure as currently shown to filename, in the format its
+        extension names (e.g. .png or .svg).
+        """
+        # Animated artists are left out of normal draws, which savefig uses.
+        for artist in self.artists.values():
+            artist.set_animated(False)
+        self._saving = True
+        try:
+            with span('save', file=filename):
+                self.figure.savefig(filename, **savefig_options)
+        finally:
+            self._saving = False
+            for artist in self.artists.values():
+                artist.set_animated(True)
+
+    def plot_width(self) -> int:
+        """Return the width of the axes in pixels - the most points a series
+        needs to look the same (see decimate).
+        """
+        return max(int(self.axes.get_window_extent().width), 3)
+
+    def _set_layout(self, layout: tuple) -> None:
+        """Set the limits, title and legend of the axes to match layout,
+        without drawing anything.
+        """
+        x_limits, y_limits, categories_to_plot = layout
+        self._layout = layout
+        self.axes.set_xlim(*x_limits)
+        self.axes.set_ylim(*y_limits)
+        self.axes.set_title('Graph of ' + ', '.join(categories_to_plot))
+        self.axes.legend(handles=[self.artists[category] for category in categories_to_plot])
+
+    def _canvas_size(self) -> tuple[float, float]:
+        """Return the size of the canvas in pixels."""
+        return self.figure.bbox.width, self.figure.bbox.height
+
+    def _on_draw(self, event: object) -> None:
+        """After every full draw, save the background and draw the artists on
+        top of it. Draws made by saving to a file are left alone.
+        """
+        if self._saving:
+            return
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self) -> None:
+        """Draw the visible artists onto the canvas."""
+        for artist in self.artists.values():
+            if artist.get_visible():
+                self.axes.draw_artist(artist)
+
+
+@dataclass
+class GraphSnapshot:
+    """A graph as rendered on a GraphCanvas, which can be shown again (see
+    GraphCanvas.show) without redrawing it.
+
+    Instance Attributes:
+        - filtered_data: the data that was rendered, as prepared by get_data
+        - categories_to_plot: the categories that were rendered
+        - size: the size of the canvas, in pixels, when it was rendered
+        - layout: the limits and categories of the axes (see GraphCanvas)
+        - background: the rendered figure without the artists
+        - image: the rendered figure, artists and all
+    """
+    filtered_data: PlotData
+    categories_to_plot: list[str]
+    size: tuple[float, float]
+    layout: tuple
+    background: object
+    image: object
+
+
+@dataclass
+class CachedGraph:
+    """The result of filtering and rendering the data for one configuration
+    of the options in the main window.
+
+    Instance Attributes:
+        - kept: the indices of the rows of data the filters kept
+        - snapshot: the graph rendered from those rows
+    """
+    kept: np.ndarray
+    snapshot: GraphSnapshot
+
+
+class GraphCache:
+    """A bounded cache of graphs that have been filtered and rendered, so
+    that going back to an earlier configuration of options shows its graph
+    straight away. Once full, the least recently used graph is dropped.
+
+    Instance Attributes:
+        - max_entries: the most graphs the cache holds
+
+    Representation Invariants:
+        - self.max_entries >= 1
+    """
+    max_entries: int
+
+    # Private attributes:
+    # _entries: maps each key to its graph, least recently used first.
+    _entries: OrderedDict[Hashable, CachedGraph]
+
+    def __init__(self, max_entries: int = 8) -> None:
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> Optional[CachedGraph]:
+        """Return the graph cached for key, marking it as the most recently
+        used, or None if there is none.
+        """
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: Hashable, graph: CachedGraph) -> None:
+        """Cache graph for key, dropping the least recently used graph if the
+        cache is full.
+        """
+        self._entries[key] = graph
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached graph."""
+        self._entries.clear()
+
+
+def _format_date_axis(axes: object) -> None:
+    """Make the x axis of axes a date axis, with ticks and labels that adapt
+    to the range of dates shown.
+    """
+    locator = mdates.AutoDateLocator(minticks=3)
+    axes.xaxis.set_major_locator(locator)
+    axes.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
 
+def _padded_limits(values: np.ndarray, padding: float,
+                   minimum_margin: float = 0.0) -> tuple[float, float]:
+    """Return axis limits that fit values, padded on either side by padding
+    times the range of values, but by at least minimum_margin. If that leaves
+    no room at all, pad by padding times the size of the values (or by 1).
+    """
+    if len(values) == 0:
+        return 0.0, 1.0
+    low, high = float(values.min()), float(values.max())
+    margin = max((high - low) * padding, minimum_margin) or abs(high) * padding or 1.0
+    return low - margin, high + margin
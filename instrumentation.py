@@ -0,0 +1,342 @@
+"""CSC110 Project Phase 2
+
+FILE DESCRIPTION
+================
+This file records where the time goes in each stage of the program - parsing,
+filtering and graphing - without a profiler. Each stage is a span: a named,
+timed block of code, which may be nested inside another span, and which can
+record how many rows went in and out of it and anything else of note (such as
+how many rows each filter rejected).
+
+Tracing is off unless the CSC110_TRACE environment variable names a file to
+write to. When it is off, a span does nothing, at the cost of a function call.
+When it is on, each span is written to the file when it ends - as one JSON
+object per line by default, or in the Chrome trace event format (which
+chrome://tracing and https://ui.perfetto.dev can open) if CSC110_TRACE_FORMAT
+is 'chrome'. Child processes write files of their own. If
+CSC110_TRACE_MEMORY is '1', each span also records the most memory allocated
+at once while it ran, which slows everything down a lot.
+
+For example:
+    CSC110_TRACE=trace.jsonl python main.py
+    CSC110_TRACE=trace.json CSC110_TRACE_FORMAT=chrome python batch_render.py charts.json
+
+GROUP INFORMATION
+=================
+Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import BinaryIO, Optional, Union
+
+# The environment variables that turn tracing on and configure it.
+TRACE_ENV_VAR = 'CSC110_TRACE'
+TRACE_FORMAT_ENV_VAR = 'CSC110_TRACE_FORMAT'
+TRACE_MEMORY_ENV_VAR = 'CSC110_TRACE_MEMORY'
+
+# The formats a Tracer can write.
+TRACE_FORMATS = ('jsonl', 'chrome')
+
+
+class Span:
+    """A named, timed block of code, used as a context manager. Spans are
+    made by the span function, not directly.
+
+    Instance Attributes:
+        - name: what the span measures
+        - rows_in: how many rows of data went in (None if not recorded)
+        - rows_out: how many rows of data came out (None if not recorded)
+        - attributes: anything else recorded about the span
+    """
+    name: str
+    rows_in: Optional[int]
+    rows_out: Optional[int]
+    attributes: dict[str, object]
+
+    # Private attributes:
+    # _tracer: the tracer the span is recorded by.
+    # _parent: the span this one is nested in (None at the top level).
+    # _start: when the span began, in seconds (from time.perf_counter).
+    # _start_memory: the memory allocated when the span began.
+    # _peak_memory: the most memory allocated at once during the span so far,
+    #   as of the last time the tracemalloc peak was reset.
+    _tracer: 'Tracer'
+    _parent: Optional['Span']
+    _start: float
+    _start_memory: int
+    _peak_memory: int
+
+    def __init__(self, tracer: 'Tracer', name: str, rows_in: Optional[int],
+                 attributes: dict[str, object]) -> None:
+        self._tracer = tracer
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.attributes = attributes
+        self._parent = None
+
+    def set(self, rows_out: Optional[int] = None, **attributes: object) -> None:
+        """Record how many rows came out of the span, and/or other
+        attributes of it.
+        """
+        if rows_out is not None:
+            self.rows_out = rows_out
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> 'Span':
+        self._parent = self._tracer.push(self)
+        if self._tracer.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._parent is not None:
+                self._parent._peak_memory = max(self._parent._peak_memory, peak)
+            tracemalloc.reset_peak()
+            self._start_memory = self._peak_memory = current
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        end = time.perf_counter()
+        peak_bytes = None
+        if self._tracer.trace_memory:
+            self._peak_memory = max(self._peak_memory, tracemalloc.get_traced_memory()[1])
+            if self._parent is not None:
+                self._parent._peak_memory = max(self._parent._peak_memory, self._peak_memory)
+            tracemalloc.reset_peak()
+            peak_bytes = self._peak_memory - self._start_memory
+        self._tracer.pop(self)
+        self._tracer.record(self, self._start, end, peak_bytes)
+
+
+class _NoSpan:
+    """What span returns while tracing is off: a span that records nothing."""
+
+    def set(self, rows_out: Optional[int] = None, **attributes: object) -> None:
+        """Do nothing."""
+
+    def __enter__(self) -> '_NoSpan':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """Writes the spans that end to a trace file, as they end.
+
+    Spans on different threads are nested separately, each thread's spans in
+    their own stack. Memory, however, is measured for the whole process. Each
+    process writes its own file: a child process (such as one parsing files
+    for process_files) writes to the path with its process ID added before the
+    extension.
+
+    Instance Attributes:
+        - path: the file the trace is written to
+        - format: one of TRACE_FORMATS
+        - trace_memory: whether spans record their peak memory
+    """
+    path: str
+    format: str
+    trace_memory: bool
+
+    # Private attributes:
+    # _clock_offset: what to add to a time.perf_counter() time to make it a
+    #   time since the epoch, so that traces from different processes line up.
+    # _lock: held while writing to the trace.
+    # _stacks: each thread's stack of the spans it is in.
+    # _file: the trace file, open for writing, or None once closed.
+    # _pid: the ID of the process that opened _file.
+    # _events_written: how many spans have been written to _file.
+    _clock_offset: float
+    _lock: threading.Lock
+    _stacks: threading.local
+    _file: Optional[BinaryIO]
+    _pid: int
+    _events_written: int
+
+    def __init__(self, path: str, format: str = 'jsonl', trace_memory: bool = False) -> None:
+        if format not in TRACE_FORMATS:
+            raise ValueError(f'Unknown trace format: {format}')
+        self.format = format
+        self.trace_memory = trace_memory
+        self._clock_offset = time.time() - time.perf_counter()
+        self._lock = threading.Lock()
+        self._stacks = threading.local()
+        self._open(path)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def push(self, span: Span) -> Optional[Span]:
+        """Enter span on the current thread. Return the span it is nested in."""
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        stack.append(span)
+        return parent
+
+    def pop(self, span: Span) -> None:
+        """Leave span (the innermost span) on the current thread."""
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+
+    def record(self, span: Span, start: float, end: float, peak_bytes: Optional[int]) -> None:
+        """Write span, which ran from start to end (times from
+        time.perf_counter), to the trace.
+        """
+        event = {'name': span.name,
+                 'start': round(start + self._clock_offset, 6),
+                 'duration_ms': round((end - start) * 1000, 3),
+                 'pid': os.getpid(),
+                 'thread': threading.current_thread().name,
+                 'depth': len(self._stack())}
+        if span._parent is not None:
+            event['parent'] = span._parent.name
+        if span.rows_in is not None:
+            event['rows_in'] = span.rows_in
+        if span.rows_out is not None:
+            event['rows_out'] = span.rows_out
+        if peak_bytes is not None:
+            event['peak_bytes'] = peak_bytes
+        if span.attributes:
+            event['attributes'] = span.attributes
+
+        if self.format == 'chrome':
+            line = json.dumps(_chrome_event(event), default=str) + ',\n'
+        else:
+            line = json.dumps(event, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            if self._pid != os.getpid():
+                # A forked child process: leave the parent's file alone.
+                self._file.close()
+                self._open(_process_path(self.path, os.getpid()))
+            self._file.write(line.encode('utf-8'))
+            self._file.flush()
+            self._events_written += 1
+
+    def close(self) -> None:
+        """Finish the trace and close its file. Later spans are not recorded."""
+        with self._lock:
+            if self._file is None:
+                return
+            if self.format == 'chrome':
+                # Replace the comma after the last event with the end of the
+                # array. (Chrome accepts the array without its end, too.)
+                if self._events_written > 0:
+                    self._file.seek(-2, os.SEEK_END)
+                self._file.write(b'\n]\n')
+            self._file.close()
+            self._file = None
+
+    def _open(self, path: str) -> None:
+        """Start writing the trace to path."""
+        self.path = path
+        self._pid = os.getpid()
+        self._events_written = 0
+        self._file = open(path, 'wb')
+        if self.format == 'chrome':
+            self._file.write(b'[\n')
+            self._file.flush()
+        if _in_child_process():
+            # Pool workers exit without running atexit handlers, but do run
+            # multiprocessing's finalizers.
+            import multiprocessing.util
+            multiprocessing.util.Finalize(None, self.close, exitpriority=0)
+
+    def _stack(self) -> list[Span]:
+        """Return the current thread's stack of spans."""
+        if not hasattr(self._stacks, 'spans'):
+            self._stacks.spans = []
+        return self._stacks.spans
+
+
+def _chrome_event(event: dict) -> dict:
+    """Return event, as recorded by Tracer.record, as a Chrome trace "complete"
+    event.
+    """
+    arguments = dict(event.get('attributes', {}))
+    for key in ('rows_in', 'rows_out', 'peak_bytes'):
+        if key in event:
+            arguments[key] = event[key]
+    return {'name': event['name'], 'ph': 'X', 'ts': round(event['start'] * 1e6, 1),
+            'dur': round(event['duration_ms'] * 1000, 1), 'pid': event['pid'],
+            'tid': event['thread'], 'args': arguments}
+
+
+def _in_child_process() -> bool:
+    """Return whether this process was started by multiprocessing."""
+    import multiprocessing
+
+    return multiprocessing.parent_process() is not None
+
+
+def _process_path(path: str, pid: int) -> str:
+    """Return path with the process ID pid added before its extension."""
+    root, extension = os.path.splitext(path)
+    return f'{root}.{pid}{extension}'
+
+
+# The tracer spans are recorded by, or None while tracing is off.
+_tracer: Optional[Tracer] = None
+
+
+def span(name: str, rows_in: Optional[int] = None, **attributes: object) -> Union[Span, _NoSpan]:
+    """Return a span called name, to use as a context manager around the code
+    it measures. rows_in and attributes are recorded along with it, as is
+    anything passed to its set method.
+
+    While tracing is off, the span does nothing.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return Span(_tracer, name, rows_in, attributes)
+
+
+def enabled() -> bool:
+    """Return whether tracing is on."""
+    return _tracer is not None
+
+
+def enable(path: str, format: str = 'jsonl', trace_memory: bool = False) -> Tracer:
+    """Turn tracing on, writing to path in format (one of TRACE_FORMATS),
+    replacing any tracer already in use. Return the new tracer.
+    """
+    global _tracer
+    disable()
+    _tracer = Tracer(path, format, trace_memory)
+    return _tracer
+
+
+def disable() -> None:
+    """Turn tracing off, closing the trace file."""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+
+def _enable_from_environment() -> None:
+    """Turn tracing on if the environment asks for it (see TRACE_ENV_VAR)."""
+    path = os.environ.get(TRACE_ENV_VAR)
+    if path:
+        if _in_child_process():
+            # A child process, which inherited the environment: write a file
+            # of its own.
+            path = _process_path(path, os.getpid())
+        enable(path, os.environ.get(TRACE_FORMAT_ENV_VAR, 'jsonl'),
+               os.environ.get(TRACE_MEMORY_ENV_VAR) == '1')
+
+
+_enable_from_environment()
+atexit.register(disable)
+
+
+if __name__ == '__main__':
+    pass
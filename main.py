@@ -9,18 +9,79 @@ GROUP INFORMATION
 =================
 Tushaar Sarin, Michael Yu, Parshwa Gada, Rohan Sahota
 """
+import argparse
+import importlib
+import queue
+import sys
+import threading
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-
-from data_collection import OneMonthData, process_file
-from data_filtering import filter
-import graphing
+from tkinter import ttk
+from types import ModuleType
+from typing import TYPE_CHECKING, Optional
+
+# NumPy, matplotlib and the modules using them are slow to import, so they are
+# imported when first needed - mostly on the worker thread, while the window is
+# already showing.
+if TYPE_CHECKING:
+    import numpy as np
+    import graphing
+    from data_collection import MonthlyDataset
+
+# How often (in milliseconds) the window checks for finished background work.
+POLL_INTERVAL_MS = 50
+
+
+class StartupProfile:
+    """Records how long starting the program takes, import by import and stage by stage, for --profile-startup.
+
+    Instance Attributes:
+        - enabled: whether to record (and report) anything
+        - start: the time (from time.perf_counter) the profile was created
+        - imports: each module imported through import_module, and how many seconds importing it took
+        - stages: each stage of start-up reached, and how many seconds after start it was reached
+    """
+    enabled: bool
+    start: float
+    imports: list[tuple[str, float]]
+    stages: list[tuple[str, float]]
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.imports = []
+        self.stages = []
+
+    def import_module(self, name: str) -> ModuleType:
+        """Import and return the module called name, recording how long that took. A module that is already
+        imported takes no time, so import modules before the modules that depend on them to see what each
+        costs."""
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        if self.enabled:
+            self.imports.append((name, time.perf_counter() - start))
+        return module
+
+    def stage(self, name: str) -> None:
+        """Record that the stage called name has been reached."""
+        if self.enabled:
+            self.stages.append((name, time.perf_counter() - self.start))
+
+    def report(self) -> str:
+        """Return a table of the imports and stages recorded."""
+        lines = ['Imports:']
+        lines.extend(f'  {name:<30}{seconds * 1000:>10.1f} ms' for name, seconds in self.imports)
+        lines.append('Stages (since start):')
+        lines.extend(f'  {name:<30}{seconds * 1000:>10.1f} ms' for name, seconds in self.stages)
+        return '\n'.join(lines)
 
 
 @dataclass
 class CSProject:
     """Renders the main window for the Project."""
-    data: list[OneMonthData]
+    data: Optional['MonthlyDataset']
     categories_to_plot: list[str]
     categories_to_filter: list[str]
     additional_filters: list[str]
@@ -34,8 +95,47 @@ class CSProject:
     filter_to_checkbox: dict[str, tk.Checkbutton]
     additional_filter_to_value: dict[str, tk.IntVar]
     additional_filter_to_checkbox: dict[str, tk.Checkbutton]
+    simplify_graph_value: tk.IntVar
+    simplify_graph_checkbox: tk.Checkbutton
+    _progress: ttk.Progressbar
+    _status: tk.Label
+    _graph: Optional['graphing.GraphCanvas']
+
+    # Private attributes for background work:
+    # _executor: the worker thread that filters and prepares graphs.
+    # _results: messages from the worker - (generation, kind, payload) tuples.
+    # _generation: the number of the newest graph request. Messages from any
+    #   older request are ignored.
+    # _cancel_event: set to tell the worker to abandon the current request.
+    _executor: ThreadPoolExecutor
+    _results: queue.Queue
+    _generation: int
+    _cancel_event: threading.Event
+
+    # Private attributes for reusing graphs:
+    # _graph_cache: the graphs already filtered and rendered, keyed by the
+    #   options they were made with (see graph_cache_key).
+    # _data_fingerprint: the fingerprint of data when the graphs in
+    #   _graph_cache were made (None before any were).
+    _graph_cache: Optional['graphing.GraphCache']
+    _data_fingerprint: Optional[str]
+
+    # _profile: records how long starting up takes.
+    # _load_error: why loading the graphing code or the data failed (None if
+    #   it has not).
+    _profile: StartupProfile
+    _load_error: Optional[Exception]
+
+    def __init__(self, title: str = 'Title', dimensions: tuple[int, int] = (1280, 720), offset: tuple[int, int] = None,
+                 profile: Optional[StartupProfile] = None):
+        """Build the window. The graph and data are not ready until start_loading has run in the background."""
+        self._profile = profile or StartupProfile()
+        self._load_error = None
+        self.data = None
+        self._graph = None
+        self._graph_cache = None
+        self._data_fingerprint = None
 
-    def __init__(self, title: str = 'Title', dimensions: tuple[int, int] = (1280, 720), offset: tuple[int, int] = None):
         # main window:
         ################################################################################################################
         self._window = tk.Tk()
@@ -54,9 +154,19 @@ class CSProject:
 
         self.render_category_options()
         self.render_filter_options()
+        self.render_progress()
 
         self.load_default_categories()
 
+        # background work:
+        ################################################################################################################
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._results = queue.Queue()
+        self._generation = 0
+        self._cancel_event = threading.Event()
+        self._window.after(POLL_INTERVAL_MS, self.poll_results)
+        ################################################################################################################
+
     def position_window(self, dimensions: tuple[int, int], offset: tuple[int, int]) -> None:
         """Position the window on-screen."""
         window_width, window_height = dimensions
@@ -191,6 +301,15 @@ USA/Canada.', variable=self.filter_to_value['freight_can_us_vehicles']).pack(sid
                                              variable=self.additional_filter_to_value['filter_duplicates'
                                              ]).pack(side=tk.TOP, anchor=tk.W)
         }
+        ################################################################################################################
+
+        # graph simplification checkbox (on by default):
+        ################################################################################################################
+        self.simplify_graph_value = tk.IntVar(value=1)
+        self.simplify_graph_checkbox = tk.Checkbutton(self._frame_filters, text='Simplify long series for plotting.',
+                                                      variable=self.simplify_graph_value).pack(side=tk.TOP,
+                                                                                               anchor=tk.W)
+        ################################################################################################################
 
         # update button:
         ################################################################################################################
@@ -198,6 +317,26 @@ USA/Canada.', variable=self.filter_to_value['freight_can_us_vehicles']).pack(sid
                                             command=self.update_graph).pack(side=tk.TOP, anchor=tk.E)
         ################################################################################################################
 
+    def render_progress(self) -> None:
+        """Displays the progress indicator and status of graph rendering."""
+        self._progress = ttk.Progressbar(self._window, mode='indeterminate', length=200)
+        self._progress.grid(row=2, column=0, padx=10, pady=(0, 5))
+        self._status = tk.Label(self._window, text='')
+        self._status.grid(row=3, column=0, padx=10)
+
+    def render_graph_canvas(self) -> None:
+        """Embeds the graph in the window, to the right of the options. The same canvas is reused for every
+        graph.
+
+        This imports matplotlib, if the worker thread has not already done so (see load)."""
+        import graphing
+
+        self._graph = graphing.GraphCanvas(self._window)
+        self._graph_cache = graphing.GraphCache()
+        self._graph.canvas.get_tk_widget().grid(row=0, column=1, rowspan=4, padx=10, pady=10, sticky=tk.NSEW)
+        self._window.grid_columnconfigure(1, weight=1)
+        self._window.grid_rowconfigure(3, weight=1)
+
     def load_default_categories(self) -> None:
         """Reset categories_to_plot to plot all data categories."""
         self.categories_to_plot = [
@@ -211,12 +350,160 @@ USA/Canada.', variable=self.filter_to_value['freight_can_us_vehicles']).pack(sid
             'overall_rail_passengers'
         ]
 
+    def start_loading(self, filename: str) -> None:
+        """Begin importing the graphing code and parsing the data in filename (a raw .csv, or a database made by
+        data_storage.py) on the worker thread (see load), so that the window can show in the meantime."""
+        self._status.config(text='Loading...')
+        self._progress.start()
+        self._executor.submit(self.load, filename)
+
+    def load(self, filename: str) -> None:
+        """Import the graphing code, then parse the data in filename, reporting each to the main thread through
+        _results as soon as it is ready.
+
+        This runs on the worker thread: it must not touch any Tk objects."""
+        try:
+            self._profile.import_module('numpy')
+            self._profile.import_module('data_collection')
+            self._profile.import_module('matplotlib')
+            self._profile.import_module('graphing')
+            self._results.put((None, 'graphing', None))
+
+            self._profile.import_module('data_filtering')
+            data_interchange = self._profile.import_module('data_interchange')
+            data = data_interchange.load_dataset(filename)
+            self._profile.stage('data parsed')
+            self._results.put((None, 'data', data))
+        except Exception as error:
+            self._results.put((None, 'load error', error))
+
     def update_graph(self) -> None:
+        """Read the selected options, then filter the data and prepare the graph on a worker thread, so that the
+        window stays responsive. The graph is drawn once the work is done (see poll_results).
+
+        A newer request supersedes an older one that is still in progress: the older one is cancelled. If the same
+        options were rendered recently, their graph is shown again straight away instead.
+        """
+        if self._load_error is not None:
+            self._status.config(text=f'Could not load data: {self._load_error}')
+            return
+        if self.data is None or self._graph is None:
+            self._status.config(text='Still loading, please try again in a moment.')
+            return
         self.update_categories()
         self.update_additional_filters()
-        filtered_data = self.update_filters()
-        self.draw_graph(filtered_data)
-
+        self.update_filters()
+
+        self._cancel_event.set()
+        self._cancel_event = threading.Event()
+        self._generation += 1
+        decimation_method = 'lttb' if self.simplify_graph_value.get() == 1 else 'none'
+        cache_key = self.graph_cache_key(decimation_method)
+        cached = self._graph_cache.get(cache_key)
+        if cached is not None:
+            self._progress.stop()
+            self._status.config(text='')
+            self._graph.show(cached.snapshot)
+            return
+
+        self._executor.submit(self.prepare_graph, self._generation, self._cancel_event, self.data,
+                              self.additional_filters[0], self.additional_filters[1],
+                              list(self.categories_to_filter), list(self.categories_to_plot),
+                              decimation_method, self._graph.plot_width(), cache_key)
+        self._status.config(text='Filtering data...')
+        self._progress.start()
+
+    def prepare_graph(self, generation: int, cancel_event: threading.Event, data: 'MonthlyDataset',
+                      filter_garbage: bool, filter_duplicates: bool, categories_to_filter: list[str],
+                      categories_to_plot: list[str], decimation_method: str = 'none', max_points: int = 0,
+                      cache_key: Optional[tuple] = None) -> None:
+        """Filter data and prepare it for graphing, reporting progress and the result to the main thread through
+        _results. Stop early if cancel_event is set.
+
+        Each series is decimated with decimation_method down to about max_points points (see graphing.decimate).
+        Once drawn, the graph is cached under cache_key, if it is given.
+
+        This runs on the worker thread: it must not touch any Tk objects, and it does not mutate data.
+        """
+        # A newer request may have superseded this one while it waited in the queue.
+        if cancel_event.is_set():
+            return
+        import graphing
+        from data_filtering import evaluate_filters
+        from instrumentation import span
+
+        try:
+            with span('prepare_graph', rows_in=len(data)):
+                result = evaluate_filters(filter_garbage, filter_duplicates, categories_to_filter, data)
+                if cancel_event.is_set():
+                    return
+                self._results.put((generation, 'progress', 'Preparing graph...'))
+
+                values = graphing.get_data(data[result.kept], categories_to_plot)
+                values = graphing.decimate(values, max_points, decimation_method)
+                if cancel_event.is_set():
+                    return
+                self._results.put((generation, 'done', (cache_key, result.kept, categories_to_plot, values)))
+        except Exception as error:
+            self._results.put((generation, 'error', error))
+
+    def poll_results(self) -> None:
+        """Handle the messages the worker thread has sent since the last poll, ignoring those from superseded
+        requests, then poll again after POLL_INTERVAL_MS.
+
+        Messages from loading (see load) have no generation, and are never superseded."""
+        try:
+            while True:
+                generation, kind, payload = self._results.get_nowait()
+                if generation is not None and generation != self._generation:
+                    continue
+                if kind == 'progress':
+                    self._status.config(text=payload)
+                elif kind == 'graphing':
+                    self.render_graph_canvas()
+                    self._profile.stage('graph canvas shown')
+                elif kind == 'data':
+                    self.data = payload
+                    self._progress.stop()
+                    self._status.config(text='')
+                    self._profile.stage('data loaded')
+                    if self._profile.enabled:
+                        print(self._profile.report(), file=sys.stderr)
+                elif kind == 'load error':
+                    self._load_error = payload
+                    self._progress.stop()
+                    self._status.config(text=f'Could not load data: {payload}')
+                else:
+                    self._progress.stop()
+                    if kind == 'error':
+                        self._status.config(text=f'Could not render graph: {payload}')
+                    else:
+                        self._status.config(text='')
+                        cache_key, kept, categories_to_plot, values = payload
+                        self._graph.render(values, categories_to_plot)
+                        self.cache_graph(cache_key, kept)
+        except queue.Empty:
+            pass
+        self._window.after(POLL_INTERVAL_MS, self.poll_results)
+
+    def graph_cache_key(self, decimation_method: str) -> tuple:
+        """Return the key in _graph_cache of the graph for the selected options, drawn with decimation_method. If
+        data has changed since the cached graphs were made, empty the cache first."""
+        fingerprint = self.data.fingerprint()
+        if fingerprint != self._data_fingerprint:
+            self._graph_cache.clear()
+            self._data_fingerprint = fingerprint
+        return (fingerprint, tuple(self.categories_to_plot), tuple(self.categories_to_filter),
+                self.additional_filters[0], self.additional_filters[1], decimation_method)
+
+    def cache_graph(self, cache_key: Optional[tuple], kept: 'np.ndarray') -> None:
+        """Cache the graph just rendered under cache_key, along with the indices of the rows of data it kept. Do
+        nothing if there is no key, or data has changed since it was made."""
+        import graphing
+
+        snapshot = self._graph.snapshot()
+        if cache_key is not None and snapshot is not None and cache_key[0] == self._data_fingerprint:
+            self._graph_cache.put(cache_key, graphing.CachedGraph(kept, snapshot))
 
     def update_categories(self) -> None:
         """Update categories_to_plot to plot the selected data categories."""
@@ -225,30 +512,34 @@ USA/Canada.', variable=self.filter_to_value['freight_can_us_vehicles']).pack(sid
         if not self.categories_to_plot:
             self.load_default_categories()
 
-    def update_filters(self) -> list[OneMonthData]:
+    def update_filters(self) -> None:
+        """Update categories_to_filter to filter outliers of the selected data categories."""
         self.categories_to_filter = [filter for filter in self.filter_to_value if
                                      self.filter_to_value[filter].get() == 1]
-        return self.filter_values()
 
     def update_additional_filters(self) -> None:
         self.additional_filters = [self.additional_filter_to_value[additional_filter].get() == 1 for
                                    additional_filter in self.additional_filter_to_value]
 
-    def filter_values(self) -> list[OneMonthData]:
-        return filter(self.additional_filters[0], self.additional_filters[1], self.categories_to_filter, self.data)
-
-    def draw_graph(self, custom_data: list[OneMonthData] = None) -> None:
-        if custom_data:
-            graphing.generate_graph(custom_data, self.categories_to_plot)
-        else:
-            graphing.generate_graph(self.data, self.categories_to_plot)
-
     def render_window(self) -> None:
-        """Begin rendering the main window."""
+        """Begin rendering the main window. Once it is closed, abandon any background work."""
+        self._window.after_idle(self._profile.stage, 'window shown')
         self._window.mainloop()
+        self._cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == '__main__':
-    project = CSProject('CSC110 Project: People, Cargo & CoVID', (450, 600))
-    project.data = process_file(r'TestData.csv')
+    parser = argparse.ArgumentParser(description='Graph the transportation activity dataset.')
+    parser.add_argument('--data', default='TestData.csv',
+                        help='a raw .csv, a database made by data_storage.py, or a file '
+                             'exported by data_interchange.py')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='report how long each import and stage of start-up takes')
+    options = parser.parse_args()
+
+    startup_profile = StartupProfile(options.profile_startup)
+    project = CSProject('CSC110 Project: People, Cargo & CoVID', (1280, 720), profile=startup_profile)
+    startup_profile.stage('window created')
+    project.start_loading(options.data)
     project.render_window()
@@ -0,0 +1,31 @@
+# In this file are tests for rendering graphs without a window.
+import json
+import os
+
+import pytest
+
+import batch_render
+
+
+def test_render_charts_writes_files_and_manifest(tmp_path) -> None:
+    """Test that every chart is written in every format, and described in the manifest."""
+    charts = [batch_render.ChartConfig('trade', ['export_cash', 'import_cash'],
+                                       ['export_cash'], True, True),
+              batch_render.ChartConfig('trade', ['overall_rail_passengers'])]
+    manifest = batch_render.render_charts(charts, 'TestData.csv', str(tmp_path),
+                                          ('png', 'svg'), processes=1,
+                                          cache_dir=str(tmp_path / 'cache'))
+
+    assert [entry['files'] for entry in manifest] == [['trade.png', 'trade.svg'],
+                                                      ['trade-2.png', 'trade-2.svg']]
+    for entry in manifest:
+        for filename in entry['files']:
+            assert os.path.getsize(tmp_path / filename) > 0
+    with open(tmp_path / 'manifest.json', encoding='utf-8') as manifest_file:
+        assert json.load(manifest_file)['charts'] == manifest
+
+
+def test_chart_config_rejects_unknown_category() -> None:
+    """Test that a configuration naming an unknown category is rejected."""
+    with pytest.raises(ValueError):
+        batch_render.ChartConfig.from_dict({'categories': ['not_a_category']}, 'chart-001')
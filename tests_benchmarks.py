@@ -0,0 +1,20 @@
+# In this file are tests for the benchmark suite.
+import benchmarks
+
+
+def test_regressions_against_baseline(tmp_path) -> None:
+    """Test that results are saved and loaded as they were, and that only
+    stages much slower than the baseline are regressions."""
+    results = benchmarks.run_benchmarks((100,), ['get_data', 'filter'], repeat=1)
+    assert [(result.stage, result.size) for result in results] == [('get_data', 100), ('filter', 100)]
+    filename = str(tmp_path / 'baseline.json')
+    benchmarks.save_results(results, filename)
+    baseline = benchmarks.load_results(filename)
+    assert baseline == results
+
+    slower = [benchmarks.BenchmarkResult(result.stage, result.size, result.seconds + 1.0,
+                                         result.rows_per_second, result.peak_bytes)
+              for result in results]
+    assert benchmarks.find_regressions(results, baseline) == []
+    assert [regression.stage for regression in benchmarks.find_regressions(slower, baseline)] \
+           == ['get_data', 'filter']
@@ -0,0 +1,170 @@
+# In this file are tests for collecting data from raw .csv files.
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from data_collection import CATEGORIES, MissingIndicatorError, MonthlyDataset, \
+    date_to_ordinal, process_file, process_file_cached, process_files
+
+
+def _write_shuffled_copy(source: str, destination: str, drop_label: str = None) -> None:
+    """Write a copy of the raw .csv source to destination, with its indicator
+    rows in reverse order, optionally leaving out the row starting with
+    drop_label.
+    """
+    with open(source, encoding='utf-8-sig') as raw_file:
+        lines = raw_file.read().split('\n')
+    # Rows 10 to 21 (zero indexed) are the unit and indicator rows.
+    indicator_lines = [line for line in lines[10:22]
+                       if drop_label is None or not line.startswith('"' + drop_label)]
+    lines = lines[:10] + indicator_lines[::-1] + lines[22:]
+    with open(destination, 'w', encoding='utf-8') as new_file:
+        new_file.write('\n'.join(lines))
+
+
+def test_reordered_rows(tmp_path) -> None:
+    """Test that indicator rows are found by label, not by position."""
+    shuffled = str(tmp_path / 'shuffled.csv')
+    _write_shuffled_copy('TestData.csv', shuffled)
+    assert process_file(shuffled).to_records() == process_file('TestData.csv').to_records()
+
+
+def test_missing_indicator(tmp_path) -> None:
+    """Test that a file without one of the indicator rows is rejected."""
+    missing = str(tmp_path / 'missing.csv')
+    _write_shuffled_copy('TestData.csv', missing, drop_label='Merchandise trade, total export')
+    with pytest.raises(MissingIndicatorError):
+        process_file(missing)
+
+
+def test_merge_releases(tmp_path) -> None:
+    """Test that parsing a directory of releases orders months by date, and
+    takes overlapping months from the newest release."""
+    with open('TestData.csv', encoding='utf-8-sig') as raw_file:
+        text = raw_file.read()
+    # An older release, with an extra, earlier month (in place of April) and
+    # an August value that was later revised.
+    older = text.replace('Release date: 2021-11-17', 'Release date: 2021-10-20') \
+        .replace('"April 2021"', '"March 2021"').replace('"1,016"', '"1,017"')
+    with open(tmp_path / 'older.csv', 'w', encoding='utf-8') as new_file:
+        new_file.write(older)
+    with open(tmp_path / 'newer.csv', 'w', encoding='utf-8') as new_file:
+        new_file.write(text)
+
+    merged = process_files(str(tmp_path), processes=2)
+    newer = process_file(str(tmp_path / 'newer.csv'))
+    assert [date.month for date in merged.dates()] == [3, 4, 5, 6, 7, 8]
+    assert merged[1:].to_records() == newer.to_records()
+    assert merged.months[0] == date_to_ordinal(newer.dates()[0]) - 1
+
+
+def test_cache_invalidation_and_eviction(tmp_path, monkeypatch) -> None:
+    """Test that the parsed file cache returns the same data as parsing,
+    follows changes to the file, and evicts old entries past its size limit."""
+    cache_dir = str(tmp_path / 'cache')
+    raw_file = str(tmp_path / 'data.csv')
+    with open('TestData.csv', encoding='utf-8-sig') as original:
+        text = original.read()
+    with open(raw_file, 'w', encoding='utf-8') as new_file:
+        new_file.write(text)
+
+    expected = process_file(raw_file).to_records()
+    assert process_file_cached(raw_file, cache_dir).to_records() == expected
+    assert process_file_cached(raw_file, cache_dir).to_records() == expected
+
+    with open(raw_file, 'w', encoding='utf-8') as new_file:
+        new_file.write(text.replace('"1,016"', '"1,017"'))
+    changed = process_file_cached(raw_file, cache_dir, max_cache_bytes=1)
+    assert changed.to_records() == process_file(raw_file).to_records()
+    assert changed.to_records() != expected
+    # Only the newest entry is left, as the limit is smaller than one entry.
+    assert len([name for name in os.listdir(cache_dir) if name.endswith('.bin')]) == 1
+
+    # A file whose entry was evicted is dropped from the index.
+    other_file = str(tmp_path / 'other.csv')
+    with open(other_file, 'w', encoding='utf-8') as new_file:
+        new_file.write(text.replace('"1,016"', '"1,018"'))
+    process_file_cached(other_file, cache_dir, max_cache_bytes=1)
+    with open(os.path.join(cache_dir, 'index.json'), encoding='utf-8') as index_file:
+        assert list(json.load(index_file)) == [os.path.abspath(other_file)]
+    process_file_cached(raw_file, cache_dir, max_cache_bytes=1)
+
+    # An entry that cannot be deleted (on Windows, while it is memory
+    # mapped) is kept until next time.
+    with open(raw_file, 'w', encoding='utf-8') as new_file:
+        new_file.write(text)
+    def remove(path: str) -> None:
+        raise PermissionError(path)
+
+    monkeypatch.setattr(os, 'remove', remove)
+    assert process_file_cached(raw_file, cache_dir, max_cache_bytes=1).to_records() == expected
+    assert len([name for name in os.listdir(cache_dir) if name.endswith('.bin')]) == 2
+
+
+def test_date_index_queries() -> None:
+    """Test range, month, year and quarter lookups, on sorted and unsorted
+    datasets, against a plain scan of the dates."""
+    months = np.arange(2015 * 12, 2022 * 12)
+    in_order = MonthlyDataset(months, {category: months * 2 for category in CATEGORIES})
+    shuffled = in_order[np.random.default_rng(1).permutation(len(in_order))]
+
+    for dataset in (in_order, shuffled):
+        dates = dataset.dates()
+        window = dataset.months_between(datetime(2019, 3, 1), datetime(2021, 8, 1))
+        assert window.dates() == sorted(date for date in dates
+                                        if datetime(2019, 3, 1) <= date <= datetime(2021, 8, 1))
+        assert window.column('export_cash').tolist() == [2.0 * month for month in window.months]
+        assert len(dataset.in_month(datetime(2020, 2, 1))) == 1
+        assert dataset.in_year(2018).dates() == [datetime(2018, m, 1) for m in range(1, 13)]
+        assert dataset.in_quarter(2020, 2).dates() == [datetime(2020, m, 1) for m in (4, 5, 6)]
+        assert len(dataset.in_year(1990)) == 0
+
+    # On a dataset in order, windows are views rather than copies.
+    assert np.shares_memory(in_order.in_year(2018).months, in_order.months)
+
+
+def test_fingerprint_follows_contents() -> None:
+    """Test that datasets with the same rows share a fingerprint, and that
+    retaining rows changes it."""
+    dataset = process_file('TestData.csv')
+    copy = MonthlyDataset(dataset.months.copy(),
+                          {category: dataset.column(category).copy() for category in CATEGORIES})
+    fingerprint = dataset.fingerprint()
+    assert copy.fingerprint() == fingerprint
+
+    dataset.retain(np.arange(len(dataset) - 1))
+    assert dataset.fingerprint() != fingerprint
+
+
+def test_partial_months_kept(tmp_path) -> None:
+    """Test that months with missing values are kept, with those values
+    marked missing, through the cache as well."""
+    with open('TestData.csv', encoding='utf-8-sig') as raw_file:
+        text = raw_file.read()
+    # Mark values of April, May and July (in three categories) missing.
+    partial = text.replace('"379"', '".."').replace('"681.0"', '"x"').replace('"1,896"', '""')
+    with open(tmp_path / 'partial.csv', 'w', encoding='utf-8') as new_file:
+        new_file.write(partial)
+
+    dataset = process_file(str(tmp_path / 'partial.csv'))
+    complete = process_file('TestData.csv')
+    assert np.array_equal(dataset.months, complete.months)
+    assert sorted(dataset.validity) == ['freight_intl_teu', 'overall_air_passengers',
+                                        'passengers_can_us_int']
+    assert dataset[0].passengers_can_us_int is None
+    assert dataset[1].freight_intl_teu is None
+    assert dataset[3].overall_air_passengers is None
+    assert dataset[2] == complete[2]
+    assert dataset.valid_values('freight_intl_teu').tolist() == [582100.0, 569800.0,
+                                                                 584500.0, 621300.0]
+
+    cached = process_file_cached(str(tmp_path / 'partial.csv'), cache_dir=str(tmp_path / 'cache'))
+    assert cached.to_records() == dataset.to_records()
+    assert cached.fingerprint() == dataset.fingerprint()
+
+
+if __name__ == '__main__':
+    pass
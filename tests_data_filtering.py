@@ -1,77 +1,57 @@
 # In this file are tests, and functions who support testing.
+from collections import Counter
+
+import numpy as np
+
 import data_filtering
-from data_collection import OneMonthData
+from data_collection import CATEGORIES, MonthlyDataset, OneMonthData
+from data_generation import generate_dataset
 
 
 # Hypothesis has no OneMonthData strategy... bah! Improvisation time!
-def generate_random_data(quantity: int) -> list[OneMonthData]:
+def generate_random_data(quantity: int, seed: int) -> list[OneMonthData]:
     """Randomly generate -quantity- OneMonthData objects, with random
-    attributes for property based testing.
+    attributes for property based testing. The same seed always generates
+    the same objects.
 
-    Not completely random but will provide decent variance.
+    About a tenth of them have a garbage value or date, a tenth duplicate
+    another one, and a twentieth have an outlying value (see
+    data_generation.generate_dataset).
     """
-    import random
-    # Accumulates constructed data objects.
-    data_so_far = []
-
-    int_to_month = {1: 'January', 2: 'February', 3: 'March', 4: 'April',
-                    5: 'May', 6: 'June', 7: 'July', 8: 'August', 9: 'September',
-                    10: 'October', 11: 'November', 12: 'December'}
-    for i in range(0, quantity):
-        random_month = int_to_month[random.randint(1, 12)]
-        # For convenience, we restrict the random day range to not have to deal
-        # with leap years and smaller months etc.
-        random_year = random.randint(1984, 2022)
-        random_pass_can_us_int = random.randint(-100, 1000)
-        random_pass_can_not_us = random.randint(-100, 1000)
-        random_freight_can_us_vehicles = random.randint(-100, 1000)
-        random_freight_intl_teu = random.randint(-100, 1000)
-        random_export_cash = random.randint(-100, 1000)
-        random_import_cash = random.randint(-100, 1000)
-        random_overall_air_passengers = random.randint(-100, 1000)
-        random_overall_rail_passengers = random.randint(-100, 1000)
-
-        current_object = OneMonthData(random_month, random_year,
-                                      random_pass_can_us_int, random_pass_can_not_us,
-                                      random_freight_can_us_vehicles,
-                                      random_freight_intl_teu, random_export_cash,
-                                      random_import_cash, random_overall_air_passengers,
-                                      random_overall_rail_passengers)
-        data_so_far.append(current_object)
-        return data_so_far
+    return generate_dataset(quantity, garbage_rate=0.1, duplicate_rate=0.1,
+                            outlier_rate=0.05, seed=seed).dataset.to_records()
 
 
 def test_no_lost_data() -> None:
     """Test that each of the filtering helpers do not lose elements somehow,
     e.g. filtered_elements + raw_data list after = raw_data list before."""
 
-    raw_data = generate_random_data(1000)
-    previous_raw_data = raw_data + []
-    assert previous_raw_data == \
-           data_filtering.filter_garbage_values(raw_data) + raw_data
-
-    raw_data = generate_random_data(1000)
+    # Removed elements keep their original order, but are not necessarily all
+    # before the remaining ones - so compare the elements, ignoring order.
+    raw_data = generate_random_data(1000, seed=1)
     previous_raw_data = raw_data + []
-    assert previous_raw_data == \
-           data_filtering.filter_duplicate_data(raw_data) + raw_data
+    assert Counter(previous_raw_data) == \
+           Counter(data_filtering.filter_garbage_values(raw_data) + raw_data)
 
-    raw_data = generate_random_data(1000)
+    raw_data = generate_random_data(1000, seed=2)
     previous_raw_data = raw_data + []
+    assert Counter(previous_raw_data) == \
+           Counter(data_filtering.filter_duplicate_data(raw_data) + raw_data)
 
-    # Get each instance attribute. Plug that one in as the value.
-    instance_attributes = [x for x in dir(OneMonthData) if not
-    callable(getattr(OneMonthData, x)) and not x.startswith('_')]
+    raw_data = generate_random_data(1000, seed=3)
 
-    for attribute in instance_attributes:
-        assert previous_raw_data == \
-               data_filtering.filter_outlying_value(raw_data, attribute) + raw_data
+    # Plug each measurement in as the value.
+    for attribute in CATEGORIES:
+        previous_raw_data = raw_data + []
+        assert Counter(previous_raw_data) == \
+               Counter(data_filtering.filter_outlying_value(raw_data, attribute) + raw_data)
 
 
 def test_no_duplicates() -> None:
     """Test that the duplicate filtering function, when given a list of random
     OneMonthData objects, mutates the list into one with no duplicates.
     """
-    raw_data = generate_random_data(1000)
+    raw_data = generate_random_data(1000, seed=4)
     data_filtering.filter_duplicate_data(raw_data)
     appearance_count = {}
     for x in raw_data:
@@ -88,43 +68,63 @@ def test_no_garbage() -> None:
     """
     import datetime
 
-    raw_data = generate_random_data(1000)
+    raw_data = generate_random_data(1000, seed=5)
     data_filtering.filter_garbage_values(raw_data)
     assert all((data_filtering.earliest_yr_in_dataset <= entry.date.year
                 <= data_filtering.latest_yr_in_dataset
                 for entry in raw_data))
 
     for entry in raw_data:
-        data_piece_attributes = vars(entry)
-        assert all((type(data_piece_attributes[x] is datetime.datetime
-                         or data_piece_attributes[x] >= 0 for x in vars(entry))))
+        assert type(entry.date) is datetime.datetime
+        assert all((getattr(entry, x) >= 0 for x in CATEGORIES))
 
 def test_no_outliers() -> None:
     """Test that the outlier filtering function, when given a list of random
     OneMonthData objects, mutates the list into one with no objects that
     have outlying values.
     """
-    import statistics
-
-    raw_data = generate_random_data(1000)
-    for value_name in dir(OneMonthData):
-        # Ignore precondition-defying values, and system specials and private
-        # attributes.
-        if value_name != 'date' and not value_name.startswith('_'):
-            # Generate a list of the value in question from all the OneMonthData values.
-            value_list_number_only = [getattr(bit, value_name) for bit in raw_data]
-            # Sort the list. Compute IQR, Q1, and Q3.
-            value_list_number_only = sorted(value_list_number_only)
-            quantiles = statistics.quantiles(data=value_list_number_only, n=4,
-                                             method='inclusive')
-            q1 = quantiles[0]
-            q3 = quantiles[2]
-            iqr = q3 - q1
-            data_filtering.filter_outlying_value(raw_data, value_name)
-            # Now check that there are no values of that value that are outliers.
-            for element in raw_data:
-                assert not data_filtering.is_outlier(getattr(element, value_name), q1,
-                                                     q3, iqr)
+    raw_data = generate_random_data(1000, seed=6)
+    for value_name in CATEGORIES:
+        # 'date' is not in CATEGORIES, so there are no precondition-defying values.
+        # Generate a list of the value in question from all the OneMonthData values.
+        value_list_number_only = [getattr(bit, value_name) for bit in raw_data]
+        # Compute IQR, Q1, and Q3 (interpolating between values, as the
+        # 'inclusive' method of statistics.quantiles does).
+        q1, q3 = np.percentile(value_list_number_only, [25, 75])
+        iqr = q3 - q1
+        data_filtering.filter_outlying_value(raw_data, value_name)
+        # Now check that there are no values of that value that are outliers.
+        for element in raw_data:
+            assert not data_filtering.is_outlier(getattr(element, value_name), q1,
+                                                 q3, iqr)
+
+def test_duplicates_compared_by_value() -> None:
+    """Test that separately constructed but identical OneMonthData objects are
+    equal, hash the same, and are caught by the duplicate filter."""
+    object1 = OneMonthData('January', 2021, 5, 5, 5, 5, 5, 5, 5, 5)
+    object2 = OneMonthData('January', 2021, 5, 5, 5, 5, 5, 5, 5, 5)
+    object3 = OneMonthData('January', 2021, 5, 5, 5, 5, 5, 5, 5, 6)
+    assert object1 == object2 and hash(object1) == hash(object2)
+    assert object1 != object3
+
+    raw_data = [object1, object3, object2]
+    assert data_filtering.filter_duplicate_data(raw_data) == [object2]
+    assert raw_data == [object1, object3]
+
+
+def test_duplicate_rows_of_a_dataset() -> None:
+    """Test that rows of a dataset are duplicates exactly when they have the
+    same month, the same values and the same values missing."""
+    months = np.array([0, 0, 0, 0, 1])
+    columns = {category: np.full(5, 5.0) for category in CATEGORIES}
+    columns['export_cash'] = np.array([5.0, 5.0, np.nan, 7.0, 5.0])
+    columns['import_cash'] = np.array([0.0, -0.0, 0.0, 0.0, 0.0])
+    dataset = MonthlyDataset(months, columns,
+                             {'export_cash': np.array([True, True, False, False, True])})
+    # Rows 2 and 3 are both missing export_cash, whatever it holds instead.
+    assert dataset.repeated_rows().tolist() == [False, True, False, True, False]
+    assert data_filtering.evaluate_filters(False, True, [], dataset).rejected.tolist() == [1, 3]
+
 
 def test_statistical_attributes_uniform_input() -> None:
     """Unit test for statistical attributes with a uniform input."""
@@ -146,6 +146,78 @@ def test_statistical_attributes_not_uniform_input() -> None:
     test_list = [object1, object2]
     assert data_filtering.calculate_aggregate_measurements(test_list, 'export_cash') == expected
 
+
+def test_statistical_attributes_dataset_input() -> None:
+    """Unit test that statistical attributes are the same for a MonthlyDataset
+    as for the list of OneMonthData objects it was made from."""
+    object1 = OneMonthData('January', 2021, 5, 5, 5, 5, 5, 5, 5, 5)
+    object2 = OneMonthData('February', 2021, 0, 0, 0, 0, 0, 0, 0, 0)
+    object3 = OneMonthData('March', 2021, 3, 3, 3, 3, 3, 3, 3, 3)
+
+    test_list = [object1, object2, object3]
+    test_dataset = MonthlyDataset.from_records(test_list)
+    assert data_filtering.calculate_aggregate_measurements(test_dataset, 'freight_intl_teu') == \
+           data_filtering.calculate_aggregate_measurements(test_list, 'freight_intl_teu')
+
+
+def test_all_statistical_attributes_match_single() -> None:
+    """Test that the measurements calculated for all categories at once match
+    those calculated one category at a time."""
+    import math
+
+    raw_data = generate_random_data(1000, seed=7)
+    table = data_filtering.calculate_all_aggregate_measurements(raw_data)
+    for category in CATEGORIES:
+        expected = data_filtering.calculate_aggregate_measurements(raw_data, category)
+        assert table[category].keys() == expected.keys()
+        assert all(math.isclose(table[category][x], expected[x]) for x in expected)
+
+
+def test_measurements_leave_out_missing_values() -> None:
+    """Test that measurements are calculated over only the values present,
+    for datasets and lists alike."""
+    import math
+
+    dataset = generate_dataset(1000, garbage_rate=0.1, missing_rate=0.2, seed=9).dataset
+    table = data_filtering.calculate_all_aggregate_measurements(dataset)
+    for category in CATEGORIES:
+        expected = data_filtering.calculate_aggregate_measurements(dataset.to_records(), category)
+        assert data_filtering.calculate_aggregate_measurements(dataset, category) == expected
+        assert all(math.isclose(table[category][x], expected[x]) for x in expected)
+
+
+def test_outlier_masks_match_single_category() -> None:
+    """Test that checking every category for outliers at once flags the same
+    rows as filtering outliers one category at a time."""
+    raw_data = generate_random_data(1000, seed=8)
+    # Make some outliers.
+    raw_data.extend(OneMonthData('May', 2020, 5000, 5000, 5000, 5000, 5000, 5000, 5000, i)
+                    for i in range(20))
+    masks, any_outlier = data_filtering.outlier_masks(raw_data, list(CATEGORIES))
+    for category in CATEGORIES:
+        removed = data_filtering.filter_outlying_value(raw_data + [], category)
+        assert [raw_data[i] for i in range(len(raw_data)) if masks[category][i]] == removed
+    assert list(any_outlier) == [any(masks[category][i] for category in CATEGORIES)
+                                 for i in range(len(raw_data))]
+
+
+def test_filter_does_not_mutate_when_evaluating() -> None:
+    """Test that evaluate_filters leaves its input alone, and that filter
+    removes exactly the rows evaluate_filters rejected."""
+    object1 = OneMonthData('January', 2021, 5, 5, 5, 5, 5, 5, 5, 5)
+    object2 = OneMonthData('February', 2021, -1, 5, 5, 5, 5, 5, 5, 5)
+    object3 = OneMonthData('January', 2021, 5, 5, 5, 5, 5, 5, 5, 5)
+    object4 = OneMonthData('March', 2021, 6, 6, 6, 6, 6, 6, 6, 6)
+
+    raw_data = [object1, object2, object3, object4]
+    result = data_filtering.evaluate_filters(True, True, [], raw_data)
+    assert raw_data == [object1, object2, object3, object4]
+    assert list(result.kept) == [0, 3]
+    assert list(result.rejected) == [1, 2]
+
+    assert data_filtering.filter(True, True, [], raw_data) == [object2, object3]
+    assert raw_data == [object1, object4]
+
 if __name__ == '__main__':
     pass
     # whatever I decide to put in the main block.
\ No newline at end of file
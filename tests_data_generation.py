@@ -0,0 +1,39 @@
+# In this file are tests for generating synthetic data.
+from datetime import datetime
+
+import numpy as np
+
+import data_filtering
+from data_collection import read_release
+from data_generation import generate_dataset, write_raw_csv
+
+
+def test_rates_and_filters_agree() -> None:
+    """Test that the filters find exactly the bad rows that were generated."""
+    generated = generate_dataset(2000, garbage_rate=0.05, duplicate_rate=0.05,
+                                 outlier_rate=0.02, missing_rate=0.1, seed=1)
+    assert generated.garbage.sum() == 100
+    assert sum((~mask).sum() for mask in generated.dataset.validity.values()) == 200
+    assert generated.duplicates.sum() == 100
+    assert sum(mask.sum() for mask in generated.outliers.values()) == 40
+
+    result = data_filtering.evaluate_filters(True, True, list(generated.outliers),
+                                             generated.dataset)
+    assert np.array_equal(result.garbage, generated.garbage)
+    assert np.array_equal(result.duplicates, generated.duplicates)
+    for category, mask in generated.outliers.items():
+        assert np.array_equal(result.outliers[category], mask)
+
+
+def test_raw_csv_round_trip(tmp_path) -> None:
+    """Test that generated data written as a raw .csv parses back the same,
+    release date and all."""
+    generated = generate_dataset(500, garbage_rate=0.05, duplicate_rate=0.05,
+                                 outlier_rate=0.05, missing_rate=0.05, seed=2)
+    filename = str(tmp_path / 'generated.csv')
+    write_raw_csv(generated.dataset, filename, release_date=datetime(2021, 11, 17))
+
+    release_date, dataset = read_release(filename)
+    assert release_date == datetime(2021, 11, 17)
+    assert dataset.to_records() == generated.dataset.to_records()
+    assert dataset.fingerprint() == generated.dataset.fingerprint()
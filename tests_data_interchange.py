@@ -0,0 +1,75 @@
+# In this file are tests for exporting monthly data to columnar files and importing it back.
+import numpy as np
+import pytest
+
+import data_interchange
+from data_collection import CATEGORIES, process_file
+from data_generation import generate_dataset
+
+
+def test_npz_round_trip_is_memory_mapped(tmp_path) -> None:
+    """Test that a dataset with missing values exported to .npz imports back
+    the same, with its columns mapped from the file rather than copied."""
+    dataset = generate_dataset(500, missing_rate=0.2, seed=5).dataset
+    filename = str(tmp_path / 'months.npz')
+    assert data_interchange.export_dataset(dataset, filename) == filename
+
+    imported = data_interchange.import_dataset(filename)
+    assert imported.fingerprint() == dataset.fingerprint()
+    assert imported.to_records() == dataset.to_records()
+    # The columns are views of memory maps of the file.
+    assert isinstance(imported.months.base, np.memmap)
+    assert all(isinstance(imported.column(category).base, np.memmap) for category in CATEGORIES)
+    assert set(imported.validity) == {category for category in CATEGORIES
+                                      if dataset.has_missing(category)}
+
+    # Empty datasets cannot be memory mapped, but still round trip.
+    data_interchange.export_dataset(dataset[:0], filename)
+    assert len(data_interchange.import_dataset(filename)) == 0
+
+
+def test_export_filtered_from_command_line(tmp_path) -> None:
+    """Test that the command line exports only the months that pass the
+    filters, and that exports can be loaded like any other source."""
+    filename = str(tmp_path / 'filtered.npz')
+    data_interchange.main(['TestData.csv', filename, '--filter-garbage', '--filter-duplicates',
+                           '--cache-dir', str(tmp_path / 'cache')])
+
+    dataset = process_file('TestData.csv')
+    kept = data_interchange.evaluate_filters(True, True, [], dataset).kept
+    assert data_interchange.load_dataset(filename).to_records() == dataset[kept].to_records()
+
+
+@pytest.mark.skipif(data_interchange.has_pyarrow(), reason='pyarrow is installed')
+def test_falls_back_to_npz_without_pyarrow(tmp_path) -> None:
+    """Test that exporting to Arrow IPC without pyarrow writes a .npz file
+    instead, with a warning."""
+    dataset = process_file('TestData.csv')
+    with pytest.warns(UserWarning, match='pyarrow is not installed'):
+        filename = data_interchange.export_dataset(dataset, str(tmp_path / 'months.arrow'))
+    assert filename == str(tmp_path / 'months.npz')
+    assert data_interchange.import_dataset(filename).to_records() == dataset.to_records()
+    with pytest.raises(ImportError):
+        data_interchange.import_dataset(str(tmp_path / 'months.arrow'))
+
+
+@pytest.mark.parametrize('extension', ['.arrow', '.parquet'])
+def test_arrow_round_trip(tmp_path, extension: str) -> None:
+    """Test that a dataset with missing values exported to Arrow IPC or
+    Parquet imports back the same, with missing values as nulls."""
+    pyarrow = pytest.importorskip('pyarrow')
+    dataset = generate_dataset(500, missing_rate=0.2, seed=6).dataset
+    filename = data_interchange.export_dataset(dataset, str(tmp_path / f'months{extension}'))
+    assert filename.endswith(extension)
+
+    imported = data_interchange.import_dataset(filename)
+    assert imported.fingerprint() == dataset.fingerprint()
+    assert imported.to_records() == dataset.to_records()
+
+    if extension == '.arrow':
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(filename, 'r')).read_all()
+        assert table.column('export_cash').null_count == (~dataset.is_valid('export_cash')).sum()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,108 @@
+# In this file are tests for aggregating monthly data over longer periods.
+import math
+from datetime import datetime
+
+import numpy as np
+
+from data_collection import CATEGORIES, MonthlyDataset
+from data_resampling import Resampler, resample, rolling
+
+
+def _random_dataset(length: int, seed: int) -> MonthlyDataset:
+    """Return a dataset of length rows over 2017 to 2021, in no particular
+    order, with some months missing and some repeated, generated from seed."""
+    rng = np.random.default_rng(seed)
+    months = rng.integers(2017 * 12, 2022 * 12, size=length)
+    return MonthlyDataset(months, {category: rng.integers(0, 10 ** 6, size=length)
+                                   for category in CATEGORIES})
+
+
+def _expected(dataset: MonthlyDataset, start: int, end: int, category: str) -> tuple:
+    """Return the count, sum, mean and standard deviation of category over
+    the rows of dataset from month ordinal start to end, by brute force."""
+    values = dataset.column(category)[(dataset.months >= start) & (dataset.months <= end)
+                                      & dataset.is_valid(category)]
+    if len(values) == 0:
+        return 0, 0.0, math.nan, math.nan
+    return len(values), float(values.sum()), float(values.mean()), float(values.std())
+
+
+def _assert_matches(series, dataset: MonthlyDataset) -> None:
+    """Assert that every period of series matches brute force."""
+    for i in range(len(series.starts)):
+        for category in CATEGORIES:
+            count, total, mean, deviation = _expected(dataset, series.starts[i],
+                                                      series.ends[i], category)
+            assert series.value_counts[category][i] == count
+            assert math.isclose(series.sums[category][i], total, abs_tol=1e-3)
+            if count:
+                assert math.isclose(series.means[category][i], mean, abs_tol=1e-6)
+                # Variances from prefix sums are accurate relative to the
+                # size of the values (up to 10 ** 6), not to the variance.
+                assert math.isclose(series.standard_deviations[category][i], deviation,
+                                    rel_tol=1e-9, abs_tol=1)
+            else:
+                assert math.isnan(series.means[category][i])
+
+
+def test_calendar_periods() -> None:
+    """Test quarterly and yearly aggregates against brute force."""
+    dataset = _random_dataset(100, seed=1)
+    quarters = resample(dataset, 'quarter')
+    assert all(month % 3 == 0 for month in quarters.starts)
+    _assert_matches(quarters, dataset)
+
+    years = resample(dataset, 'year')
+    assert [date.year for date in years.dates()] == \
+           list(range(dataset.months.min() // 12, dataset.months.max() // 12 + 1))
+    _assert_matches(years, dataset)
+    assert np.array_equal(years.counts, [np.sum(dataset.months // 12 == start // 12)
+                                         for start in years.starts])
+
+
+def test_rolling_windows() -> None:
+    """Test rolling window aggregates against brute force."""
+    dataset = _random_dataset(100, seed=2)
+    windows = rolling(dataset, 6)
+    assert all(windows.ends - windows.starts == 5)
+    assert windows.starts[0] == dataset.months.min()
+    assert windows.ends[-1] == dataset.months.max()
+    _assert_matches(windows, dataset)
+
+    # One row per month: every one-month window with data has no spread.
+    _, first_rows = np.unique(dataset.months, return_index=True)
+    months = rolling(dataset[first_rows], 1)
+    for category in CATEGORIES:
+        assert np.all(months.standard_deviations[category][months.counts == 1] == 0.0)
+
+
+def test_between() -> None:
+    """Test aggregates over an arbitrary range of months."""
+    dataset = _random_dataset(100, seed=3)
+    before = Resampler(dataset).between(datetime(2017, 1, 1), datetime(2020, 2, 1))
+    for category in CATEGORIES:
+        _, total, mean, deviation = _expected(dataset, 2017 * 12, 2020 * 12 + 1, category)
+        assert math.isclose(before[category]['sum'], total)
+        assert math.isclose(before[category]['mean'], mean)
+        assert math.isclose(before[category]['standard deviation'], deviation)
+
+    # A range that ends before it starts is empty.
+    inverted = Resampler(dataset).between(datetime(2021, 7, 1), datetime(2021, 5, 1))
+    for category in CATEGORIES:
+        assert inverted[category]['sum'] == 0.0
+        assert math.isnan(inverted[category]['mean'])
+        assert math.isnan(inverted[category]['standard deviation'])
+
+
+def test_missing_values_left_out() -> None:
+    """Test that missing values count towards neither the sums nor the means."""
+    dataset = _random_dataset(200, seed=4)
+    rng = np.random.default_rng(5)
+    dataset.validity = {category: rng.random(len(dataset)) > 0.3
+                        for category in CATEGORIES[:3]}
+    _assert_matches(resample(dataset, 'quarter'), dataset)
+    _assert_matches(rolling(dataset, 5), dataset)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,73 @@
+# In this file are tests for incrementally accumulated statistics.
+import math
+import random
+import statistics
+
+import data_filtering
+from data_collection import CATEGORIES, MonthlyDataset
+from data_generation import generate_dataset
+from data_statistics import QuantileSketch, RunningMeasurements
+
+
+def test_running_measurements_match_batch() -> None:
+    """Test that running measurements, accumulated in two merged partitions,
+    match the measurements calculated over all of the data at once."""
+    raw_data = generate_dataset(50, garbage_rate=0.1, duplicate_rate=0.1, outlier_rate=0.05,
+                                seed=1).dataset.to_records()
+    running = RunningMeasurements()
+    other_partition = RunningMeasurements()
+    running.update(MonthlyDataset.from_records(raw_data[:20]))
+    for month in raw_data[20:]:
+        other_partition.update(month)
+    running.merge(other_partition)
+
+    for category in CATEGORIES:
+        expected = data_filtering.calculate_aggregate_measurements(raw_data, category)
+        actual = running.measurements(category)
+        assert all(math.isclose(actual[x], expected[x], abs_tol=1e-6) for x in expected)
+
+
+def test_quantile_sketch_small_is_exact() -> None:
+    """Test that a sketch of few values gives the exact quartiles."""
+    rng = random.Random(3)
+    values = [rng.uniform(-100, 1000) for _ in range(60)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.update(value)
+    q1, _, q3 = statistics.quantiles(values, n=4, method='inclusive')
+    assert math.isclose(sketch.quantile(0.25), q1)
+    assert math.isclose(sketch.quantile(0.75), q3)
+
+
+def test_quantile_sketch_bounded() -> None:
+    """Test that a sketch of many values stays small, and stays close."""
+    rng = random.Random(4)
+    values = [rng.gauss(0, 1) for _ in range(20000)]
+    sketch = QuantileSketch(compression=100)
+    for value in values:
+        sketch.update(value)
+    assert len(sketch._centroids) + len(sketch._buffer) <= 300
+    q1, _, q3 = statistics.quantiles(values, n=4, method='inclusive')
+    assert abs(sketch.quantile(0.25) - q1) < 0.05
+    assert abs(sketch.quantile(0.75) - q3) < 0.05
+
+
+def test_flag_outlying_month() -> None:
+    """Test that a month far from all months before it is flagged."""
+    raw_data = generate_dataset(100, garbage_rate=0.1, duplicate_rate=0.1, outlier_rate=0.05,
+                                seed=2).dataset.to_records()
+    running = RunningMeasurements()
+    running.update(MonthlyDataset.from_records(raw_data))
+    # A month with a typical value (the generated data has some outliers).
+    median = statistics.median(month.export_cash for month in raw_data)
+    month = min(raw_data, key=lambda month: abs(month.export_cash - median))
+    assert running.flag_and_update(month, ('export_cash',)) == []
+
+    q1, q3 = running.quartiles('export_cash')
+    outlying = MonthlyDataset.from_records([month])
+    outlying.columns['export_cash'] = outlying.columns['export_cash'] + 10 * (q3 - q1) + q3
+    assert running.flag_and_update(outlying.row(0), ('export_cash',)) == ['export_cash']
+
+
+if __name__ == '__main__':
+    pass
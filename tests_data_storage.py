@@ -0,0 +1,105 @@
+# In this file are tests for keeping monthly data in a SQLite database.
+from datetime import datetime
+
+import numpy as np
+
+from data_collection import merge_releases, ordinal_to_date, process_file, read_release
+from data_generation import generate_dataset, write_raw_csv
+from data_storage import DataStore, Revision
+
+
+def test_append_is_idempotent(tmp_path) -> None:
+    """Test that adding the same file twice changes nothing the second time,
+    and that the months read back are the ones parsed."""
+    with DataStore(str(tmp_path / 'store.sqlite')) as store:
+        assert store.append_file('TestData.csv') == 5
+        assert store.append_file('TestData.csv') == 0
+        assert store.count() == 5
+        assert store.load().to_records() == process_file('TestData.csv').to_records()
+
+
+def test_newer_release_wins(tmp_path) -> None:
+    """Test that a month is only replaced by a release at least as new as the
+    one it came from."""
+    path = str(tmp_path / 'store.sqlite')
+    _, dataset = read_release('TestData.csv')
+    revised = dataset[:]
+    revised.columns = dict(dataset.columns)
+    revised.columns['export_cash'] = dataset.column('export_cash') + 1.0
+
+    with DataStore(path) as store:
+        store.append(dataset, datetime(2021, 11, 17))
+        # An older release, and one with no release date, change nothing.
+        assert store.append(revised, datetime(2021, 10, 20)) == 0
+        assert store.append(revised) == 0
+        assert store.append(revised, datetime(2021, 12, 15)) == 5
+    # The changes were committed.
+    with DataStore(path) as store:
+        assert np.array_equal(store.load().column('export_cash'), revised.column('export_cash'))
+
+
+def test_queries_by_date_and_category(tmp_path) -> None:
+    """Test date range and category queries, with missing values and more
+    than one geography."""
+    generated = generate_dataset(300, missing_rate=0.2, seed=3).dataset
+    # One row per month, as in the database.
+    _, first_rows = np.unique(generated.months, return_index=True)
+    dataset = generated[first_rows]
+
+    with DataStore(str(tmp_path / 'store.sqlite')) as store:
+        store.append(dataset)
+        store.append(dataset[:10], geography='Ontario')
+        assert store.geographies() == ['Canada', 'Ontario']
+        assert store.count('Ontario') == 10
+
+        start, end = datetime(2018, 3, 1), datetime(2019, 8, 1)
+        expected = dataset.months_between(start, end)
+        loaded = store.load(start, end)
+        assert loaded.to_records() == expected.to_records()
+        assert loaded.fingerprint() == expected.fingerprint()
+
+        months, values = store.series('freight_intl_teu', start, end)
+        valid = expected.is_valid('freight_intl_teu')
+        assert np.array_equal(months, expected.months[valid])
+        assert np.array_equal(values, expected.valid_values('freight_intl_teu'))
+
+
+def test_ingest_parses_only_what_changed(tmp_path) -> None:
+    """Test that ingesting releases one after another adds new months,
+    reports revised values, skips files already seen and ignores older
+    releases."""
+    generated = generate_dataset(400, missing_rate=0.1, seed=4).dataset
+    _, first_rows = np.unique(generated.months, return_index=True)
+    dataset = generated[first_rows]
+    first = dataset[:40]
+    second = dataset[1:41]
+    second.columns = dict(second.columns)
+    second.columns['export_cash'] = second.column('export_cash').copy()
+    second.columns['export_cash'][3] = 123400000.0
+    old_value = first[4].export_cash
+
+    releases = [(datetime(2021, 10, 20), first), (datetime(2021, 11, 17), second)]
+    for i, (release_date, release) in enumerate(releases):
+        write_raw_csv(release, str(tmp_path / f'release{i}.csv'), release_date)
+    write_raw_csv(dataset[:41], str(tmp_path / 'outdated.csv'), datetime(2021, 9, 1))
+
+    with DataStore(str(tmp_path / 'store.sqlite')) as store:
+        report = store.ingest(str(tmp_path / 'release0.csv'))
+        assert len(report.new_months) == 40 and not report.revisions
+
+        report = store.ingest(str(tmp_path / 'release1.csv'))
+        assert report.new_months == [ordinal_to_date(dataset.months[40])]
+        assert report.revisions == [Revision(ordinal_to_date(dataset.months[4]), 'export_cash',
+                                             old_value, 123400000.0)]
+        assert report.unchanged == 38
+        assert store.ingest(str(tmp_path / 'release1.csv')).skipped
+
+        report = store.ingest(str(tmp_path / 'outdated.csv'))
+        assert report.outdated == 41 and not report.new_months and not report.revisions
+
+        assert store.last_release() == datetime(2021, 11, 17)
+        assert store.load().to_records() == merge_releases(releases).to_records()
+
+
+if __name__ == '__main__':
+    pass
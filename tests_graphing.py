@@ -0,0 +1,81 @@
+# In this file are tests for preparing data for graphs.
+import numpy as np
+
+import graphing
+
+
+def test_lttb_keeps_ends_and_count() -> None:
+    """Test that LTTB keeps the requested number of points, in order, always
+    including the first and last."""
+    values = np.cumsum(np.random.default_rng(1).standard_normal(10000))
+    indices = graphing.lttb_indices(values, 300)
+    assert len(indices) == 300
+    assert indices[0] == 0 and indices[-1] == len(values) - 1
+    assert all(np.diff(indices) > 0)
+
+
+def test_min_max_keeps_extremes() -> None:
+    """Test that min/max decimation keeps the series' extreme values."""
+    values = np.cumsum(np.random.default_rng(2).standard_normal(10000))
+    indices = graphing.min_max_indices(values, 100)
+    assert len(indices) <= 200
+    assert values[indices].max() == values.max()
+    assert values[indices].min() == values.min()
+
+
+def test_decimate_short_or_disabled() -> None:
+    """Test that short series, or any series with decimation off, are left as they are."""
+    filtered_data = {'export_cash': (np.arange(1000) * 2.0, np.arange(1000))}
+    assert graphing.decimate(filtered_data, 2000) == filtered_data
+    assert graphing.decimate(filtered_data, 100, 'none') == filtered_data
+    values, dates = graphing.decimate(filtered_data, 100)['export_cash']
+    assert len(values) == len(dates) == 100
+    assert all(values == dates * 2.0)
+
+
+def test_get_data_shares_numeric_dates() -> None:
+    """Test that every category gets the same array of numeric dates, one per
+    month, matching matplotlib's conversion of the dates themselves."""
+    from matplotlib import dates as mdates
+    from data_collection import process_file
+
+    dataset = process_file('TestData.csv')
+    filtered_data = graphing.get_data(dataset, ['export_cash', 'import_cash'])
+    assert filtered_data['export_cash'][1] is filtered_data['import_cash'][1]
+    assert list(filtered_data['export_cash'][1]) == list(mdates.date2num(dataset.dates()))
+    assert list(filtered_data['export_cash'][0]) == list(dataset.column('export_cash'))
+
+
+def test_snapshot_shows_same_pixels() -> None:
+    """Test that showing a snapshot of an earlier graph gives the same pixels
+    as rendering it did."""
+    from data_collection import process_file
+
+    dataset = process_file('TestData.csv')
+    canvas = graphing.GraphCanvas()
+    canvas.render(graphing.get_data(dataset, ['export_cash']), ['export_cash'])
+    pixels = np.array(canvas.canvas.buffer_rgba())
+    snapshot = canvas.snapshot()
+
+    canvas.render(graphing.get_data(dataset, ['import_cash']), ['import_cash'])
+    assert not np.array_equal(np.array(canvas.canvas.buffer_rgba()), pixels)
+    canvas.show(snapshot)
+    assert np.array_equal(np.array(canvas.canvas.buffer_rgba()), pixels)
+    assert canvas.axes.get_title() == 'Graph of export_cash'
+
+
+def test_graph_cache_drops_least_recently_used() -> None:
+    """Test that a full cache drops the graph that was used least recently."""
+    cache = graphing.GraphCache(max_entries=2)
+    graphs = [graphing.CachedGraph(np.arange(i), None) for i in range(3)]
+    cache.put('a', graphs[0])
+    cache.put('b', graphs[1])
+    assert cache.get('a') is graphs[0]
+    cache.put('c', graphs[2])
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,49 @@
+# In this file are tests for tracing the stages of the program.
+import json
+
+import instrumentation
+from data_collection import process_file
+from data_filtering import filter
+
+
+def test_spans_off_by_default() -> None:
+    """Test that spans record nothing while tracing is off."""
+    assert not instrumentation.enabled()
+    with instrumentation.span('nothing', rows_in=1) as trace:
+        trace.set(rows_out=1)
+
+
+def test_nested_spans_as_json_lines(tmp_path) -> None:
+    """Test that nested spans are written as they end, with their parents and
+    row counts."""
+    path = str(tmp_path / 'trace.jsonl')
+    instrumentation.enable(path, trace_memory=True)
+    try:
+        filter(True, True, ['export_cash'], process_file('TestData.csv'))
+    finally:
+        instrumentation.disable()
+
+    with open(path, encoding='utf-8') as trace_file:
+        events = {event['name']: event for event in map(json.loads, trace_file)}
+    assert events['process_file']['rows_out'] == 5
+    assert events['garbage rule']['parent'] == 'evaluate_filters'
+    assert events['evaluate_filters']['parent'] == 'filter'
+    assert events['evaluate_filters']['attributes']['outliers'] == {'export_cash': 0}
+    assert events['filter']['rows_in'] == 5 and events['filter']['depth'] == 0
+    assert all(event['peak_bytes'] >= 0 for event in events.values())
+
+
+def test_chrome_trace_is_valid_json(tmp_path) -> None:
+    """Test that a Chrome trace is a JSON array of complete events."""
+    path = str(tmp_path / 'trace.json')
+    instrumentation.enable(path, 'chrome')
+    with instrumentation.span('outer', rows_in=2):
+        with instrumentation.span('inner') as trace:
+            trace.set(rows_out=1, note='hello')
+    instrumentation.disable()
+
+    with open(path, encoding='utf-8') as trace_file:
+        events = json.load(trace_file)
+    assert [event['name'] for event in events] == ['inner', 'outer']
+    assert all(event['ph'] == 'X' for event in events)
+    assert events[0]['args'] == {'note': 'hello', 'rows_out': 1}